@@ -0,0 +1,57 @@
+"""
+Xử lý hàng loạt không cần giao diện: áp dụng một preset hiệu ứng lên nhiều file bằng process pool.
+
+Preset là file JSON với các khóa giống bộ hiệu ứng trên giao diện (thiếu khóa nào thì dùng mặc định):
+    {
+        "volume_gain": 3.0, "speed": 1.0, "pitch_steps": 0,
+        "reverb_enabled": true, "echo_enabled": false, "fade_enabled": true,
+        "bass_gain": 2.0, "mid_gain": 0.0, "treble_gain": -1.0,
+        "cut": [0, 30], "formats": ["mp3", "flac"]
+    }
+
+Ví dụ:
+    python batch.py --preset preset.json --output out/ music/ extra.wav --workers 4
+
+Thời gian từng file được in ra và ghi vào out/.batch_journal.jsonl; chạy lại cùng lệnh sau khi bị
+dừng giữa chừng sẽ bỏ qua các file đã xong (dùng --restart để xử lý lại tất cả).
+"""
+import argparse
+import logging
+import sys
+import time
+
+from models.batch_processor import BatchProcessor, load_preset
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="File âm thanh hoặc thư mục (duyệt đệ quy)")
+    parser.add_argument("--preset", required=True, help="File preset JSON")
+    parser.add_argument("--output", "-o", required=True, help="Thư mục đầu ra")
+    parser.add_argument("--formats", nargs="+", help="Ghi đè danh sách định dạng của preset")
+    parser.add_argument("--workers", type=int, default=None, help="Số tiến trình (mặc định: số CPU)")
+    parser.add_argument("--restart", action="store_true", help="Bỏ qua nhật ký, xử lý lại mọi file")
+    args = parser.parse_args()
+
+    preset = load_preset(args.preset)
+    if args.formats:
+        preset["formats"] = args.formats
+    processor = BatchProcessor(preset, args.output, workers=args.workers, resume=not args.restart)
+
+    def report(input_path, status, result):
+        if status == "done":
+            steps = " ".join(f"{key}={value:.2f}s" for key, value in result.items() if key not in ("mode", "total"))
+            print(f"done  {result['total']:8.2f}s  [{result['mode']}] {steps}  {input_path}", flush=True)
+        else:
+            print(f"error {'':>9}  {input_path}: {result}", flush=True)
+
+    started = time.time()
+    succeeded, failed, skipped = processor.run(args.inputs, on_result=report)
+    print(f"{succeeded} done, {failed} failed, {skipped} skipped in {time.time() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
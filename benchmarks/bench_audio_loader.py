@@ -0,0 +1,96 @@
+"""
+So sánh thời gian tải và bộ nhớ đỉnh giữa AudioLoader hiện tại và cách tải cũ
+(pydub + librosa + mutagen, giải mã file hai lần).
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_audio_loader path/to/file.flac [--repeat 3]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def legacy_loader():
+    from pydub import AudioSegment
+    import librosa
+    from mutagen import File as MutagenFile
+
+    def load_audio(file_path):
+        audio = AudioSegment.from_file(file_path)
+        audio_array, sample_rate = librosa.load(file_path, mono=False, sr=None)
+        metadata = MutagenFile(file_path)
+        return audio, audio_array, sample_rate, metadata
+    return load_audio
+
+
+def current_loader():
+    from models.audio_loader import AudioLoader
+    return AudioLoader().load_audio
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run(name, file_path, queue):
+    # Import trước khi đo để chỉ tính chi phí giải mã
+    try:
+        loader = legacy_loader() if name == "legacy" else current_loader()
+        baseline = peak_memory_mb()
+        start = time.perf_counter()
+        loader(file_path)
+        elapsed = time.perf_counter() - start
+        queue.put(("success", elapsed, peak_memory_mb(), baseline))
+    except Exception as e:
+        queue.put(("error", str(e)))
+
+
+def measure(name, file_path):
+    # Mỗi lần đo chạy trong tiến trình mới để RSS đỉnh không bị ảnh hưởng bởi lần trước
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run, args=(name, file_path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if result[0] == "error":
+        raise Exception(f"{name} loader failed: {result[1]}")
+    return result[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"File: {args.file} ({os.path.getsize(args.file) / (1024 * 1024):.1f} MB)")
+    for name in ("legacy", "current"):
+        times, peaks = [], []
+        try:
+            runs = [measure(name, args.file) for _ in range(args.repeat)]
+        except Exception as e:
+            print(f"{name:>8}: {e}")
+            continue
+        for elapsed, peak, baseline in runs:
+            times.append(elapsed)
+            if peak is not None:
+                peaks.append(peak - baseline)
+        line = f"{name:>8}: best {min(times):.3f}s  mean {sum(times) / len(times):.3f}s"
+        if peaks:
+            line += f"  peak RSS +{max(peaks):.1f} MB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+So sánh thông lượng echo cũ (hai lần overlay của pydub trên AudioSegment) với echo bằng đường trễ
+NumPy (add_echo trên mảng float32): một nhịp như mặc định và ba nhịp có phản hồi.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_echo [--seconds 10 60] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.audio_buffer import float_to_pcm16
+from models.audio_processor import AudioProcessor
+
+
+def legacy_echo(audio, delay_ms=500, decay=0.5):
+    # Bản cũ, giữ nguyên cả lỗi truyền số mẫu vào vị trí tính bằng ms
+    delay_samples = int(audio.frame_rate * (delay_ms / 1000))
+    echo = AudioSegment.silent(duration=len(audio) + delay_ms)
+    echo = echo.overlay(audio, position=0)
+    echo = echo.overlay(audio - 10 * decay, position=delay_samples)
+    return echo[:len(audio)]
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = AudioProcessor()
+    sr = args.sample_rate
+    taps = [(250, 0.5), (500, 0.35), (750, 0.2)]
+    print(f"{'seconds':>8} {'pydub':>10} {'numpy':>10} {'3 taps+fb':>10} {'speedup':>8}")
+    for seconds in args.seconds:
+        audio_array = np.random.default_rng(0).standard_normal((2, int(seconds * sr)), dtype=np.float32) * 0.1
+        segment = AudioSegment(data=float_to_pcm16(audio_array), sample_width=2, frame_rate=sr, channels=2)
+        legacy = best_time(lambda: legacy_echo(segment), args.repeat)
+        single = best_time(lambda: processor.add_echo(audio_array, sample_rate=sr), args.repeat)
+        multi = best_time(lambda: processor.add_echo(audio_array, sample_rate=sr, taps=taps, feedback=0.4, wet=0.8), args.repeat)
+        print(f"{seconds:>8g} {legacy:>9.3f}s {single:>9.3f}s {multi:>9.3f}s {legacy / single:>7.1f}x")
+        print(f"{'':>8} realtime factor: pydub {seconds / legacy:.0f}x, numpy {seconds / single:.0f}x, 3 taps+fb {seconds / multi:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
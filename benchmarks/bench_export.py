@@ -0,0 +1,86 @@
+"""
+So sánh xuất file kiểu cũ (ghi WAV tạm bằng pydub rồi xuất lại bằng pydub hoặc chạy FFmpeg trên file tạm)
+với AudioExporter.export_audio mới (ghi thẳng từ mảng trong bộ nhớ: soundfile hoặc PCM qua stdin của FFmpeg),
+rồi so sánh xuất lần lượt từng định dạng với export_many (mọi định dạng cùng lúc).
+Định dạng nào không xuất được trên máy (ví dụ thiếu FFmpeg) được ghi "n/a" và bỏ khỏi phép đo export_many.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_export [--seconds 300] [--formats wav flac mp3 aac] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ffmpeg
+
+from models.audio_buffer import array_to_segment
+from models.audio_exporter import AudioExporter, FFMPEG_CODECS
+
+
+def legacy_export(audio_array, format, output_path, sample_rate, channels):
+    # AudioSegment tạo mới mỗi lần như sau mỗi thao tác chỉnh sửa, nên tính cả chuyển sang PCM 16-bit
+    audio_segment = array_to_segment(audio_array, sample_rate, channels)
+    temp_wav = output_path + ".temp.wav"
+    audio_segment.export(temp_wav, format="wav")
+    try:
+        if format in ("wav", "mp3"):
+            audio_segment.export(output_path, format=format)
+        else:
+            stream = ffmpeg.output(ffmpeg.input(temp_wav), output_path, format=format,
+                                   acodec=FFMPEG_CODECS.get(format, format), ar=sample_rate, ac=channels)
+            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+    finally:
+        os.remove(temp_wav)
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            return None
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=300)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--formats", nargs="+", default=["wav", "flac", "mp3", "aac"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sr = args.sample_rate
+    audio_array = np.random.default_rng(0).standard_normal((2, int(args.seconds * sr)), dtype=np.float32) * 0.1
+    exporter = AudioExporter()
+    print(f"{'format':>7} {'legacy':>10} {'direct':>10} {'speedup':>8}")
+    directs = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for format in args.formats:
+            output_path = os.path.join(out_dir, f"out.{format}")
+            legacy = best_time(lambda: legacy_export(audio_array, format, output_path, sr, 2), args.repeat)
+            direct = best_time(lambda: exporter.export_audio(audio_array, format, output_path, None, sr, 2), args.repeat)
+            cells = [f"{t:>9.3f}s" if t is not None else f"{'n/a':>10}" for t in (legacy, direct)]
+            speedup = f"{legacy / direct:>7.1f}x" if legacy and direct else f"{'':>8}"
+            print(f"{format:>7} {cells[0]} {cells[1]} {speedup}")
+            if direct is not None:
+                directs[format] = direct
+        if directs:
+            targets = [(format, os.path.join(out_dir, f"many.{format}")) for format in directs]
+            many = best_time(lambda: exporter.export_many(audio_array, targets, sr, 2), args.repeat)
+            print(f"{len(targets)} formats: sequential {sum(directs.values()):.3f}s, slowest {max(directs.values()):.3f}s, "
+                  f"export_many " + (f"{many:.3f}s" if many is not None else "n/a"))
+    exporter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+So sánh tốc độ reverb cũ (np.convolve với nhân hộp 1000 mẫu cho từng kênh, chuẩn hóa theo đỉnh)
+với reverb Freeverb mới: add_reverb (tích chập FFT với đáp ứng xung 1.5 s) cho cả bài và
+ReverbEffect (mạng comb/allpass) theo khối nhỏ như trong callback phát.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_reverb [--seconds 10 60] [--block 1024] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.audio_processor import AudioProcessor
+from models.stream_effects import ReverbEffect
+
+
+def legacy_reverb(audio_array, wet_level=0.2):
+    reverb = np.array([np.convolve(channel, np.ones(1000) * wet_level, mode='same') for channel in audio_array])
+    peak = np.max(np.abs(reverb))
+    reverb = reverb / peak if peak > 0 else reverb
+    return reverb.astype(np.float32)
+
+
+def blockwise_reverb(audio_array, sample_rate, block):
+    reverb = ReverbEffect(sample_rate, audio_array.shape[0])
+    for start in range(0, audio_array.shape[-1], block):
+        reverb.process(audio_array[:, start:start + block])
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--block", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = AudioProcessor()
+    sr = args.sample_rate
+    print(f"{'seconds':>8} {'legacy':>10} {'fft':>10} {'blocks':>10} {'speedup':>8}")
+    for seconds in args.seconds:
+        audio_array = np.random.default_rng(0).standard_normal((2, int(seconds * sr)), dtype=np.float32) * 0.1
+        legacy = best_time(lambda: legacy_reverb(audio_array), args.repeat)
+        full = best_time(lambda: processor.add_reverb(audio_array, 2, sample_rate=sr), args.repeat)
+        blocks = best_time(lambda: blockwise_reverb(audio_array, sr, args.block), args.repeat)
+        print(f"{seconds:>8g} {legacy:>9.3f}s {full:>9.3f}s {blocks:>9.3f}s {legacy / full:>7.1f}x")
+        per_block = blocks / -(-audio_array.shape[-1] // args.block) * 1000
+        print(f"{'':>8} ReverbEffect {per_block:.2f} ms per {args.block}-sample block (budget {args.block / sr * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
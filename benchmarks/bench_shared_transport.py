@@ -0,0 +1,83 @@
+"""
+So sánh thời gian truyền mảng âm thanh tới tiến trình worker và nhận kết quả về:
+pickle qua multiprocessing.Queue so với handle shared memory (SharedArray + run_shared).
+Worker chạy thường trực, xử lý là phép sao chép nên thời gian đo gần như chỉ là chi phí truyền.
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_shared_transport [--minutes 1 5 10 30] [--repeat 3]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.shared_buffer import SharedArray, run_shared
+
+
+def _identity(audio_array):
+    return audio_array
+
+
+def _worker(job_queue, result_queue):
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        if job[0] == "pickle":
+            result_queue.put(_identity(job[1]))
+        else:
+            result_queue.put(run_shared(_identity, job[1], job[2]))
+
+
+def roundtrip_pickle(jobs, results, audio_array):
+    start = time.perf_counter()
+    jobs.put(("pickle", audio_array))
+    output = results.get()
+    elapsed = time.perf_counter() - start
+    assert output.shape == audio_array.shape
+    return elapsed
+
+
+def roundtrip_shared(jobs, results, audio_array):
+    start = time.perf_counter()
+    # Tính cả việc chép vào shared memory và cấp phát đầu ra, như SeparationService.submit
+    with SharedArray.from_array(audio_array) as shared_input, SharedArray.create(audio_array.shape) as shared_output:
+        jobs.put(("shared", shared_input.handle, [shared_output.handle]))
+        lengths = results.get()
+        elapsed = time.perf_counter() - start
+        assert lengths == [audio_array.shape[-1]]
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 10, 30])
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    jobs, results = ctx.Queue(), ctx.Queue()
+    process = ctx.Process(target=_worker, args=(jobs, results), daemon=True)
+    process.start()
+    try:
+        print(f"{'minutes':>8} {'MB':>8} {'pickle':>10} {'shared':>10} {'speedup':>8}")
+        for minutes in args.minutes:
+            n = int(minutes * 60 * args.sample_rate)
+            audio_array = np.random.default_rng(0).standard_normal((2, n), dtype=np.float32)
+            pickled = min(roundtrip_pickle(jobs, results, audio_array) for _ in range(args.repeat))
+            shared = min(roundtrip_shared(jobs, results, audio_array) for _ in range(args.repeat))
+            print(f"{minutes:>8g} {audio_array.nbytes / (1024 * 1024):>8.1f} {pickled:>9.3f}s {shared:>9.3f}s {pickled / shared:>7.1f}x")
+            del audio_array
+    finally:
+        jobs.put(None)
+        process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
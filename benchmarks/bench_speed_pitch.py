@@ -0,0 +1,88 @@
+"""
+So sánh đổi tốc độ + cao độ theo hai bước cũ (change_speed rồi change_pitch: hai lượt phase vocoder
+và một lần resample) với bước gộp change_speed_pitch (một lượt phase vocoder, một lần resample).
+Thời gian đo trên tiếng ồn stereo; chất lượng đo trên một tổ hợp sin: tần số đỉnh so với tần số
+mong đợi và tỉ lệ năng lượng nằm ngoài các vạch mong đợi (dB, càng thấp càng tốt).
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_speed_pitch [--seconds 30] [--speed 1.25] [--pitch 3] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.audio_processor import AudioProcessor
+
+TONES = (220.0, 440.0, 880.0)
+
+
+def two_step(processor, audio_array, sample_rate, speed, n_steps):
+    audio_array, sample_rate = processor.change_speed(speed, audio_array, sample_rate)
+    return processor.change_pitch(n_steps, audio_array, sample_rate)[0]
+
+
+def combined(processor, audio_array, sample_rate, speed, n_steps):
+    return processor.change_speed_pitch(speed, n_steps, audio_array, sample_rate)[0]
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def tone_quality(output, sample_rate, n_steps):
+    """(Sai lệch lớn nhất của đỉnh phổ theo cent, năng lượng ngoài các vạch mong đợi theo dB)."""
+    # Bỏ nửa giây đầu/cuối để không tính hiệu ứng biên
+    trim = sample_rate // 2
+    y = output[trim:-trim] * np.hanning(len(output) - 2 * trim)
+    spectrum = np.abs(np.fft.rfft(y)) ** 2
+    freqs = np.fft.rfftfreq(len(y), 1.0 / sample_rate)
+    factor = 2.0 ** (n_steps / 12)
+    in_band = np.zeros(len(freqs), dtype=bool)
+    errors = []
+    for tone in TONES:
+        target = tone * factor
+        band = np.abs(freqs - target) < target * 0.01
+        in_band |= band
+        peak = freqs[band][np.argmax(spectrum[band])]
+        errors.append(abs(1200 * np.log2(peak / target)))
+    off = spectrum[~in_band].sum() / max(spectrum.sum(), 1e-20)
+    return max(errors), 10 * np.log10(max(off, 1e-20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--speed", type=float, default=1.25)
+    parser.add_argument("--pitch", type=float, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = AudioProcessor()
+    sr = args.sample_rate
+    n = int(args.seconds * sr)
+    noise = np.random.default_rng(0).standard_normal((2, n), dtype=np.float32) * 0.1
+    t = np.arange(n) / sr
+    tones = (sum(np.sin(2 * np.pi * f * t) for f in TONES) / len(TONES)).astype(np.float32)
+
+    print(f"{args.seconds:g} s stereo, speed {args.speed:g}, pitch {args.pitch:+g} semitones")
+    print(f"{'method':>10} {'time':>9} {'length':>9} {'cents':>7} {'off-tone':>9}")
+    for name, method in (("two-step", two_step), ("combined", combined)):
+        elapsed = best_time(lambda: method(processor, noise, sr, args.speed, args.pitch), args.repeat)
+        output = method(processor, tones, sr, args.speed, args.pitch)
+        cents, off_db = tone_quality(output, sr, args.pitch)
+        print(f"{name:>10} {elapsed:>8.3f}s {len(output):>9d} {cents:>7.2f} {off_db:>8.1f}dB")
+
+
+if __name__ == "__main__":
+    main()
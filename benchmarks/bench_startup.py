@@ -0,0 +1,73 @@
+"""
+Đo thời gian khởi động tới khi cửa sổ đầu tiên được vẽ (time-to-first-window), mỗi lần trong một
+tiến trình Python mới. So sánh cách hiện tại (TensorFlow/Spleeter, librosa, PyAudio nạp khi dùng lần đầu)
+với cách nạp sẵn tất cả như trước, và liệt kê các thư viện nặng đã bị import khi cửa sổ hiện ra.
+Khi không có màn hình (hoặc thiếu tkinterdnd2) chỉ đo thời gian import các module mà main.py dùng
+(cột mode là "imports", hoặc "partial" nếu có module giao diện không import được).
+
+Chạy từ thư mục gốc của repo:
+    python -m benchmarks.bench_startup [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("tensorflow", "spleeter", "librosa", "pyaudio", "matplotlib", "scipy")
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+if {eager!r}:
+    # Cách cũ: main.py nạp VocalSeparator (kéo theo Spleeter/TensorFlow), librosa, PyAudio và scipy.signal ngay từ đầu
+    for name in ("librosa", "pyaudio", "scipy.signal", "spleeter.separator"):
+        try:
+            __import__(name)
+        except Exception:
+            pass
+mode = "window"
+try:
+    from tkinterdnd2 import TkinterDnD
+    import main
+    root = TkinterDnD.Tk()
+    main.build_app(root)
+    root.update()
+except Exception:
+    mode = "imports"
+    for name in ("models.audio_loader", "models.audio_processor", "models.parallel_dsp", "models.audio_exporter",
+                 "controllers.audio_controller", "controllers.effect_controller",
+                 "views.main_view", "views.control_panel", "views.waveform_view"):
+        try:
+            __import__(name)
+        except ImportError:
+            mode = "partial"  # Thiếu thư viện giao diện (ví dụ tkinterdnd2)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"mode": mode, "seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(eager):
+    code = CHILD.format(root=ROOT, eager=eager, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'startup':>8} {'mode':>8} {'min':>8} {'median':>8}  heavy modules loaded")
+    for name, eager in (("lazy", False), ("eager", True)):
+        runs = [measure(eager) for _ in range(args.repeat)]
+        seconds = [run["seconds"] for run in runs]
+        print(f"{name:>8} {runs[-1]['mode']:>8} {min(seconds):>7.3f}s {statistics.median(seconds):>7.3f}s  "
+              f"{', '.join(runs[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,32 @@
 import os
 import threading
-import multiprocessing as mp
 import numpy as np
 from tkinter import messagebox
-from pydub import AudioSegment
-import soundfile as sf
 import tkinter as tk
 import time
 import logging
+import traceback
 import ffmpeg
 
-from controllers.effect_controller import separate_vocal_worker
+from models.audio_buffer import array_to_segment, segment_to_array
+from models.effect_graph import EffectGraph
+from models.undo_history import UndoHistory
+from models.waveform_peaks import PeakPyramid
+from models.analysis_cache import AnalysisCache
+from models.beat_analyzer import BeatAnalyzer
+from models.jobs import JobQueue, CancelledError
+from models.stream_effects import LiveEffectChain
 
 # Thiết lập logging để theo dõi hiệu suất
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Chu kỳ cập nhật vị trí phát trên giao diện (~60 khung hình/giây)
+PLAYHEAD_REFRESH_MS = 16
+# Bài dài hơn ngưỡng này được dò beat theo khối từ file thay vì librosa trên toàn bộ mảng
+STREAMING_BEATS_MIN_SECONDS = 600
+
 class AudioController:
-    def __init__(self, loader, processor, exporter, main_view, control_panel, waveform_view, effect_controller):
+    def __init__(self, loader, processor, exporter, main_view, control_panel, waveform_view, effect_controller, undo_memory_mb=1024):
         self.loader = loader
         self.processor = processor
         self.exporter = exporter
@@ -24,10 +34,17 @@ class AudioController:
         self.control_panel = control_panel
         self.waveform_view = waveform_view
         self.effect_controller = effect_controller
+        self.effect_graph = EffectGraph(processor)  # Bộ đệm kết quả từng bước hiệu ứng
+        self.analysis_cache = AnalysisCache()  # Bộ đệm trên đĩa cho đỉnh dạng sóng và beat
+        self.beat_analyzer = BeatAnalyzer(processor)  # Lưới beat tạm nhanh, tinh chỉnh ở luồng nền
+        # Áp dụng hiệu ứng, cắt và xuất file chạy lần lượt trên một luồng nền; yêu cầu mới cùng loại thay yêu cầu cũ
+        self.jobs = JobQueue(dispatch=lambda callback: self.main_view.root.after(0, callback))
         self.project_controller = None  # Sẽ được gán trong main.py
         self.audio = None
         self.original_audio = None  # Lưu trữ âm thanh gốc
+        self.original_array = None  # Mảng float32 của âm thanh gốc, đầu vào của chuỗi hiệu ứng
         self.audio_array = None
+        self.peaks = None  # Kim tự tháp đỉnh dạng sóng của audio_array
         self.sample_rate = None
         self.channels = None
         self.file_path = None
@@ -35,13 +52,14 @@ class AudioController:
         self.bitrate = None
         self.metadata = {}
         self.preview_process = None
-        self.undo_stack = []
-        self.redo_stack = []
+        self.history = UndoHistory(memory_limit_mb=undo_memory_mb)  # Lịch sử undo/redo có giới hạn bộ nhớ
+        self.source_token = None  # Trạng thái lịch sử chứa âm thanh gốc hiện tại
         self.beat_times = None
         self.tempo = None
         self.is_processing = False
         self.is_seeking = False  # Trạng thái tua
-        self.queue = mp.Queue()
+        self._separation_job = None  # Mã yêu cầu tách giọng đang chờ kết quả
+        self._pending_effects = None  # Bộ hiệu ứng của yêu cầu render gửi gần nhất
         self.volume_gain = 0.0
         self.speed = 1.0
         self.pitch_steps = 0.0
@@ -52,24 +70,29 @@ class AudioController:
         self.mid_gain = 0.0
         self.treble_gain = 0.0
         self._after_id = None
-        self._apply_lock = threading.Lock()
-        self.preview_start_offset = 0
+        # Giữ khi ghi nhận kết quả vào audio_array/lịch sử: công việc nền kiểm tra hủy và ghi nhận trong cùng
+        # một lần giữ khóa, undo/redo trên luồng giao diện chờ khóa nên không chen vào giữa
+        self._commit_lock = threading.Lock()
         self.last_timeline_position = 0
-        self.temp_preview_file = None  # Lưu đường dẫn file WAV tạm thời
+        self._playhead_after_id = None  # Lịch cập nhật vị trí phát theo tần số làm tươi màn hình
+        self.live_chain = None  # Chuỗi hiệu ứng chạy trực tiếp khi nghe thử
         # Gắn sự kiện tua cho thanh trượt
         self.waveform_view.timeline_slider.bind("<ButtonPress-1>", self.start_seeking)
         self.waveform_view.timeline_slider.bind("<ButtonRelease-1>", self.seek_audio)
 
     def _update_audio_arrays(self, audio_segment):
-        self.audio_array = np.array(audio_segment.get_array_of_samples())
-        if self.channels == 2:
-            self.audio_array = self.audio_array.reshape(-1, 2).T
-        else:
-            self.audio_array = self.audio_array.reshape(-1)
-        self.audio_array = self.audio_array / (2**15)
+        self.audio_array = segment_to_array(audio_segment)
         self.sample_rate = audio_segment.frame_rate
         self.duration = len(audio_segment) / 1000.0
 
+    def _set_audio_array(self, audio_array, sample_rate):
+        # Mảng float32 là dữ liệu chính; AudioSegment chỉ được tạo (lười) ở biên cho pydub
+        self.audio_array = audio_array
+        self.sample_rate = sample_rate
+        self.duration = audio_array.shape[-1] / float(sample_rate)
+        self.audio = array_to_segment(audio_array, sample_rate, self.channels)
+        self.peaks = PeakPyramid(audio_array, sample_rate)
+
     def handle_drop(self, event):
         if self.is_processing:
             messagebox.showwarning(
@@ -92,6 +115,10 @@ class AudioController:
             from tkinter import filedialog
             file_path = filedialog.askopenfilename(filetypes=[("Audio files", "*.mp3 *.wav *.ogg *.flac *.aac *.m4a *.wma")])
         if file_path:
+            # Hiệu ứng/cắt đang tính cho file cũ không còn dùng; bản xuất đang chờ sẽ đọc nhầm âm thanh của file mới
+            self.jobs.cancel("render")
+            self.jobs.cancel("cut")
+            self.jobs.cancel("export")
             self.is_processing = True
             self.control_panel.start_progress()
             self.main_view.update_status("Đang tải file âm thanh..." if self.main_view.current_lang == "vi" else "Loading audio file...")
@@ -100,11 +127,35 @@ class AudioController:
     def _load_file_thread(self, file_path):
         try:
             start_time = time.time()
-            self.audio, self.audio_array, self.sample_rate, self.channels, self.duration, self.bitrate, self.metadata = self.loader.load_audio(file_path)
-            self.original_audio = self.audio
-            self.file_path = file_path
-            self.save_state()
-            self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate))
+            # File đã mở trước đây: hiển thị ngay dạng sóng, beat và thông tin từ bộ đệm trong khi giải mã
+            cached = self.analysis_cache.load(file_path)
+            if cached is not None:
+                info = cached["info"]
+                self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(None, info["sample_rate"], cached["beat_times"], peaks=cached["peaks"]))
+                self.main_view.root.after(0, lambda: self.waveform_view.update_timeline(info["duration"]))
+                self.main_view.root.after(0, lambda: self.control_panel.update_file_info(
+                    info["duration"], info["channels"], info["sample_rate"], info["bitrate"], info["metadata"]
+                ))
+            audio, audio_array, sample_rate, channels, duration, bitrate, metadata = self.loader.load_audio(file_path)
+            peaks = cached["peaks"] if cached is not None else PeakPyramid(audio_array, sample_rate)
+            # Thay trạng thái và lịch sử trong _commit_lock: undo/redo hay một công việc cũ đang ghi nhận kết quả
+            # không được chen vào giữa lúc audio_array đã là của file mới mà lịch sử vẫn là của file cũ
+            with self._commit_lock:
+                self.audio, self.audio_array, self.sample_rate, self.channels = audio, audio_array, sample_rate, channels
+                self.duration, self.bitrate, self.metadata = duration, bitrate, metadata
+                self.original_audio = self.audio
+                self.original_array = self.audio_array
+                self.effect_graph.set_source(self.original_array, self.sample_rate, self.channels)
+                self.file_path = file_path
+                self.history.clear()
+                self.save_state(kind="load")
+                self.peaks = peaks
+                if cached is not None:
+                    self.peaks.audio_array = self.audio_array
+                    self.beat_times, self.tempo = cached["beat_times"], cached["tempo"]
+                else:
+                    self.beat_times, self.tempo = None, None
+            self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks))
             self.main_view.root.after(0, lambda: self.control_panel.set_cut_defaults(self.duration))
             self.main_view.root.after(0, lambda: self.waveform_view.update_timeline(self.duration))
             self.main_view.root.after(0, lambda: self.main_view.update_status(
@@ -116,8 +167,20 @@ class AudioController:
                 self.duration, self.channels, self.sample_rate, self.bitrate, self.metadata
             ))
             self.reset_effects()
-            self.beat_times, self.tempo = self.processor.detect_beats(self.audio_array, self.sample_rate)
-            self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times))
+            if cached is None:
+                # Lưới beat tạm hiện ngay; beat chính xác được tính ở luồng nền rồi thay vào
+                beat_start = time.time()
+                self.beat_times, self.tempo = self.beat_analyzer.quick(self.audio_array, self.sample_rate)
+                logging.info(f"Provisional beat grid ({self.tempo:.1f} BPM) in {time.time() - beat_start:.2f} seconds")
+                self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks))
+                # Đỉnh dạng sóng của âm thanh vừa tải được truyền theo: lúc lưu bộ đệm, self.peaks có thể đã là của bản đã áp dụng hiệu ứng
+                threading.Thread(target=self._refine_beats_thread, args=(file_path, self.original_array, self.sample_rate, self.beat_times, self.peaks, {
+                    "duration": self.duration,
+                    "channels": self.channels,
+                    "sample_rate": self.sample_rate,
+                    "bitrate": self.bitrate,
+                    "metadata": self.metadata
+                }), daemon=True).start()
             logging.info(f"Loaded file {file_path} in {time.time() - start_time:.2f} seconds")
         except Exception as e:
             self.main_view.root.after(0, lambda e=e: messagebox.showerror(
@@ -127,63 +190,61 @@ class AudioController:
             self.is_processing = False
             self.main_view.root.after(0, self.control_panel.stop_progress)
 
-    def save_state(self):
-        state = {
-            "audio": self.audio,
-            "audio_array": self.audio_array.copy() if self.audio_array is not None else None,
-            "sample_rate": self.sample_rate,
-            "duration": self.duration,
-            "volume_gain": self.volume_gain,
-            "speed": self.speed,
-            "pitch_steps": self.pitch_steps,
-            "reverb_enabled": self.reverb_enabled,
-            "echo_enabled": self.echo_enabled,
-            "fade_enabled": self.fade_enabled,
-            "bass_gain": self.bass_gain,
-            "mid_gain": self.mid_gain,
-            "treble_gain": self.treble_gain
-        }
-        self.undo_stack.append(state)
-        self.redo_stack.clear()
+    def _refine_beats_thread(self, file_path, audio_array, sample_rate, provisional, peaks, info):
+        try:
+            start_time = time.time()
+            if info["duration"] >= STREAMING_BEATS_MIN_SECONDS:
+                beat_times, tempo = self._stream_beats(file_path, audio_array, sample_rate, provisional)
+            else:
+                beat_times, tempo = self.beat_analyzer.refine(audio_array, sample_rate)
+            logging.info(f"Refined beats ({float(np.atleast_1d(tempo)[0]):.1f} BPM) in {time.time() - start_time:.2f} seconds")
+            # Bỏ kết quả nếu trong lúc tính người dùng đã mở file khác
+            if self.original_array is not audio_array:
+                return
+            self.beat_times, self.tempo = beat_times, tempo
+            self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks))
+            self.analysis_cache.store(file_path, peaks, beat_times, tempo, info)
+        except Exception as e:
+            # Giữ lưới beat tạm nếu tinh chỉnh lỗi
+            logging.error(f"Beat refinement failed: {str(e)}")
+
+    def _stream_beats(self, file_path, audio_array, sample_rate, provisional):
+        """
+        Dò beat theo khối đọc từ file; bộ nhớ không phụ thuộc độ dài bài. Trong lúc chạy, dạng sóng hiển thị
+        beat đã dò được cho phần đã phân tích và lưới tạm cho phần còn lại, vẽ lại tối đa mỗi giây một lần.
+        """
+        found = []
+        last_draw = [0.0]
+
+        def on_beats(beats, analyzed, tempo):
+            found.append(beats)
+            if self.original_array is not audio_array or time.time() - last_draw[0] < 1.0:
+                return
+            last_draw[0] = time.time()
+            self.beat_times = np.concatenate(found + [provisional[provisional > analyzed]])
+            self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks))
 
-    def undo(self):
-        if not self.undo_stack or len(self.undo_stack) < 2:
-            return
-        current_state = self.undo_stack.pop()
-        self.redo_stack.append(current_state)
-        previous_state = self.undo_stack[-1]
-        self.audio = previous_state["audio"]
-        self.audio_array = previous_state["audio_array"]
-        self.sample_rate = previous_state["sample_rate"]
-        self.duration = previous_state["duration"]
-        self.volume_gain = previous_state["volume_gain"]
-        self.speed = previous_state["speed"]
-        self.pitch_steps = previous_state["pitch_steps"]
-        self.reverb_enabled = previous_state["reverb_enabled"]
-        self.echo_enabled = previous_state["echo_enabled"]
-        self.fade_enabled = previous_state["fade_enabled"]
-        self.bass_gain = previous_state["bass_gain"]
-        self.mid_gain = previous_state["mid_gain"]
-        self.treble_gain = previous_state["treble_gain"]
-        self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times)
-        self.control_panel.volume_slider.set(self.volume_gain)
-        self.control_panel.speed_slider.set(self.speed)
-        self.control_panel.pitch_slider.set(self.pitch_steps)
-        self.control_panel.bass_slider.set(self.bass_gain)
-        self.control_panel.mid_slider.set(self.mid_gain)
-        self.control_panel.treble_slider.set(self.treble_gain)
-        self.control_panel.set_cut_defaults(self.duration)
-        self.waveform_view.update_timeline(self.duration)
+        return self.beat_analyzer.stream(self.loader.stream_audio(file_path), sample_rate, on_beats)
 
-    def redo(self):
-        if not self.redo_stack:
-            return
-        state = self.redo_stack.pop()
-        self.undo_stack.append(state)
-        self.audio = state["audio"]
+    def save_state(self, kind="apply", cut_range=None):
+        state = self._effect_settings()
+        state.update({
+            "audio_array": self.audio_array,
+            "sample_rate": self.sample_rate
+        })
+        self.source_token = self.history.push(state, kind=kind, cut_range=cut_range)
+
+    def _restore_state(self, state):
         self.audio_array = state["audio_array"]
         self.sample_rate = state["sample_rate"]
         self.duration = state["duration"]
+        self.audio = array_to_segment(self.audio_array, self.sample_rate, self.channels)
+        self.peaks = PeakPyramid(self.audio_array, self.sample_rate)
+        if state["source_token"] is not self.source_token:
+            self.source_token = state["source_token"]
+            self.original_array = state["source_array"]
+            self.original_audio = array_to_segment(self.original_array, self.sample_rate, self.channels)
+            self.effect_graph.set_source(self.original_array, self.sample_rate, self.channels)
         self.volume_gain = state["volume_gain"]
         self.speed = state["speed"]
         self.pitch_steps = state["pitch_steps"]
@@ -193,7 +254,7 @@ class AudioController:
         self.bass_gain = state["bass_gain"]
         self.mid_gain = state["mid_gain"]
         self.treble_gain = state["treble_gain"]
-        self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times)
+        self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks)
         self.control_panel.volume_slider.set(self.volume_gain)
         self.control_panel.speed_slider.set(self.speed)
         self.control_panel.pitch_slider.set(self.pitch_steps)
@@ -203,6 +264,28 @@ class AudioController:
         self.control_panel.set_cut_defaults(self.duration)
         self.waveform_view.update_timeline(self.duration)
 
+    def undo(self):
+        self._cancel_edits()
+        with self._commit_lock:
+            state = self.history.undo()
+            if state is None:
+                return
+            self._restore_state(state)
+
+    def redo(self):
+        self._cancel_edits()
+        with self._commit_lock:
+            state = self.history.redo()
+            if state is None:
+                return
+            self._restore_state(state)
+
+    def _cancel_edits(self):
+        # Hiệu ứng/cắt đang chờ được tính trên trạng thái sắp bị thay nên hủy trước khi undo/redo. Công việc đang
+        # ghi nhận kết quả (đã qua lần kiểm tra cuối) giữ _commit_lock, undo/redo chờ nó xong rồi mới chạy
+        self.jobs.cancel("render")
+        self.jobs.cancel("cut")
+
     def cut_audio(self):
         if self.is_processing:
             messagebox.showwarning(
@@ -225,37 +308,40 @@ class AudioController:
             end = float(end)
             if start < 0 or end <= start or end > self.duration:
                 raise ValueError(f"Thời gian không hợp lệ: Thời gian bắt đầu phải nhỏ hơn thời gian kết thúc và trong phạm vi {self.duration:.3f}s")
-            self.is_processing = True
-            self.control_panel.start_progress()
             self.main_view.update_status("Đang cắt âm thanh..." if self.main_view.current_lang == "vi" else "Cutting audio...")
-            threading.Thread(target=self._cut_audio_thread, args=(start, end), daemon=True).start()
+            duration = self.duration
+            self._submit_job("cut", lambda ctx: self._cut_audio_job(start, end, duration, ctx), self._cut_audio_done)
         except ValueError as e:
             messagebox.showerror(
                 "Lỗi" if self.main_view.current_lang == "vi" else "Error",
                 f"Thời gian không hợp lệ: {str(e)}" if self.main_view.current_lang == "vi" else f"Invalid time: {str(e)}"
             )
 
-    def _cut_audio_thread(self, start, end):
-        try:
-            self.audio = self.processor.cut_audio(self.audio, start, end, self.duration)
+    def _cut_audio_job(self, start, end, duration, ctx):
+        # Chạy trên luồng của JobQueue, sau các yêu cầu hiệu ứng gửi trước đó. Cắt chỉ là lấy lát mảng
+        # nên làm trọn trong khóa, đọc audio_array cùng lúc với ghi nhận
+        with self._commit_lock:
+            ctx.check()
+            # Thời gian cắt được chọn trên âm thanh lúc bấm; render chạy trước (đổi tốc độ) có thể đã đổi độ dài
+            if self.duration != duration or end > self.duration:
+                raise ValueError(f"Thời gian không hợp lệ: âm thanh đã đổi độ dài ({self.duration:.3f}s), vui lòng chọn lại đoạn cắt")
+            audio_array = np.ascontiguousarray(self.processor.cut_audio(self.audio_array, start, end, self.duration, self.sample_rate))
+            cut_range = (int(round(start * self.sample_rate)), int(round(start * self.sample_rate)) + audio_array.shape[-1])
+            self._set_audio_array(audio_array, self.sample_rate)
             self.original_audio = self.audio
-            self._update_audio_arrays(self.audio)
-            self.save_state()
-            self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times))
-            self.main_view.root.after(0, lambda: self.control_panel.set_cut_defaults(self.duration))
-            self.main_view.root.after(0, lambda: self.waveform_view.update_timeline(self.duration))
-            self.main_view.root.after(0, lambda: self.main_view.update_status(
-                "Đã cắt âm thanh" if self.main_view.current_lang == "vi" else "Audio cut completed"
-            ))
-        except Exception as e:
-            self.main_view.root.after(0, lambda: messagebox.showerror(
-                "Lỗi" if self.main_view.current_lang == "vi" else "Error", str(e)
-            ))
-        finally:
-            self.is_processing = False
-            self.main_view.root.after(0, self.control_panel.stop_progress)
+            self.original_array = self.audio_array
+            self.effect_graph.set_source(self.original_array, self.sample_rate, self.channels)
+            self.save_state(kind="cut", cut_range=cut_range)
+
+    def _cut_audio_done(self, result):
+        self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks)
+        self.control_panel.set_cut_defaults(self.duration)
+        self.waveform_view.update_timeline(self.duration)
+        self.main_view.update_status("Đã cắt âm thanh" if self.main_view.current_lang == "vi" else "Audio cut completed")
+        self._job_finished()
 
-    def apply_all(self):
+    def apply_all(self, toggle=None):
+        """toggle: khóa bật/tắt (ví dụ "reverb_enabled") được đảo trong yêu cầu này; chỉ ghi nhận khi render xong."""
         if self.is_processing:
             messagebox.showwarning(
                 "Cảnh báo" if self.main_view.current_lang == "vi" else "Warning",
@@ -268,137 +354,121 @@ class AudioController:
                 "Vui lòng tải file âm thanh trước" if self.main_view.current_lang == "vi" else "Please load an audio file first"
             )
             return
-        with self._apply_lock:
-            if self.is_processing:
-                return
-            self.is_processing = True
-        self.control_panel.start_progress()
+        # Đọc thanh trượt trên luồng giao diện; yêu cầu hiệu ứng đang chạy (nếu có) bị hủy và thay bằng yêu cầu này
+        effects = self._requested_effects()
+        if toggle is not None:
+            effects[toggle] = not effects[toggle]
+        effects.update({
+            "volume_gain": float(self.control_panel.volume_slider.get()),
+            "speed": float(self.control_panel.speed_slider.get()),
+            "pitch_steps": float(self.control_panel.pitch_slider.get()),
+            "bass_gain": float(self.control_panel.bass_slider.get()),
+            "mid_gain": float(self.control_panel.mid_slider.get()),
+            "treble_gain": float(self.control_panel.treble_slider.get())
+        })
+        self._pending_effects = effects
         self.main_view.update_status("Đang xử lý hiệu ứng..." if self.main_view.current_lang == "vi" else "Applying effects...")
-        threading.Thread(target=self._apply_all_thread, daemon=True).start()
+        self._submit_job("render", lambda ctx: self._apply_all_job(effects, ctx), self._apply_all_done)
+        if toggle is not None:
+            self.update_live_effects()
+
+    def _apply_all_job(self, effects, ctx):
+        source = self.original_array
+        if source is None:
+            raise ValueError("Không có âm thanh gốc để áp dụng hiệu ứng")
+        # Toàn bộ chuỗi hiệu ứng chạy trên bộ đệm float32, các bước không đổi được lấy từ bộ đệm;
+        # bị hủy giữa chừng thì các bước đã xong vẫn được giữ cho lần render thay thế
+        audio_array, sr = self.effect_graph.render(effects, ctx)
+        with self._commit_lock:
+            ctx.check()
+            if self.original_array is not source:
+                raise CancelledError("Source audio changed during render")
+            for key, value in effects.items():
+                setattr(self, key, value)
+            self._set_audio_array(audio_array, sr)
+            self.save_state()
 
-    def _apply_all_thread(self):
-        try:
-            with self._apply_lock:
-                if self.original_audio is not None:
-                    self._update_audio_arrays(self.original_audio)
-                else:
-                    raise ValueError("Không có âm thanh gốc để áp dụng hiệu ứng")
-
-                self.volume_gain = float(self.control_panel.volume_slider.get())
-                self.speed = float(self.control_panel.speed_slider.get())
-                self.pitch_steps = float(self.control_panel.pitch_slider.get())
-                self.bass_gain = float(self.control_panel.bass_slider.get())
-                self.mid_gain = float(self.control_panel.mid_slider.get())
-                self.treble_gain = float(self.control_panel.treble_slider.get())
-                audio = self.original_audio
-
-                if self.volume_gain != 0:
-                    audio = self.processor.change_volume(self.volume_gain, audio)
-                    self._update_audio_arrays(audio)
-
-                if self.speed != 1.0:
-                    audio_array, sr = self.processor.change_speed(self.speed, self.audio_array, self.sample_rate)
-                    temp_wav = os.path.join(os.path.dirname(self.file_path or "."), "temp_speed.wav")
-                    sf.write(temp_wav, audio_array.T if len(audio_array.shape) > 1 else audio_array, sr)
-                    audio = AudioSegment.from_wav(temp_wav)
-                    try:
-                        os.remove(temp_wav)
-                    except Exception as e:
-                        print(f"Warning: Could not remove {temp_wav}: {str(e)}")
-                    self._update_audio_arrays(audio)
-
-                if self.pitch_steps != 0:
-                    audio_array, sr = self.processor.change_pitch(self.pitch_steps, self.audio_array, self.sample_rate)
-                    temp_wav = os.path.join(os.path.dirname(self.file_path or "."), "temp_pitch.wav")
-                    sf.write(temp_wav, audio_array.T if len(audio_array.shape) > 1 else audio_array, sr)
-                    audio = AudioSegment.from_wav(temp_wav)
-                    try:
-                        os.remove(temp_wav)
-                    except Exception as e:
-                        print(f"Warning: Could not remove {temp_wav}: {str(e)}")
-                    self._update_audio_arrays(audio)
-
-                if self.reverb_enabled:
-                    audio_array = self.processor.add_reverb(audio, self.channels)
-                    temp_wav = os.path.join(os.path.dirname(self.file_path or "."), "temp_reverb.wav")
-                    if len(audio_array.shape) > 1:
-                        sf.write(temp_wav, audio_array, self.sample_rate, subtype='PCM_16')
-                    else:
-                        sf.write(temp_wav, audio_array, self.sample_rate, subtype='PCM_16')
-                    try:
-                        audio = AudioSegment.from_wav(temp_wav)
-                    except Exception as e:
-                        raise Exception(f"Error reading temp_reverb.wav: {str(e)}")
-                    try:
-                        os.remove(temp_wav)
-                    except Exception as e:
-                        print(f"Warning: Could not remove {temp_wav}: {str(e)}")
-                    self._update_audio_arrays(audio)
-
-                if self.echo_enabled:
-                    audio = self.processor.add_echo(audio)
-                    self._update_audio_arrays(audio)
-
-                if self.fade_enabled:
-                    audio = self.processor.fade_in_out(audio)
-                    self._update_audio_arrays(audio)
-
-                if self.bass_gain != 0 or self.mid_gain != 0 or self.treble_gain != 0:
-                    audio_array, sr = self.processor.apply_equalizer(self.audio_array, self.sample_rate, self.channels, self.bass_gain, self.mid_gain, self.treble_gain)
-                    temp_wav = os.path.join(os.path.dirname(self.file_path or "."), "temp_eq.wav")
-                    sf.write(temp_wav, audio_array.T if len(audio_array.shape) > 1 else audio_array, sr)
-                    audio = AudioSegment.from_wav(temp_wav)
-                    try:
-                        os.remove(temp_wav)
-                    except Exception as e:
-                        print(f"Warning: Could not remove {temp_wav}: {str(e)}")
-                    self._update_audio_arrays(audio)
-
-                self.audio = audio
-                self.save_state()
-                self.main_view.root.after(0, lambda: self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times))
-                self.main_view.root.after(0, lambda: self.control_panel.set_cut_defaults(self.duration))
-                self.main_view.root.after(0, lambda: self.waveform_view.update_timeline(self.duration))
-                self.main_view.root.after(0, lambda: self.main_view.update_status(
-                    "Đã áp dụng hiệu ứng" if self.main_view.current_lang == "vi" else "Effects applied"
-                ))
-        except Exception as e:
-            self.main_view.root.after(0, lambda: messagebox.showerror(
-                "Lỗi" if self.main_view.current_lang == "vi" else "Error", str(e)
-            ))
-        finally:
-            self.is_processing = False
-            self.main_view.root.after(0, self.control_panel.stop_progress)
+    def _apply_all_done(self, result):
+        self.waveform_view.update_waveform(self.audio_array, self.sample_rate, self.beat_times, peaks=self.peaks)
+        self.control_panel.set_cut_defaults(self.duration)
+        self.waveform_view.update_timeline(self.duration)
+        self.main_view.update_status("Đã áp dụng hiệu ứng" if self.main_view.current_lang == "vi" else "Effects applied")
+        self._job_finished()
+
+    def _submit_job(self, key, func, on_done, on_error=None, on_cancel=None):
+        self.control_panel.set_progress(0)
+        self.control_panel.cancel_button.config(state="normal")
+        self.jobs.submit(key, func, on_done=on_done, on_error=on_error or self._job_failed,
+                         on_progress=self.control_panel.set_progress, on_cancel=on_cancel or self._job_cancelled)
+
+    def _job_finished(self):
+        # Thanh tiến độ và nút Hủy chỉ được trả về khi không còn công việc nào đang chờ hay đang chạy
+        if self.jobs.is_busy() or self._separation_job is not None:
+            return
+        self.control_panel.stop_progress()
+        self.control_panel.cancel_button.config(state="disabled")
 
-    def toggle_reverb(self):
-        if self.is_processing:
-            messagebox.showwarning(
-                "Cảnh báo" if self.main_view.current_lang == "vi" else "Warning",
-                "Đang xử lý, vui lòng chờ!" if self.main_view.current_lang == "vi" else "Processing, please wait!"
-            )
+    def _job_failed(self, error):
+        self._job_finished()
+        messagebox.showerror("Lỗi" if self.main_view.current_lang == "vi" else "Error", str(error))
+
+    def _job_cancelled(self):
+        # Công việc bị thay bằng yêu cầu mới thì công việc mới sẽ tự cập nhật trạng thái
+        if self.jobs.is_busy():
             return
-        self.reverb_enabled = not self.reverb_enabled
-        self.apply_all()
+        self.main_view.update_status("Đã hủy thao tác" if self.main_view.current_lang == "vi" else "Operation cancelled")
+        self._job_finished()
+
+    def cancel_operation(self):
+        """Hủy hiệu ứng, cắt, xuất file và tách giọng đang chạy; mỗi thao tác dừng ở khối/đoạn kế tiếp."""
+        self.jobs.cancel()
+        if self._separation_job is not None:
+            self.effect_controller.separation_service.cancel(self._separation_job)
+            self.main_view.update_status("Đang hủy tách giọng..." if self.main_view.current_lang == "vi" else "Cancelling separation...")
+
+    def _effect_settings(self):
+        return {
+            "volume_gain": self.volume_gain,
+            "speed": self.speed,
+            "pitch_steps": self.pitch_steps,
+            "reverb_enabled": self.reverb_enabled,
+            "echo_enabled": self.echo_enabled,
+            "fade_enabled": self.fade_enabled,
+            "bass_gain": self.bass_gain,
+            "mid_gain": self.mid_gain,
+            "treble_gain": self.treble_gain
+        }
+
+    def _requested_effects(self):
+        # Hiệu ứng của yêu cầu render mới nhất còn đang chờ/chạy, nếu không thì của trạng thái đã ghi nhận.
+        # Bật/tắt liên tiếp dựa trên đây nên hai lần bấm nhanh vẫn đảo lại đúng
+        if self._pending_effects is not None and self.jobs.is_busy("render"):
+            return dict(self._pending_effects)
+        return self._effect_settings()
+
+    def _live_effect_settings(self):
+        # Đọc thẳng thanh trượt thay vì giá trị đã áp dụng lần cuối
+        effects = self._requested_effects()
+        effects.update({
+            "volume_gain": float(self.control_panel.volume_slider.get()),
+            "bass_gain": float(self.control_panel.bass_slider.get()),
+            "mid_gain": float(self.control_panel.mid_slider.get()),
+            "treble_gain": float(self.control_panel.treble_slider.get())
+        })
+        return effects
+
+    def update_live_effects(self, value=None):
+        if self.live_chain is not None and self.exporter.is_previewing:
+            self.live_chain.update(self._live_effect_settings())
+
+    def toggle_reverb(self):
+        self.apply_all(toggle="reverb_enabled")
 
     def toggle_echo(self):
-        if self.is_processing:
-            messagebox.showwarning(
-                "Cảnh báo" if self.main_view.current_lang == "vi" else "Warning",
-                "Đang xử lý, vui lòng chờ!" if self.main_view.current_lang == "vi" else "Processing, please wait!"
-            )
-            return
-        self.echo_enabled = not self.echo_enabled
-        self.apply_all()
+        self.apply_all(toggle="echo_enabled")
 
     def toggle_fade(self):
-        if self.is_processing:
-            messagebox.showwarning(
-                "Cảnh báo" if self.main_view.current_lang == "vi" else "Warning",
-                "Đang xử lý, vui lòng chờ!" if self.main_view.current_lang == "vi" else "Processing, please wait!"
-            )
-            return
-        self.fade_enabled = not self.fade_enabled
-        self.apply_all()
+        self.apply_all(toggle="fade_enabled")
 
     def separate_vocal(self):
         if self.is_processing:
@@ -417,47 +487,85 @@ class AudioController:
             self.main_view.root.after_cancel(self._after_id)
             self._after_id = None
         self.is_processing = True
+        # Chạy vô định cho tới khi tiến trình tách giọng báo tiến độ của cửa sổ đầu tiên (lần đầu còn phải nạp mô hình)
         self.control_panel.start_progress()
+        self.control_panel.cancel_button.config(state="normal")
         self.main_view.update_status("Đang tách giọng hát..." if self.main_view.current_lang == "vi" else "Separating vocals...")
-        process = mp.Process(target=separate_vocal_worker, args=(self.audio_array.copy(), self.sample_rate, self.channels, self.queue))
-        process.start()
+        # Gửi yêu cầu cho tiến trình tách giọng thường trực (mô hình chỉ nạp một lần)
+        self._separation_job = self.effect_controller.separation_service.submit(self.audio_array, self.sample_rate, self.channels)
         self._check_separate_vocal_result()
 
     def _check_separate_vocal_result(self):
-        if not self.queue.empty():
-            result = self.queue.get()
+        service = self.effect_controller.separation_service
+        results = []
+        for r in service.poll():
+            if r[0] == "progress":
+                if r[1] == self._separation_job:
+                    self.control_panel.set_progress(r[2])
+            elif r[1] == self._separation_job:
+                results.append(r)
+            elif r[0] == "success":
+                service.release(r[1])  # Kết quả của yêu cầu cũ không còn dùng
+        r = None  # Bỏ tham chiếu tới tuple kết quả (giữ view vào stem) trước khi release()
+        if results:
+            result = results[0]
+            self._separation_job = None
             if result[0] == "success":
-                vocal, instrumental = result[1], result[2]
-                output_dir = os.path.dirname(self.file_path or ".")
-                
-                # Chuyển vocal thành AudioSegment
-                temp_vocal_wav = os.path.join(output_dir, "temp_vocal.wav")
-                sf.write(temp_vocal_wav, vocal.T if len(vocal.shape) > 1 else vocal, self.sample_rate, subtype='PCM_16')
-                vocal_segment = AudioSegment.from_wav(temp_vocal_wav)
-                self.exporter.export_audio(vocal_segment, "wav", os.path.join(output_dir, "vocal.wav"), self.file_path, self.sample_rate, self.channels)
-                os.remove(temp_vocal_wav)
-                
-                # Chuyển instrumental thành AudioSegment
-                temp_instrumental_wav = os.path.join(output_dir, "temp_instrumental.wav")
-                sf.write(temp_instrumental_wav, instrumental.T if len(instrumental.shape) > 1 else instrumental, self.sample_rate, subtype='PCM_16')
-                instrumental_segment = AudioSegment.from_wav(temp_instrumental_wav)
-                self.exporter.export_audio(instrumental_segment, "wav", os.path.join(output_dir, "instrumental.wav"), self.file_path, self.sample_rate, self.channels)
-                os.remove(temp_instrumental_wav)
-                
-                self.main_view.root.after(0, lambda: self.main_view.update_status(
-                    "Đã tách giọng hát và nhạc nền" if self.main_view.current_lang == "vi" else "Vocals and instrumental separated"
-                ))
+                # vocal/instrumental trỏ vào shared memory của dịch vụ: chỉ danh sách stems còn giữ chúng
+                stems = [result[2], result[3]]
+                job_id = result[1]
+                result = results = None
+                self._write_stems(job_id, stems)
+            elif result[0] == "cancelled":
+                self.main_view.update_status("Đã hủy tách giọng" if self.main_view.current_lang == "vi" else "Vocal separation cancelled")
             else:
-                error_msg = result[1]
+                error_msg = result[2]
                 self.main_view.root.after(0, lambda: messagebox.showerror(
                     "Lỗi" if self.main_view.current_lang == "vi" else "Error", error_msg
                 ))
             self.is_processing = False
-            self.main_view.root.after(0, self.control_panel.stop_progress)
             self._after_id = None
+            self.main_view.root.after(0, self._job_finished)
         else:
             self._after_id = self.main_view.root.after(100, self._check_separate_vocal_result)
 
+    def _write_stems(self, job_id, stems):
+        # Ghi vocal.wav/instrumental.wav trên luồng công việc như nút Xuất, thẳng từ shared memory của dịch vụ
+        # (không qua WAV tạm/AudioSegment). Vùng nhớ được giải phóng trên luồng giao diện khi công việc kết thúc
+        service = self.effect_controller.separation_service
+        file_path = self.file_path
+        output_dir = os.path.dirname(file_path or ".")
+
+        def write(ctx):
+            for i, name in enumerate(("vocal.wav", "instrumental.wav")):
+                stem = stems[i]
+                channels = stem.shape[0] if stem.ndim > 1 else 1
+                self.exporter.export_audio(stem, "wav", os.path.join(output_dir, name), file_path,
+                                           service.STEM_SAMPLE_RATE, channels, ctx=ctx.subrange(i / 2.0, (i + 1) / 2.0))
+
+        def release(error=None):
+            stems.clear()
+            if error is not None:
+                # Frame trong traceback vẫn giữ view vào stem
+                traceback.clear_frames(error.__traceback__)
+            service.release(job_id)
+
+        def done(result):
+            release()
+            self.main_view.update_status("Đã tách giọng hát và nhạc nền" if self.main_view.current_lang == "vi" else "Vocals and instrumental separated")
+            self._job_finished()
+
+        def failed(error):
+            release(error)
+            self._job_failed(error)
+
+        def cancelled():
+            release()
+            self._job_cancelled()
+
+        self.main_view.update_status("Đang ghi giọng hát và nhạc nền..." if self.main_view.current_lang == "vi" else "Writing vocals and instrumental...")
+        self._submit_job("stems", write, done, on_error=failed, on_cancel=cancelled)
+
     def preview_audio(self):
         if self.is_processing:
             messagebox.showwarning(
@@ -483,15 +591,25 @@ class AudioController:
             self.is_processing = True
             self.control_panel.start_progress()
             self.main_view.update_status("Đang phát thử..." if self.main_view.current_lang == "vi" else "Previewing...")
-            self.preview_start_offset = start
             self.last_timeline_position = start
-            # Xuất file WAV tạm thời từ self.audio (chứa effect)
-            self.temp_preview_file = os.path.join(os.path.dirname(self.file_path or "."), "audio_preview.wav")
-            self.audio.export(self.temp_preview_file, format="wav")
-            self.exporter.preview_audio(self.temp_preview_file, self.sample_rate, self.channels, start, end)
+            live = self.control_panel.live_preview_var.get()
+            if live and (self.speed != 1.0 or self.pitch_steps != 0):
+                # LiveEffectChain không đổi tốc độ/cao độ, còn start/end và vị trí phát tính theo dạng sóng đã xử lý:
+                # phát bản đã render để đúng đoạn và đúng con trỏ
+                live = False
+                logging.info("Live preview disabled: speed/pitch changes require the rendered audio")
+            if live:
+                # Phát âm thanh gốc, hiệu ứng chạy theo khối trong callback với giá trị thanh trượt hiện tại
+                self.live_chain = LiveEffectChain(self.sample_rate, self.channels, self.original_array.shape[-1])
+                self.live_chain.update(self._live_effect_settings())
+                self.exporter.preview_audio(self.original_array, self.sample_rate, start, end, effect_chain=self.live_chain)
+            else:
+                # Phát thẳng từ audio_array (đã có effect) qua stream phát thử thường trực
+                self.live_chain = None
+                self.exporter.preview_audio(self.audio_array, self.sample_rate, start, end)
             self.control_panel.preview_button.config(state="disabled")
             self.control_panel.stop_button.config(state="normal")
-            threading.Thread(target=self._preview_manager, daemon=True).start()
+            self._schedule_playhead()
         except ValueError as e:
             messagebox.showerror(
                 "Lỗi" if self.main_view.current_lang == "vi" else "Error",
@@ -506,70 +624,57 @@ class AudioController:
             self.is_processing = False
             self.control_panel.stop_progress()
 
-    def _preview_manager(self):
-        preview_duration = float(self.control_panel.end_entry.get()) - self.preview_start_offset
-        start_time = time.time()
-        while self.exporter.is_previewing:
-            elapsed = time.time() - start_time
-            position = elapsed + self.preview_start_offset
-            if not self.is_seeking and abs(position - self.last_timeline_position) >= 0.1 and position <= self.duration:
-                self.last_timeline_position = position
-                self.main_view.root.after(0, lambda: self.waveform_view.update_timeline_position(position, self.duration))
-                self.main_view.root.after(0, lambda: self.waveform_view.timeline_slider.set(position))
-            if elapsed >= preview_duration:
-                self.exporter.stop_preview(self.temp_preview_file, None)
-                break
-            time.sleep(0.1)
-        self.main_view.root.after(0, lambda: self.waveform_view.update_timeline_position(0, self.duration))
-        self.main_view.root.after(0, lambda: self.waveform_view.timeline_slider.set(0))
-        self.main_view.root.after(0, lambda: self.main_view.update_status(
-            "Đã dừng phát" if self.main_view.current_lang == "vi" else "Playback stopped"
-        ))
-        self.main_view.root.after(0, lambda: self.control_panel.preview_button.config(state="normal"))
-        self.main_view.root.after(0, lambda: self.control_panel.stop_button.config(state="disabled"))
+    def _schedule_playhead(self):
+        if self._playhead_after_id is not None:
+            self.main_view.root.after_cancel(self._playhead_after_id)
+        self._playhead_after_id = self.main_view.root.after(PLAYHEAD_REFRESH_MS, self._update_playhead)
+
+    def _update_playhead(self):
+        # Đọc vị trí thật từ bộ phát (số mẫu đã phát theo đồng hồ stream) ngay trên luồng giao diện
+        self._playhead_after_id = None
+        if not self.exporter.is_previewing:
+            self._finish_preview()
+            return
+        position = self.exporter.get_preview_position()
+        if not self.is_seeking and position != self.last_timeline_position and position <= self.duration:
+            self.last_timeline_position = position
+            self.waveform_view.update_timeline_position(position, self.duration)
+            self.waveform_view.timeline_slider.set(position)
+        self._schedule_playhead()
+
+    def _finish_preview(self):
+        if self._playhead_after_id is not None:
+            self.main_view.root.after_cancel(self._playhead_after_id)
+            self._playhead_after_id = None
+        self.waveform_view.update_timeline_position(0, self.duration)
+        self.waveform_view.timeline_slider.set(0)
+        self.main_view.update_status("Đã dừng phát" if self.main_view.current_lang == "vi" else "Playback stopped")
+        self.control_panel.preview_button.config(state="normal")
+        self.control_panel.stop_button.config(state="disabled")
         self.last_timeline_position = 0
         self.is_seeking = False
-        # Xóa file WAV tạm thời
-        if self.temp_preview_file and os.path.exists(self.temp_preview_file):
-            try:
-                os.remove(self.temp_preview_file)
-            except Exception as e:
-                logging.warning(f"Could not remove {self.temp_preview_file}: {str(e)}")
-        self.temp_preview_file = None
+        self.live_chain = None
         logging.info("Preview stopped")
 
     def start_seeking(self, event):
         self.is_seeking = True
 
     def seek_audio(self, event):
-        if not self.temp_preview_file or not self.exporter.is_previewing:
+        if not self.exporter.is_previewing:
             self.is_seeking = False
             return
         new_position = self.waveform_view.timeline_slider.get()
-        if new_position < self.preview_start_offset or new_position > float(self.control_panel.end_entry.get()):
+        if new_position < float(self.control_panel.start_entry.get()) or new_position > float(self.control_panel.end_entry.get()):
             self.is_seeking = False
             return
-        self.exporter.stop_preview(self.temp_preview_file, None)
-        self.preview_start_offset = new_position
+        # Chỉ dời con trỏ đọc của bộ phát, stream vẫn chạy
+        self.exporter.seek_preview(new_position)
         self.last_timeline_position = new_position
-        self.exporter.preview_audio(self.temp_preview_file, self.sample_rate, self.channels, new_position, float(self.control_panel.end_entry.get()))
         self.is_seeking = False
-        threading.Thread(target=self._preview_manager, daemon=True).start()
 
     def stop_preview(self):
-        self.exporter.stop_preview(self.temp_preview_file, None)
-        self.main_view.update_status("Đã dừng phát" if self.main_view.current_lang == "vi" else "Playback stopped")
-        self.control_panel.preview_button.config(state="normal")
-        self.control_panel.stop_button.config(state="disabled")
-        self.last_timeline_position = 0
-        self.is_seeking = False
-        # Xóa file WAV tạm thời
-        if self.temp_preview_file and os.path.exists(self.temp_preview_file):
-            try:
-                os.remove(self.temp_preview_file)
-            except Exception as e:
-                logging.warning(f"Could not remove {self.temp_preview_file}: {str(e)}")
-        self.temp_preview_file = None
+        self.exporter.stop_preview()
+        self._finish_preview()
 
     def export_audio(self):
         if self.is_processing:
@@ -587,24 +692,17 @@ class AudioController:
         format = self.control_panel.get_export_format()
         output_path = tk.filedialog.asksaveasfilename(defaultextension=f".{format}", filetypes=[(f"{format.upper()} files", f"*.{format}")])
         if output_path:
-            self.is_processing = True
-            self.control_panel.start_progress()
             self.main_view.update_status("Đang xuất âm thanh..." if self.main_view.current_lang == "vi" else "Exporting audio...")
-            threading.Thread(target=self._export_audio_thread, args=(output_path, format), daemon=True).start()
+            # Xuất bản đã áp dụng mọi hiệu ứng/cắt gửi trước đó (JobQueue chạy theo thứ tự)
+            self._submit_job("export", lambda ctx: self.exporter.export_audio(
+                self.audio_array, format, output_path, self.file_path, self.sample_rate, self.channels, ctx=ctx
+            ), lambda result: self._export_audio_done(output_path))
 
-    def _export_audio_thread(self, output_path, format):
-        try:
-            self.exporter.export_audio(self.audio, format, output_path, self.file_path, self.sample_rate, self.channels)
-            self.main_view.root.after(0, lambda: self.main_view.update_status(
-                f"Đã xuất: {os.path.basename(output_path)}" if self.main_view.current_lang == "vi" else f"Exported: {os.path.basename(output_path)}"
-            ))
-        except Exception as e:
-            self.main_view.root.after(0, lambda: messagebox.showerror(
-                "Lỗi" if self.main_view.current_lang == "vi" else "Error", str(e)
-            ))
-        finally:
-            self.is_processing = False
-            self.main_view.root.after(0, self.control_panel.stop_progress)
+    def _export_audio_done(self, output_path):
+        self.main_view.update_status(
+            f"Đã xuất: {os.path.basename(output_path)}" if self.main_view.current_lang == "vi" else f"Exported: {os.path.basename(output_path)}"
+        )
+        self._job_finished()
 
     def reset_effects(self):
         if self.audio is None:
@@ -668,6 +766,8 @@ class AudioController:
         self.control_panel.vocal_button.config(text=lang_dict["vocal"])
         self.control_panel.preview_button.config(text=lang_dict["preview"])
         self.control_panel.stop_button.config(text=lang_dict["stop"])
+        self.control_panel.cancel_button.config(text=lang_dict["cancel"])
+        self.control_panel.live_preview_check.config(text=lang_dict["live_preview"])
         self.waveform_view.timeline_label.config(text=lang_dict["timeline"])
         self.waveform_view.ax.set_title(lang_dict["waveform"], fontsize=14, color="black")
         self.waveform_view.canvas.draw()
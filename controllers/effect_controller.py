@@ -1,14 +1,200 @@
 import multiprocessing as mp
+import os
+import queue
+import threading
+import logging
+import numpy as np
 
-from models.vocal_separator import VocalSeparator
+from models.shared_buffer import SharedArray, run_shared
+from models.jobs import CancelToken, CancelledError, JobContext
 
-def separate_vocal_worker(audio_array, sample_rate, channels, queue):
+def _separate_stems(audio_array, separator, sample_rate, channels, ctx):
+    return separator.separate_vocal(audio_array, sample_rate, channels, ctx)
+
+def _drain_cancels(cancel_queue, cancelled):
+    while True:
+        try:
+            cancelled.add(cancel_queue.get_nowait())
+        except queue.Empty:
+            return
+
+def separation_service_worker(job_queue, result_queue, cancel_queue, workers=1):
+    # Nạp mô hình Spleeter một lần duy nhất cho cả vòng đời tiến trình. TensorFlow/Spleeter chỉ được
+    # import trong tiến trình này, không bao giờ trong tiến trình giao diện
     try:
-        separator = VocalSeparator()
-        vocal, instrumental = separator.separate_vocal(audio_array, sample_rate, channels)
-        queue.put(("success", vocal, instrumental))
+        from models.vocal_separator import VocalSeparator
+        separator = VocalSeparator(workers=workers)
     except Exception as e:
-        queue.put(("error", str(e)))
+        result_queue.put(("fatal", None, str(e)))
+        return
+    result_queue.put(("ready", None))
+    cancelled = set()
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        _, job_id, input_handle, output_handles, sample_rate, channels = job
+        token = CancelToken()
+
+        def on_progress(fraction, job_id=job_id, token=token):
+            # Gọi giữa các cửa sổ: gửi tiến độ về và nhận yêu cầu hủy từ tiến trình chính
+            _drain_cancels(cancel_queue, cancelled)
+            if job_id in cancelled:
+                token.cancel()
+            result_queue.put(("progress", job_id, fraction))
+
+        try:
+            ctx = JobContext(token, on_progress)
+            ctx.set_progress(0.0)  # Yêu cầu đã bị hủy khi còn trong hàng đợi thì bỏ qua luôn
+            # Đọc đầu vào và ghi stem thẳng trong shared memory do tiến trình chính cấp phát
+            lengths = run_shared(_separate_stems, input_handle, output_handles, separator, sample_rate, channels, ctx)
+            result_queue.put(("success", job_id, lengths))
+        except CancelledError:
+            result_queue.put(("cancelled", job_id))
+        except Exception as e:
+            result_queue.put(("error", job_id, str(e)))
+        cancelled.discard(job_id)
+    separator.close()
+
+class SeparationService:
+    """
+    Tiến trình tách giọng chạy lâu dài: mô hình được nạp một lần, các yêu cầu gửi qua hàng đợi.
+    Âm thanh đầu vào và stem đầu ra nằm trong shared memory do SeparationService cấp phát; qua hàng đợi
+    chỉ có handle. Stem trả về từ poll() là view vào shared memory, dùng được cho tới khi gọi
+    release(job_id). Tiến trình được khởi động ở lần dùng đầu tiên và tự khởi động lại nếu bị dừng bất thường.
+    Yêu cầu đang chạy có thể hủy bằng cancel(job_id); tiến trình dừng ở ranh giới cửa sổ tách kế tiếp.
+    workers (mặc định: số CPU) là số tiến trình con tách các cửa sổ song song. Tiến trình dịch vụ vì thế
+    không phải daemon (daemon không được tạo tiến trình con); shutdown() phải được gọi khi thoát.
+    """
+
+    # Spleeter làm việc ở 44100 Hz: đầu vào được resample nên stem trả về luôn ở tần số này
+    STEM_SAMPLE_RATE = 44100
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._ctx = mp.get_context("spawn")
+        self._process = None
+        self._jobs = None
+        self._results = None
+        self._cancels = None
+        self._next_job_id = 0
+        self._pending = {}  # job_id -> (đầu vào, [vocal, instrumental]) dạng SharedArray
+        self._results_held = {}  # job_id -> stem đã trả về, chờ release()
+        self._closing = []
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def start(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                return
+            self._jobs = self._ctx.Queue()
+            self._results = self._ctx.Queue()
+            self._cancels = self._ctx.Queue()
+            self._process = self._ctx.Process(target=separation_service_worker, args=(self._jobs, self._results, self._cancels, self.workers))
+            self._process.start()
+            self.ready = False
+            logging.info("Started vocal separation service")
+
+    def submit(self, audio_array, sample_rate, channels):
+        self.start()
+        shared_input = SharedArray.from_array(np.asarray(audio_array, dtype=np.float32))
+        # Stem có thể dài hơn đầu vào sau khi resample lên STEM_SAMPLE_RATE
+        n_out = int(np.ceil(audio_array.shape[-1] * self.STEM_SAMPLE_RATE / float(sample_rate))) + 1
+        out_shape = audio_array.shape[:-1] + (n_out,)
+        outputs = [SharedArray.create(out_shape), SharedArray.create(out_shape)]
+        with self._lock:
+            self._next_job_id += 1
+            job_id = self._next_job_id
+            self._pending[job_id] = (shared_input, outputs)
+        self._jobs.put(("separate", job_id, shared_input.handle, [o.handle for o in outputs], sample_rate, channels))
+        return job_id
+
+    def cancel(self, job_id):
+        """Yêu cầu hủy job_id; poll() sẽ trả về ("cancelled", job_id) khi tiến trình đã dừng."""
+        if job_id in self._pending:
+            self._cancels.put(job_id)
+
+    def poll(self):
+        """
+        Lấy các kết quả đã xong (không chặn). Mỗi phần tử là ("success", job_id, vocal, instrumental),
+        ("error", job_id, thông báo), ("cancelled", job_id) hoặc ("progress", job_id, phần đã xong trong [0, 1]).
+        vocal/instrumental trỏ thẳng vào shared memory, bên nhận gọi release(job_id) khi dùng xong.
+        """
+        results = []
+        if self._results is None:
+            return results
+        self._close_released()
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            status, job_id = result[0], result[1]
+            if status == "ready":
+                self.ready = True
+            elif status == "progress":
+                if job_id in self._pending:
+                    results.append(result)
+            elif status == "fatal":
+                results.extend(("error", pending_id, result[2]) for pending_id in list(self._pending))
+                self._release_pending()
+            elif status == "success":
+                shared_input, outputs = self._pending.pop(job_id)
+                shared_input.close()
+                self._results_held[job_id] = outputs
+                vocal, instrumental = (o.array[..., :n] for o, n in zip(outputs, result[2]))
+                results.append(("success", job_id, vocal, instrumental))
+            else:
+                self._release(self._pending.pop(job_id, None))
+                results.append(result)
+        if self._pending and not self._process.is_alive():
+            results.extend(("error", job_id, "Vocal separation process exited unexpectedly") for job_id in self._pending)
+            self._release_pending()
+        return results
+
+    def release(self, job_id):
+        """Giải phóng shared memory chứa stem của một yêu cầu đã nhận qua poll()."""
+        self._closing.extend(self._results_held.pop(job_id, []))
+        self._close_released()
+
+    def _close_released(self):
+        still_open = []
+        for shared in self._closing:
+            try:
+                shared.close()
+            except BufferError:
+                # Bên nhận vẫn còn giữ view trỏ vào stem, thử lại ở lần poll() sau
+                still_open.append(shared)
+        self._closing = still_open
+
+    def _release(self, buffers):
+        if buffers is None:
+            return
+        shared_input, outputs = buffers
+        shared_input.close()
+        for shared in outputs:
+            shared.close()
+
+    def _release_pending(self):
+        for buffers in self._pending.values():
+            self._release(buffers)
+        self._pending.clear()
+
+    def shutdown(self):
+        with self._lock:
+            if self._process is None:
+                return
+            if self._process.is_alive():
+                self._jobs.put(None)
+                self._process.join(timeout=5)
+                if self._process.is_alive():
+                    self._process.terminate()
+            self._process = None
+            self.ready = False
+            self._release_pending()
+            for job_id in list(self._results_held):
+                self.release(job_id)
 
 class EffectController:
     def __init__(self, processor, exporter, control_panel, waveform_view):
@@ -16,10 +202,11 @@ class EffectController:
         self.exporter = exporter
         self.control_panel = control_panel
         self.waveform_view = waveform_view
+        self.separation_service = SeparationService()
 
     def _separate_vocal_thread(self, audio_array, sample_rate, channels, queue):
         try:
             vocal, instrumental = self.processor.separate_vocal(audio_array, sample_rate, channels)
             queue.put(("success", vocal, instrumental))
         except Exception as e:
-            queue.put(("error", str(e)))
\ No newline at end of file
+            queue.put(("error", str(e)))
@@ -1,22 +1,24 @@
 from tkinterdnd2 import TkinterDnD
 from models.audio_loader import AudioLoader
 from models.audio_processor import AudioProcessor
+from models.parallel_dsp import ParallelStretcher
 from models.audio_exporter import AudioExporter
-from models.vocal_separator import VocalSeparator
 from views.main_view import MainView
 from views.control_panel import ControlPanel
 from views.waveform_view import WaveformView
 from controllers.audio_controller import AudioController
 from controllers.effect_controller import EffectController
 
-def main():
-    root = TkinterDnD.Tk()
-    
+def build_app(root):
+    """
+    Tạo models, views, controllers trên cửa sổ root. TensorFlow/Spleeter, librosa và PyAudio không được
+    import ở đây: chúng được nạp ở lần đầu dùng tới tính năng tương ứng (tách giọng, đổi tốc độ/cao độ
+    hay dò beat chính xác, phát thử) nên cửa sổ hiện ra ngay.
+    """
     # Khởi tạo models
     model_loader = AudioLoader()
-    model_processor = AudioProcessor()
+    model_processor = AudioProcessor(stretcher=ParallelStretcher())
     model_exporter = AudioExporter()
-    model_vocal_separator = VocalSeparator()
 
     # Khởi tạo views
     view_main = MainView(root, None)  # Tạm thời để None cho controller
@@ -40,8 +42,19 @@ def main():
     view_main.bind_language_event()
     view_control.bind_button_events()
     view_waveform.bind_timeline_event()
+    return model_processor, model_exporter, effect_controller
 
-    root.mainloop()
+def main():
+    root = TkinterDnD.Tk()
+    model_processor, model_exporter, effect_controller = build_app(root)
+
+    try:
+        root.mainloop()
+    finally:
+        # Tiến trình tách giọng không phải daemon: không dừng nó thì trình thông dịch chờ mãi khi thoát
+        effect_controller.separation_service.shutdown()
+        model_exporter.close()
+        model_processor.stretcher.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
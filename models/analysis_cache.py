@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+
+from models.waveform_peaks import PeakPyramid
+
+CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "audio_editor", "analysis")
+
+
+class AnalysisCache:
+    """
+    Bộ đệm trên đĩa cho kết quả phân tích của từng file: đỉnh dạng sóng, beat, tempo và thông tin file.
+    Khóa là hash nội dung (lấy mẫu các đoạn trong file) kết hợp kích thước và mtime.
+    Mỗi mục là một file .npz không nén (đỉnh lưu dạng float16); khi tổng dung lượng vượt
+    max_size_mb thì xóa các mục ít được dùng gần đây nhất.
+    """
+
+    def __init__(self, cache_dir=None, max_size_mb=256, sample_chunks=16, chunk_size=65536):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.sample_chunks = sample_chunks
+        self.chunk_size = chunk_size
+
+    def file_key(self, file_path):
+        stat = os.stat(file_path)
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{CACHE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        # Băm các đoạn rải đều trong file thay vì toàn bộ file để mở lại nhanh với file lớn
+        with open(file_path, "rb") as f:
+            if stat.st_size <= self.sample_chunks * self.chunk_size:
+                h.update(f.read())
+            else:
+                step = (stat.st_size - self.chunk_size) // (self.sample_chunks - 1)
+                for i in range(self.sample_chunks):
+                    f.seek(i * step)
+                    h.update(f.read(self.chunk_size))
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, file_path):
+        """Trả về dict (peaks, beat_times, tempo, info) hoặc None nếu chưa có trong bộ đệm."""
+        try:
+            path = self._entry_path(self.file_key(file_path))
+            if not os.path.exists(path):
+                return None
+            with np.load(path, allow_pickle=False) as data:
+                header = json.loads(bytes(data["header"]).decode("utf-8"))
+                levels = [(block, data[f"mins_{i}"].astype(np.float32), data[f"maxs_{i}"].astype(np.float32))
+                          for i, block in enumerate(header["blocks"])]
+                beat_times = data["beat_times"].astype(np.float64) if "beat_times" in data else None
+            peaks = PeakPyramid.from_levels(levels, header["sample_rate"], header["n_samples"],
+                                            header["base_block"], header["factor"])
+            os.utime(path)  # Đánh dấu vừa dùng cho việc loại bỏ LRU
+            return {"peaks": peaks, "beat_times": beat_times, "tempo": header.get("tempo"), "info": header["info"]}
+        except Exception as e:
+            logging.warning(f"Could not read analysis cache for {file_path}: {str(e)}")
+            return None
+
+    def store(self, file_path, peaks, beat_times=None, tempo=None, info=None):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._entry_path(self.file_key(file_path))
+            header = {
+                "version": CACHE_VERSION,
+                "sample_rate": peaks.sample_rate,
+                "n_samples": peaks.n_samples,
+                "base_block": peaks.base_block,
+                "factor": peaks.factor,
+                "blocks": [block for block, _, _ in peaks.levels],
+                "tempo": float(np.atleast_1d(tempo)[0]) if tempo is not None else None,
+                "info": info or {}
+            }
+            arrays = {"header": np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8)}
+            for i, (_, mins, maxs) in enumerate(peaks.levels):
+                arrays[f"mins_{i}"] = mins.astype(np.float16)
+                arrays[f"maxs_{i}"] = maxs.astype(np.float16)
+            if beat_times is not None:
+                arrays["beat_times"] = np.asarray(beat_times, dtype=np.float64)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+            self._evict()
+        except Exception as e:
+            logging.warning(f"Could not write analysis cache for {file_path}: {str(e)}")
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                logging.warning(f"Could not remove cache entry {path}: {str(e)}")
@@ -0,0 +1,61 @@
+import numpy as np
+from pydub import AudioSegment
+
+
+def float_to_pcm16(audio_array):
+    """Chuyển mảng float32 (channels, samples) hoặc (samples,) sang bytes PCM 16-bit xen kẽ."""
+    if audio_array.ndim > 1:
+        audio_array = audio_array.T
+    pcm = np.clip(audio_array, -1.0, 1.0) * 32767
+    return np.ascontiguousarray(pcm, dtype=np.int16).tobytes()
+
+
+def segment_to_array(audio_segment):
+    """Chuyển AudioSegment sang mảng float32 theo quy ước (channels, samples) của librosa."""
+    if isinstance(audio_segment, LazyAudioSegment) and audio_segment.source_array is not None:
+        return audio_segment.source_array
+    samples = np.array(audio_segment.get_array_of_samples(), dtype=np.float32)
+    samples /= float(1 << (8 * audio_segment.sample_width - 1))
+    if audio_segment.channels > 1:
+        return np.ascontiguousarray(samples.reshape(-1, audio_segment.channels).T)
+    return samples
+
+
+def array_to_segment(audio_array, sample_rate, channels):
+    return LazyAudioSegment(source_array=audio_array, frame_rate=sample_rate, channels=channels)
+
+
+class LazyAudioSegment(AudioSegment):
+    """
+    AudioSegment dựng trên mảng float32 đã giải mã.
+    Dữ liệu PCM 16-bit chỉ được tạo ở lần đầu tiên pydub cần đến (_data),
+    nên việc tải file không phải giải mã lần thứ hai.
+    """
+
+    def __init__(self, data=None, *args, **kwargs):
+        source_array = kwargs.pop("source_array", None)
+        self._pcm = None
+        self.source_array = None
+        if source_array is None:
+            super().__init__(data, *args, **kwargs)
+            return
+        self.source_array = source_array
+        self.sample_width = 2
+        self.frame_rate = kwargs.pop("frame_rate")
+        self.channels = kwargs.pop("channels")
+        self.frame_width = self.channels * self.sample_width
+
+    @property
+    def _data(self):
+        if self._pcm is None and self.source_array is not None:
+            self._pcm = float_to_pcm16(self.source_array)
+        return self._pcm
+
+    @_data.setter
+    def _data(self, value):
+        self._pcm = value
+
+    def frame_count(self, ms=None):
+        if ms is None and self._pcm is None and self.source_array is not None:
+            return float(self.source_array.shape[-1])
+        return super().frame_count(ms)
@@ -1,124 +1,192 @@
 import os
-import uuid
-from pydub import AudioSegment
-import pyaudio
-import ffmpeg
 import threading
+from concurrent.futures import ThreadPoolExecutor
+import ffmpeg
+import numpy as np
+import soundfile as sf
 import logging
 
+from models.playback_engine import PlaybackEngine
+from models.audio_buffer import segment_to_array
+from models.jobs import CancelledError, set_progress
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Định dạng ghi trực tiếp bằng libsndfile: (format, subtype)
+SOUNDFILE_FORMATS = {
+    'wav': ('WAV', 'PCM_16'),
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg': ('OGG', 'VORBIS')
+}
+FFMPEG_CODECS = {
+    'mp3': 'libmp3lame',
+    'aac': 'aac',
+    'ogg': 'libvorbis',
+    'flac': 'flac',
+    'm4a': 'aac',
+    'wma': 'wmav2'
+}
+# Tên muxer của FFmpeg khi khác tên định dạng
+FFMPEG_MUXERS = {
+    'aac': 'adts',
+    'm4a': 'ipod',
+    'wma': 'asf'
+}
+
+class AudioStreamWriter:
+    """
+    Ghi âm thanh theo từng khối float32 (channels, n) ra file.
+    WAV/FLAC/OGG ghi bằng soundfile; các định dạng khác gửi PCM thô vào stdin của FFmpeg.
+    Mẫu được giới hạn trong [-1, 1] như khi chuyển sang PCM 16-bit.
+    """
+
+    def __init__(self, output_path, format, sample_rate, channels):
+        self.output_path = output_path
+        self.channels = channels
+        self.file = None
+        self.process = None
+        self._stderr = []
+        self._stderr_reader = None
+        self.pcm16 = False
+        if format in SOUNDFILE_FORMATS:
+            sf_format, subtype = SOUNDFILE_FORMATS[format]
+            self.file = sf.SoundFile(output_path, 'w', samplerate=sample_rate, channels=channels, format=sf_format, subtype=subtype)
+            # Chuyển sang int16 bằng NumPy rồi ghi, nhanh hơn để libsndfile tự chuyển từ float
+            self.pcm16 = subtype == 'PCM_16'
+        else:
+            self.process = (
+                ffmpeg
+                .input('pipe:', format='f32le', ac=channels, ar=sample_rate)
+                .output(output_path, format=FFMPEG_MUXERS.get(format, format), acodec=FFMPEG_CODECS.get(format, format), ar=sample_rate, ac=channels)
+                .global_args('-loglevel', 'error')
+                .overwrite_output()
+                .run_async(pipe_stdin=True, pipe_stderr=True)
+            )
+            # Đọc stderr ở luồng riêng để FFmpeg không bị nghẽn khi ống đầy; nội dung dùng làm thông báo lỗi
+            self._stderr_reader = threading.Thread(target=lambda: self._stderr.append(self.process.stderr.read()), daemon=True)
+            self._stderr_reader.start()
+
+    def write(self, block):
+        block = np.clip(np.asarray(block, dtype=np.float32), -1.0, 1.0)
+        if block.ndim == 1:
+            block = block[np.newaxis]
+        if self.file is not None:
+            self.file.write((block.T * 32767).astype(np.int16) if self.pcm16 else block.T)
+        else:
+            self.process.stdin.write(np.ascontiguousarray(block.T).tobytes())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass  # FFmpeg đã thoát vì lỗi; lý do nằm trong stderr
+            returncode = self.process.wait()
+            self._stderr_reader.join()
+            self.process = None
+            if returncode != 0:
+                stderr = b"".join(self._stderr).decode("utf-8", errors="replace").strip()
+                raise Exception(f"FFmpeg exited with code {returncode} while writing {self.output_path}: {stderr}")
+
 class AudioExporter:
     def __init__(self):
-        self.is_previewing = False
-        self.audio_process = None
-        self.stream = None
-        self.p = None
-        self._lock = threading.Lock()
+        self.player = PlaybackEngine()  # Stream phát thử mở một lần, dùng lại cho mọi lần phát/tua
+
+    @property
+    def is_previewing(self):
+        return self.player.is_playing
 
-    def export_audio(self, audio_segment, format, output_path, input_path, sample_rate, channels):
+    def export_audio(self, audio, format, output_path, input_path=None, sample_rate=None, channels=None, block_frames=1 << 18, ctx=None):
         """
-        Xuất âm thanh sang định dạng được chỉ định (WAV, MP3, OGG, AAC, v.v.).
-        Dùng pydub cho WAV và MP3, FFmpeg cho các định dạng khác.
+        Xuất âm thanh sang định dạng được chỉ định (WAV, MP3, OGG, AAC, v.v.) trong một lượt, không qua file WAV tạm.
+        audio: mảng float32 (channels, samples) hoặc AudioSegment. Bộ đệm được ghi theo từng khối
+        block_frames mẫu qua AudioStreamWriter: WAV/FLAC/OGG bằng soundfile, các định dạng khác đẩy
+        PCM thô thẳng vào stdin (pipe:) của FFmpeg để mã hóa.
+        input_path được giữ để tương thích, không còn dùng.
+        ctx: JobContext tùy chọn, nhận tiến độ sau mỗi khối; khi bị hủy, file đang ghi dở bị xóa.
         """
         try:
             logging.info(f"Exporting audio to {output_path} as {format}")
-            # Định dạng được pydub hỗ trợ trực tiếp
-            pydub_formats = ['wav', 'mp3']
-            temp_wav = os.path.join(os.path.dirname(input_path or "."), f"temp_export_{uuid.uuid4().hex}.wav")
-            
-            # Xuất file WAV tạm thời
-            audio_segment.export(temp_wav, format="wav")
-            logging.info(f"Created temporary WAV file: {temp_wav}")
-
-            if format in pydub_formats:
-                # Dùng pydub để xuất trực tiếp
-                audio_segment.export(output_path, format=format)
-                logging.info(f"Exported directly using pydub to {output_path}")
-            else:
-                # Dùng FFmpeg cho các định dạng khác (AAC, OGG, v.v.)
-                codec = {
-                    'aac': 'aac',
-                    'ogg': 'libvorbis',
-                    'flac': 'flac',
-                    'm4a': 'aac',
-                    'wma': 'wmav2'
-                }.get(format, format)
-                stream = ffmpeg.input(temp_wav)
-                stream = ffmpeg.output(stream, output_path, format=format, acodec=codec, ar=sample_rate, ac=channels)
-                ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
-                logging.info(f"Exported using FFmpeg to {output_path} with codec {codec}")
-
-            # Xóa file WAV tạm thời
-            if os.path.exists(temp_wav):
-                os.remove(temp_wav)
-                logging.info(f"Removed temporary WAV file: {temp_wav}")
-
-        except ffmpeg.Error as e:
-            error_msg = f"FFmpeg error: {e.stderr.decode()}"
-            logging.error(error_msg)
-            if os.path.exists(temp_wav):
-                os.remove(temp_wav)
-            raise Exception(f"Error exporting audio: {error_msg}")
+            if not isinstance(audio, np.ndarray):
+                sample_rate, channels = audio.frame_rate, audio.channels
+                audio = segment_to_array(audio)
+            self._write_blocks(audio, format, output_path, sample_rate, channels, block_frames, ctx)
+        except CancelledError:
+            raise
         except Exception as e:
             logging.error(f"Export error: {str(e)}")
-            if os.path.exists(temp_wav):
-                os.remove(temp_wav)
             raise Exception(f"Error exporting audio: {str(e)}")
 
-    def preview_audio(self, file_path, sample_rate, channels, start, end):
-        with self._lock:
-            if self.is_previewing:
-                return
-            self.is_previewing = True
+    def export_many(self, audio, targets, sample_rate=None, channels=None, block_frames=1 << 18):
+        """
+        Xuất cùng một bản âm thanh ra nhiều định dạng cùng lúc.
+        targets: danh sách (format, output_path). Bộ đệm chỉ được chuẩn bị một lần; mỗi đích có một luồng
+        ghi riêng đọc chung mảng đó: bộ mã hóa FFmpeg chạy trong tiến trình riêng, soundfile nhả GIL khi
+        mã hóa, nên tổng thời gian gần bằng đích chậm nhất thay vì tổng các lần xuất.
+        Đích nào lỗi không làm dừng các đích khác; lỗi được gom lại và báo sau khi tất cả kết thúc.
+        """
+        if not isinstance(audio, np.ndarray):
+            sample_rate, channels = audio.frame_rate, audio.channels
+            audio = segment_to_array(audio)
+        logging.info(f"Exporting audio to {len(targets)} targets: {', '.join(format for format, _ in targets)}")
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as pool:
+            futures = [(output_path, pool.submit(self._write_blocks, audio, format, output_path, sample_rate, channels, block_frames))
+                       for format, output_path in targets]
+            for output_path, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Export error ({output_path}): {str(e)}")
+                    errors.append(f"{os.path.basename(output_path)}: {str(e)}")
+        if errors:
+            raise Exception(f"Error exporting audio: {'; '.join(errors)}")
+
+    def _write_blocks(self, audio_array, format, output_path, sample_rate, channels, block_frames, ctx=None):
+        writer = AudioStreamWriter(output_path, format, sample_rate, channels)
+        n = audio_array.shape[-1]
         try:
-            self.p = pyaudio.PyAudio()
-            self.stream = self.p.open(
-                format=pyaudio.paFloat32,
-                channels=channels,
-                rate=sample_rate,
-                output=True
-            )
-            threading.Thread(target=self._preview_stream, args=(file_path, sample_rate, channels, start, end), daemon=True).start()
+            try:
+                for start in range(0, n, block_frames):
+                    writer.write(audio_array[..., start:start + block_frames])
+                    set_progress(ctx, min(start + block_frames, n) / float(n))
+            finally:
+                writer.close()
         except Exception as e:
-            self.stop_preview(file_path, None)
-            raise Exception(f"Error starting preview: {str(e)}")
+            # Không để lại file ghi dở (bị hủy, lỗi mã hóa, hết chỗ trống...) trông như file hoàn chỉnh
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            if isinstance(e, CancelledError):
+                logging.info(f"Export to {output_path} cancelled")
+            raise
+        logging.info(f"Exported {audio_array.shape[-1] / float(sample_rate):.1f}s to {output_path}")
+
+    def open_writer(self, output_path, format, sample_rate, channels):
+        """Mở bộ ghi theo khối cho chế độ streaming (xem AudioStreamWriter)."""
+        logging.info(f"Streaming audio to {output_path} as {format}")
+        return AudioStreamWriter(output_path, format, sample_rate, channels)
 
-    def _preview_stream(self, file_path, sample_rate, channels, start, end):
+    def preview_audio(self, audio_array, sample_rate, start, end, effect_chain=None):
+        """Phát thử thẳng từ mảng trong bộ nhớ, không xuất file tạm; effect_chain chạy trong callback phát."""
         try:
-            duration = end - start
-            self.audio_process = (
-                ffmpeg
-                .input(file_path, ss=start, t=duration)
-                .output('pipe:', format='f32le', acodec='pcm_f32le', ac=channels, ar=sample_rate)
-                .run_async(pipe_stdout=True)
-            )
-            chunk_size = 2048  # Tăng chunk_size để cải thiện hiệu suất
-            while self.is_previewing:
-                data = self.audio_process.stdout.read(chunk_size)
-                if not data:
-                    break
-                self.stream.write(data)
-            self.stop_preview(file_path, None)
+            self.player.play(audio_array, sample_rate, start, end, effect_chain)
         except Exception as e:
-            logging.error(f"Preview error: {str(e)}")
-            self.stop_preview(file_path, None)
-
-    def stop_preview(self, file_path, audio_segment):
-        with self._lock:
-            self.is_previewing = False
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
-                self.stream = None
-            if self.audio_process:
-                self.audio_process.terminate()
-                self.audio_process.wait()
-                self.audio_process = None
-            if self.p:
-                self.p.terminate()
-                self.p = None
-            logging.info("Preview stopped")
+            self.stop_preview()
+            raise Exception(f"Error starting preview: {str(e)}")
+
+    def seek_preview(self, position):
+        self.player.seek(position)
+
+    def stop_preview(self):
+        self.player.stop()
+        logging.info("Preview stopped")
+
+    def close(self):
+        self.player.close()
 
     def get_preview_position(self):
-        return 0
\ No newline at end of file
+        """Vị trí phát thực tế (giây) theo đồng hồ của stream, đọc không chặn nên gọi được mỗi khung hình."""
+        return self.player.position()
@@ -1,27 +1,154 @@
 import os
-from pydub import AudioSegment
-import librosa
-from mutagen import File as MutagenFile
+import numpy as np
+import soundfile as sf
+import ffmpeg
+
+from models.audio_buffer import array_to_segment
 
 class AudioLoader:
+    def __init__(self, block_frames=1 << 18):
+        self.block_frames = block_frames
+
     def load_audio(self, file_path):
+        """
+        Giải mã file đúng một lần thành mảng float32 (channels, samples).
+        Tần số, số kênh, thời lượng, bitrate và AudioSegment (tạo khi cần) đều lấy từ mảng này.
+        """
         try:
-            audio = AudioSegment.from_file(file_path)
-            channels = audio.channels
-            if channels not in [1, 2]:
-                raise ValueError(f"Unsupported number of channels: {channels}. Only mono or stereo is supported.")
-            audio_array, sample_rate = librosa.load(file_path, mono=False, sr=None)
-            bitrate = audio.frame_width * audio.frame_rate * 8
-            duration = len(audio) / 1000.0
-            metadata = MutagenFile(file_path)
+            try:
+                audio_array, sample_rate, channels, tags = self._decode_soundfile(file_path)
+            except RuntimeError:
+                # Định dạng libsndfile không đọc được (mp3, aac, m4a, wma...) -> giải mã qua FFmpeg
+                audio_array, sample_rate, channels, tags = self._decode_ffmpeg(file_path)
+            audio = array_to_segment(audio_array, sample_rate, channels)
+            # Bitrate của AudioSegment PCM 16-bit tương ứng
+            bitrate = channels * 2 * sample_rate * 8
+            duration = audio_array.shape[-1] / float(sample_rate)
             metadata_dict = {
-                "title": metadata.get("title", ["Unknown"])[0] if metadata else "Unknown",
-                "artist": metadata.get("artist", ["Unknown"])[0] if metadata else "Unknown",
+                "title": tags.get("title") or "Unknown",
+                "artist": tags.get("artist") or "Unknown",
                 "size": os.path.getsize(file_path) / (1024 * 1024)
             }
             return audio, audio_array, sample_rate, channels, duration, bitrate, metadata_dict
+        except ffmpeg.Error as e:
+            raise Exception(f"Error loading audio: FFmpeg error: {e.stderr.decode(errors='ignore')}")
         except Exception as e:
             raise Exception(f"Error loading audio: {str(e)}")
+
+    def probe(self, file_path):
+        """Đọc (sample_rate, channels, frames) từ header mà không giải mã dữ liệu."""
+        try:
+            info = sf.info(file_path)
+            return info.samplerate, info.channels, info.frames
+        except RuntimeError:
+            probe = ffmpeg.probe(file_path)
+            stream = next((s for s in probe["streams"] if s.get("codec_type") == "audio"), None)
+            if stream is None:
+                raise ValueError("No audio stream found")
+            sample_rate = int(stream["sample_rate"])
+            duration = float(stream.get("duration") or probe["format"]["duration"])
+            return sample_rate, int(stream["channels"]), int(round(duration * sample_rate))
+
+    def stream_audio(self, file_path, start=None, end=None):
+        """
+        Đọc file theo từng khối block_frames mẫu, trả về các mảng float32 (channels, n) luôn 2 chiều.
+        start/end (giây) giới hạn đoạn cần đọc.
+        """
+        try:
+            f = sf.SoundFile(file_path)
+        except RuntimeError:
+            f = None
+        if f is not None:
+            with f:
+                self._check_channels(f.channels)
+                first = int(round((start or 0) * f.samplerate))
+                last = f.frames if end is None else min(int(round(end * f.samplerate)), f.frames)
+                f.seek(first)
+                for block in f.blocks(blocksize=self.block_frames, frames=max(last - first, 0), dtype='float32', always_2d=True):
+                    yield np.ascontiguousarray(block.T)
+            return
+
+        sample_rate, channels, _ = self.probe(file_path)
+        self._check_channels(channels)
+        input_args = {}
+        if start:
+            input_args["ss"] = start
+        if end is not None:
+            input_args["t"] = end - (start or 0)
+        process = (
+            ffmpeg
+            .input(file_path, **input_args)
+            .output('pipe:', format='f32le', acodec='pcm_f32le', ac=channels, ar=sample_rate)
+            .global_args('-loglevel', 'error')
+            .run_async(pipe_stdout=True)
+        )
+        try:
+            chunk_bytes = self.block_frames * channels * 4
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                frames = len(data) // (channels * 4)
+                yield np.ascontiguousarray(np.frombuffer(data, dtype=np.float32, count=frames * channels).reshape(frames, channels).T)
         finally:
-            import gc
-            gc.collect()
\ No newline at end of file
+            process.stdout.close()
+            process.wait()
+
+    def _check_channels(self, channels):
+        if channels not in [1, 2]:
+            raise ValueError(f"Unsupported number of channels: {channels}. Only mono or stereo is supported.")
+
+    def _decode_soundfile(self, file_path):
+        with sf.SoundFile(file_path) as f:
+            channels = f.channels
+            self._check_channels(channels)
+            tags = {k.lower(): v for k, v in f.copy_metadata().items()}
+            # Đọc theo khối vào mảng cấp phát sẵn để tránh bản sao chuyển vị toàn bộ file
+            audio_array = np.empty((channels, f.frames), dtype=np.float32)
+            pos = 0
+            for block in f.blocks(blocksize=self.block_frames, dtype='float32', always_2d=True):
+                audio_array[:, pos:pos + len(block)] = block.T
+                pos += len(block)
+            if pos < f.frames:
+                audio_array = np.ascontiguousarray(audio_array[:, :pos])
+            sample_rate = f.samplerate
+        if channels == 1:
+            audio_array = audio_array[0]
+        return audio_array, sample_rate, channels, tags
+
+    def _decode_ffmpeg(self, file_path):
+        probe = ffmpeg.probe(file_path)
+        stream = next((s for s in probe["streams"] if s.get("codec_type") == "audio"), None)
+        if stream is None:
+            raise ValueError("No audio stream found")
+        channels = int(stream["channels"])
+        self._check_channels(channels)
+        sample_rate = int(stream["sample_rate"])
+        tags = {}
+        for source in (probe.get("format", {}).get("tags", {}), stream.get("tags", {})):
+            for k, v in source.items():
+                tags.setdefault(k.lower(), v)
+        process = (
+            ffmpeg
+            .input(file_path)
+            .output('pipe:', format='f32le', acodec='pcm_f32le', ac=channels, ar=sample_rate)
+            .global_args('-loglevel', 'error')
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+        raw = bytearray()
+        chunk_bytes = self.block_frames * channels * 4
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            raw += data
+        _, stderr = process.communicate()
+        if process.returncode != 0:
+            raise ffmpeg.Error('ffmpeg', b'', stderr)
+        frames = len(raw) // (channels * 4)
+        interleaved = np.frombuffer(raw, dtype=np.float32, count=frames * channels).reshape(frames, channels)
+        if channels == 1:
+            audio_array = interleaved[:, 0].copy()
+        else:
+            audio_array = np.ascontiguousarray(interleaved.T)
+        return audio_array, sample_rate, channels, tags
@@ -1,77 +1,210 @@
 import numpy as np
-import librosa
 from pydub import AudioSegment
 
+from models import stream_effects
+from models.parallel_dsp import speed_pitch_shift
+from models.audio_buffer import array_to_segment, segment_to_array
+from models.jobs import check, set_progress
+
+def _run_blocks(effect, audio_array, ctx=None, block_size=1 << 18):
+    """
+    Chạy một StreamEffect qua cả mảng theo từng khối block_size mẫu. Hiệu ứng giữ trạng thái giữa các khối
+    nên kết quả giống xử lý một lần; giữa các khối báo tiến độ và kiểm tra hủy qua ctx (JobContext).
+    """
+    frames = audio_array if audio_array.ndim > 1 else audio_array[np.newaxis]
+    n = frames.shape[-1]
+    out = np.empty(frames.shape, dtype=np.float32)
+    for start in range(0, n, block_size):
+        out[:, start:start + block_size] = effect.process(frames[:, start:start + block_size])
+        set_progress(ctx, min(start + block_size, n) / float(n))
+    return out if audio_array.ndim > 1 else out[0]
+
 class AudioProcessor:
-    def cut_audio(self, audio, start_time, end_time, duration):
+    def __init__(self, stretcher=None):
+        # stretcher (ví dụ ParallelStretcher) chạy time-stretch/pitch-shift theo kênh và đoạn song song;
+        # None thì xử lý tuần tự từng kênh bằng librosa
+        self.stretcher = stretcher
+
+    def cut_audio(self, audio, start_time, end_time, duration, sample_rate=None):
         start_ms = start_time * 1000
         end_ms = end_time * 1000
         if start_ms < 0 or end_ms > duration * 1000 or start_ms >= end_ms:
             raise ValueError(f"Cut times out of range (max: {duration:.3f}s)")
+        if isinstance(audio, np.ndarray):
+            return audio[..., int(round(start_time * sample_rate)):int(round(end_time * sample_rate))]
         return audio[start_ms:end_ms]
 
-    def change_volume(self, gain, audio):
+    def change_volume(self, gain, audio, ctx=None):
+        if isinstance(audio, np.ndarray):
+            return _run_blocks(stream_effects.VolumeEffect(gain), audio, ctx)
         return audio + gain
 
-    def change_speed(self, speed, audio_array, sample_rate):
+    def change_speed(self, speed, audio_array, sample_rate, ctx=None):
         if len(audio_array.shape) > 2:
             raise ValueError("Unsupported audio format")
-        if len(audio_array.shape) > 1:
-            audio_changed = np.array([librosa.effects.time_stretch(audio_array[i], rate=speed) for i in range(audio_array.shape[0])])
-        else:
-            audio_changed = librosa.effects.time_stretch(audio_array, rate=speed)
-        return audio_changed, sample_rate
+        if self.stretcher is not None:
+            return self.stretcher.time_stretch(audio_array, sample_rate, speed, ctx), sample_rate
+        import librosa  # Nạp khi dùng lần đầu: import librosa mất vài giây nên không làm ở lúc khởi động
+        return self._per_channel(lambda y: librosa.effects.time_stretch(y, rate=speed), audio_array, ctx), sample_rate
 
-    def change_pitch(self, n_steps, audio_array, sample_rate):
+    def change_pitch(self, n_steps, audio_array, sample_rate, ctx=None):
         if len(audio_array.shape) > 2:
             raise ValueError("Unsupported audio format")
-        if len(audio_array.shape) > 1:
-            audio_changed = np.array([librosa.effects.pitch_shift(audio_array[i], sr=sample_rate, n_steps=n_steps) for i in range(audio_array.shape[0])])
-        else:
-            audio_changed = librosa.effects.pitch_shift(audio_array, sr=sample_rate, n_steps=n_steps)
-        return audio_changed, sample_rate
+        if self.stretcher is not None:
+            return self.stretcher.pitch_shift(audio_array, sample_rate, n_steps, ctx), sample_rate
+        import librosa
+        return self._per_channel(lambda y: librosa.effects.pitch_shift(y, sr=sample_rate, n_steps=n_steps), audio_array, ctx), sample_rate
 
-    def add_reverb(self, audio, channels, wet_level=0.2):
-        if isinstance(audio, AudioSegment):
-            audio_array = np.array(audio.get_array_of_samples())
-            if channels == 2:
-                audio_array = audio_array.reshape(-1, 2)
-        else:
-            audio_array = audio * (2**15)
+    def change_speed_pitch(self, speed, n_steps, audio_array, sample_rate, ctx=None):
+        """Đổi tốc độ và cao độ cùng lúc: một lượt phase vocoder và một lần resample thay vì hai bước."""
+        if len(audio_array.shape) > 2:
+            raise ValueError("Unsupported audio format")
+        if self.stretcher is not None:
+            return self.stretcher.speed_pitch_shift(audio_array, sample_rate, speed, n_steps, ctx), sample_rate
+        return self._per_channel(lambda y: speed_pitch_shift(y, sample_rate, speed, n_steps), audio_array, ctx), sample_rate
+
+    def _per_channel(self, transform, audio_array, ctx=None):
+        # Xử lý tuần tự từng kênh, báo tiến độ và kiểm tra hủy sau mỗi kênh
+        if len(audio_array.shape) == 1:
+            check(ctx)
+            return transform(audio_array)
+        results = []
+        for i in range(audio_array.shape[0]):
+            check(ctx)
+            results.append(transform(audio_array[i]))
+            set_progress(ctx, (i + 1) / float(audio_array.shape[0]))
+        return np.array(results)
+
+    def add_reverb(self, audio, channels, wet_level=0.2, sample_rate=None, ctx=None):
+        if isinstance(audio, np.ndarray):
+            # Mảng float (channels, samples): reverb Freeverb qua tích chập FFT với đáp ứng xung của nó,
+            # giữ nguyên định dạng và độ dài, trả về float32
+            n_channels = audio.shape[0] if audio.ndim > 1 else 1
+            return _run_blocks(stream_effects.fft_reverb_effect(sample_rate, n_channels, wet_level), audio, ctx)
+        audio_array = np.array(audio.get_array_of_samples())
+        if channels == 2:
+            audio_array = audio_array.reshape(-1, 2)
         if len(audio_array.shape) > 1:
             reverb = np.array([np.convolve(audio_array[:, i], np.ones(1000) * wet_level, mode='same') for i in range(audio_array.shape[1])]).T
         else:
             reverb = np.convolve(audio_array, np.ones(1000) * wet_level, mode='same')
-        reverb = reverb / np.max(np.abs(reverb))
+        peak = np.max(np.abs(reverb))
+        reverb = reverb / peak if peak > 0 else reverb
         reverb = (reverb * 32767).astype(np.int16)
         return reverb
 
-    def add_echo(self, audio, delay_ms=500, decay=0.5):
-        delay_samples = int(audio.frame_rate * (delay_ms / 1000))
-        echo = AudioSegment.silent(duration=len(audio) + delay_ms)
-        echo = echo.overlay(audio, position=0)
-        echo = echo.overlay(audio - 10 * decay, position=delay_samples)
-        return echo[:len(audio)]
+    def add_echo(self, audio, delay_ms=500, decay=0.5, sample_rate=None, taps=None, feedback=0.0, wet=1.0, dry=1.0, ctx=None):
+        """
+        Echo bằng đường trễ NumPy (xem stream_effects.EchoEffect), giữ nguyên độ dài.
+        taps: danh sách (delay_ms, gain) cho echo nhiều nhịp; feedback: hệ số phản hồi sau mỗi delay_ms.
+        """
+        segment = None
+        if isinstance(audio, AudioSegment):
+            segment, audio, sample_rate = audio, segment_to_array(audio), audio.frame_rate
+        n_channels = audio.shape[0] if audio.ndim > 1 else 1
+        echo = _run_blocks(stream_effects.EchoEffect(sample_rate, n_channels, delay_ms, decay, taps, feedback, wet, dry), audio, ctx)
+        if segment is not None:
+            return array_to_segment(echo, sample_rate, segment.channels)
+        return echo
 
-    def fade_in_out(self, audio, fade_in_ms=1000, fade_out_ms=1000):
+    def fade_in_out(self, audio, fade_in_ms=1000, fade_out_ms=1000, sample_rate=None, ctx=None):
+        if isinstance(audio, np.ndarray):
+            check(ctx)
+            audio = audio.copy()
+            n = audio.shape[-1]
+            fade_in = min(int(sample_rate * fade_in_ms / 1000), n)
+            fade_out = min(int(sample_rate * fade_out_ms / 1000), n)
+            if fade_in > 0:
+                audio[..., :fade_in] *= np.linspace(0, 1, fade_in, endpoint=False, dtype=np.float32)
+            if fade_out > 0:
+                audio[..., n - fade_out:] *= np.linspace(1, 0, fade_out, endpoint=False, dtype=np.float32)
+            set_progress(ctx, 1.0)
+            return audio
         return audio.fade_in(fade_in_ms).fade_out(fade_out_ms)
 
-    def apply_equalizer(self, audio_array, sample_rate, channels, bass_gain=0, mid_gain=0, treble_gain=0):
-        audio_array = librosa.to_mono(audio_array) if len(audio_array.shape) > 1 else audio_array
-        stft = librosa.stft(audio_array)
-        freqs = librosa.fft_frequencies(sr=sample_rate)
-        bass_mask = (freqs < 200)
-        mid_mask = (freqs >= 200) & (freqs <= 2000)
-        treble_mask = (freqs > 2000)
-        stft[bass_mask] *= 10 ** (bass_gain / 20)
-        stft[mid_mask] *= 10 ** (mid_gain / 20)
-        stft[treble_mask] *= 10 ** (treble_gain / 20)
-        audio_changed = librosa.istft(stft)
-        if channels == 2:
-            audio_changed = np.array([audio_changed, audio_changed])
-        return audio_changed, sample_rate
+    def apply_equalizer(self, audio_array, sample_rate, channels, bass_gain=0, mid_gain=0, treble_gain=0, bands=None, block_size=1 << 18, ctx=None):
+        """
+        EQ biquad áp dụng riêng từng kênh (giữ ảnh stereo), chạy theo khối nên bộ nhớ phụ chỉ cỡ một khối.
+        bands: danh sách (kind, freq, gain_db, q) cho N dải; mặc định là ba dải bass/mid/treble.
+        """
+        if bands is None:
+            bands = stream_effects.equalizer_bands(bass_gain, mid_gain, treble_gain)
+        bands = [band for band in bands if band[2] != 0]
+        n_channels = audio_array.shape[0] if audio_array.ndim > 1 else 1
+        equalizer = stream_effects.EqualizerEffect(sample_rate, n_channels, bands)
+        return _run_blocks(equalizer, audio_array, ctx, block_size), sample_rate
+
+    def effect_stages(self, effects, channels):
+        """
+        Danh sách các bước hiệu ứng đang bật theo đúng thứ tự áp dụng.
+        Mỗi phần tử là (tên, tham số, hàm) với hàm(audio_array, sample_rate, ctx=None) -> (audio_array, sample_rate);
+        ctx (JobContext) nhận tiến độ của riêng bước đó và dùng để hủy giữa các khối.
+        effects: dict gồm volume_gain, speed, pitch_steps, reverb_enabled, echo_enabled,
+        fade_enabled, bass_gain, mid_gain, treble_gain.
+        """
+        stages = []
+        volume_gain = effects.get("volume_gain", 0)
+        if volume_gain != 0:
+            stages.append(("volume", (volume_gain,), lambda a, sr, ctx=None: (self.change_volume(volume_gain, a, ctx), sr)))
+        speed = effects.get("speed", 1.0)
+        pitch_steps = effects.get("pitch_steps", 0)
+        if speed != 1.0 and pitch_steps != 0:
+            # Cả hai cùng bật: gộp thành một bước để chỉ chạy phase vocoder một lần
+            stages.append(("speed_pitch", (speed, pitch_steps),
+                           lambda a, sr, ctx=None: self.change_speed_pitch(speed, pitch_steps, a, sr, ctx)))
+        elif speed != 1.0:
+            stages.append(("speed", (speed,), lambda a, sr, ctx=None: self.change_speed(speed, a, sr, ctx)))
+        elif pitch_steps != 0:
+            stages.append(("pitch", (pitch_steps,), lambda a, sr, ctx=None: self.change_pitch(pitch_steps, a, sr, ctx)))
+        if effects.get("reverb_enabled"):
+            stages.append(("reverb", (), lambda a, sr, ctx=None: (self.add_reverb(a, channels, sample_rate=sr, ctx=ctx), sr)))
+        if effects.get("echo_enabled"):
+            stages.append(("echo", (), lambda a, sr, ctx=None: (self.add_echo(a, sample_rate=sr, ctx=ctx), sr)))
+        if effects.get("fade_enabled"):
+            stages.append(("fade", (), lambda a, sr, ctx=None: (self.fade_in_out(a, sample_rate=sr, ctx=ctx), sr)))
+        eq_gains = (effects.get("bass_gain", 0), effects.get("mid_gain", 0), effects.get("treble_gain", 0))
+        if any(gain != 0 for gain in eq_gains):
+            stages.append(("equalizer", eq_gains, lambda a, sr, ctx=None: self.apply_equalizer(a, sr, channels, *eq_gains, ctx=ctx)))
+        return stages
+
+    def apply_effect_chain(self, audio_array, sample_rate, channels, effects, ctx=None):
+        """
+        Áp dụng toàn bộ chuỗi hiệu ứng trên một mảng float32 (channels, samples), không ghi file tạm.
+        ctx: JobContext tùy chọn, mỗi bước chiếm một phần bằng nhau của tiến độ.
+        """
+        audio_array = audio_array.astype(np.float32, copy=False)
+        stages = self.effect_stages(effects, channels)
+        for i, (_, _, stage) in enumerate(stages):
+            check(ctx)
+            stage_ctx = ctx.subrange(i / float(len(stages)), (i + 1) / float(len(stages))) if ctx is not None else None
+            audio_array, sample_rate = stage(audio_array, sample_rate, stage_ctx)
+            audio_array = audio_array.astype(np.float32, copy=False)
+        set_progress(ctx, 1.0)
+        return audio_array, sample_rate
+
+    def stream_stages(self, effects, sample_rate, channels, total_samples):
+        """
+        Các hiệu ứng có trạng thái cho chế độ streaming, cùng thứ tự với effect_stages.
+        total_samples: độ dài đầu ra (cần cho fade out).
+        """
+        if effects.get("speed", 1.0) != 1.0 or effects.get("pitch_steps", 0) != 0:
+            raise ValueError("Speed and pitch changes are not supported in streaming mode")
+        stages = []
+        if effects.get("volume_gain", 0) != 0:
+            stages.append(stream_effects.VolumeEffect(effects["volume_gain"]))
+        if effects.get("reverb_enabled"):
+            stages.append(stream_effects.fft_reverb_effect(sample_rate, channels))
+        if effects.get("echo_enabled"):
+            stages.append(stream_effects.EchoEffect(sample_rate, channels))
+        if effects.get("fade_enabled"):
+            stages.append(stream_effects.FadeEffect(sample_rate, total_samples))
+        eq_gains = (effects.get("bass_gain", 0), effects.get("mid_gain", 0), effects.get("treble_gain", 0))
+        if any(gain != 0 for gain in eq_gains):
+            stages.append(stream_effects.EqualizerEffect(sample_rate, channels, stream_effects.equalizer_bands(*eq_gains)))
+        return stages
 
     def detect_beats(self, audio_array, sample_rate):
+        import librosa
         audio_array = librosa.to_mono(audio_array) if len(audio_array.shape) > 1 else audio_array
         tempo, beat_frames = librosa.beat.beat_track(y=audio_array, sr=sample_rate)
         beat_times = librosa.frames_to_time(beat_frames, sr=sample_rate)
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from models.undo_history import PARAM_KEYS
+
+# Giá trị mặc định của preset: không đổi âm thanh, xuất mp3
+DEFAULT_PRESET = {
+    "volume_gain": 0.0,
+    "speed": 1.0,
+    "pitch_steps": 0.0,
+    "reverb_enabled": False,
+    "echo_enabled": False,
+    "fade_enabled": False,
+    "bass_gain": 0.0,
+    "mid_gain": 0.0,
+    "treble_gain": 0.0,
+    "cut": None,  # [start, end] (giây); end null hoặc vượt độ dài bài thì lấy tới hết bài
+    "formats": ["mp3"]
+}
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".aac", ".m4a", ".wma")
+JOURNAL_NAME = ".batch_journal.jsonl"
+
+
+def load_preset(path):
+    """Đọc preset JSON (cùng khóa với bộ hiệu ứng của giao diện, thêm cut và formats), bổ sung giá trị mặc định."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    unknown = set(data) - set(DEFAULT_PRESET)
+    if unknown:
+        raise ValueError(f"Unknown preset keys: {', '.join(sorted(unknown))}")
+    preset = dict(DEFAULT_PRESET, **data)
+    if isinstance(preset["formats"], str):
+        preset["formats"] = [preset["formats"]]
+    if preset["cut"] is not None and len(preset["cut"]) != 2:
+        raise ValueError("Preset cut must be [start, end]")
+    return preset
+
+
+def save_preset(path, effects, cut=None, formats=None):
+    """Ghi bộ hiệu ứng (ví dụ AudioController._effect_settings()) thành preset dùng cho batch."""
+    preset = {key: effects[key] for key in PARAM_KEYS}
+    preset["cut"] = list(cut) if cut is not None else None
+    preset["formats"] = list(formats or DEFAULT_PRESET["formats"])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(preset, f, indent=2)
+
+
+def preset_fingerprint(preset):
+    return hashlib.sha1(json.dumps(preset, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def collect_inputs(paths, output_dir):
+    """
+    Danh sách (file vào, đường dẫn ra chưa có đuôi định dạng) từ các file/thư mục.
+    Thư mục được duyệt đệ quy và giữ nguyên cấu trúc thư mục con ở đầu ra.
+    """
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        full = os.path.join(root, name)
+                        inputs.append((full, os.path.splitext(os.path.relpath(full, path))[0]))
+        else:
+            inputs.append((path, os.path.splitext(os.path.basename(path))[0]))
+    seen = {}
+    for input_path, stem in inputs:
+        if stem in seen:
+            raise ValueError(f"Duplicate output name '{stem}' for {seen[stem]} and {input_path}")
+        seen[stem] = input_path
+    return [(os.path.abspath(input_path), os.path.join(output_dir, stem)) for input_path, stem in inputs]
+
+
+_worker_models = None
+
+def _init_worker():
+    # Mỗi tiến trình trong pool tạo loader/processor/exporter một lần rồi dùng cho mọi file
+    global _worker_models
+    from models.audio_loader import AudioLoader
+    from models.audio_processor import AudioProcessor
+    from models.audio_exporter import AudioExporter
+    from models.stream_processor import StreamProcessor
+    loader, processor, exporter = AudioLoader(), AudioProcessor(), AudioExporter()
+    _worker_models = (loader, processor, exporter, StreamProcessor(loader, processor, exporter))
+
+
+def _process_file(input_path, output_base, preset):
+    """
+    Chạy trong pool: áp dụng preset lên một file. Mỗi đầu ra được ghi vào file .part rồi đổi tên,
+    nên file ra đã tồn tại luôn là file hoàn chỉnh. Trả về thời gian từng bước (giây).
+    """
+    loader, processor, exporter, streamer = _worker_models
+    effects = {key: preset[key] for key in PARAM_KEYS}
+    cut = preset["cut"] or (None, None)
+    outputs = [(format, f"{output_base}.{format}") for format in preset["formats"]]
+    os.makedirs(os.path.dirname(output_base) or ".", exist_ok=True)
+    timings = {}
+    started = time.time()
+    try:
+        if len(outputs) == 1 and effects["speed"] == 1.0 and effects["pitch_steps"] == 0:
+            # Một định dạng, không đổi tốc độ/cao độ: xử lý theo khối, bộ nhớ không phụ thuộc độ dài bài
+            format, output_path = outputs[0]
+            streamer.process_file(input_path, output_path + ".part", format, effects, cut[0], cut[1])
+            timings["mode"] = "stream"
+        else:
+            _, audio_array, sample_rate, channels, duration, _, _ = loader.load_audio(input_path)
+            timings["decode"] = time.time() - started
+            if preset["cut"] is not None:
+                start = cut[0] or 0.0
+                end = duration if cut[1] is None else min(cut[1], duration)
+                audio_array = processor.cut_audio(audio_array, start, end, duration, sample_rate)
+            step = time.time()
+            audio_array, sample_rate = processor.apply_effect_chain(audio_array, sample_rate, channels, effects)
+            timings["effects"] = time.time() - step
+            step = time.time()
+            exporter.export_many(audio_array, [(format, path + ".part") for format, path in outputs], sample_rate, channels)
+            timings["encode"] = time.time() - step
+            timings["mode"] = "memory"
+        for _, output_path in outputs:
+            os.replace(output_path + ".part", output_path)
+    finally:
+        for _, output_path in outputs:
+            if os.path.exists(output_path + ".part"):
+                os.remove(output_path + ".part")
+    timings["total"] = time.time() - started
+    return timings
+
+
+class BatchProcessor:
+    """
+    Áp dụng một preset hiệu ứng lên nhiều file trong process pool, không cần giao diện.
+    Mỗi file xong (hoặc lỗi) được ghi thêm một dòng vào nhật ký JSON trong thư mục đầu ra, kèm thời gian
+    từng bước. Khi chạy lại với cùng preset, các file đã xong và còn đủ file ra được bỏ qua, nên
+    một lần chạy bị dừng giữa chừng (crash, tắt máy) tiếp tục từ chỗ còn dở.
+    """
+
+    def __init__(self, preset, output_dir, workers=None, resume=True):
+        self.preset = preset
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.resume = resume
+        self.fingerprint = preset_fingerprint(preset)
+        self.journal_path = os.path.join(output_dir, JOURNAL_NAME)
+
+    def completed(self):
+        """Các file vào đã xử lý xong với preset hiện tại theo nhật ký."""
+        done = set()
+        if not self.resume or not os.path.exists(self.journal_path):
+            return done
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Dòng cuối có thể bị cắt dở nếu tiến trình chết khi đang ghi
+                if entry.get("preset") != self.fingerprint:
+                    continue
+                if entry.get("status") == "done":
+                    done.add(entry["input"])
+                else:
+                    done.discard(entry["input"])
+        return done
+
+    def run(self, paths, on_result=None):
+        """
+        Xử lý các file/thư mục trong paths. on_result(input_path, status, timings hoặc thông báo lỗi)
+        được gọi khi từng file kết thúc. Trả về (số file xong, số file lỗi, số file bỏ qua).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        inputs = collect_inputs(paths, self.output_dir)
+        done = self.completed()
+        formats = self.preset["formats"]
+        pending = [(input_path, output_base) for input_path, output_base in inputs
+                   if input_path not in done or not all(os.path.exists(f"{output_base}.{format}") for format in formats)]
+        skipped = len(inputs) - len(pending)
+        logging.info(f"Batch: {len(pending)} file(s) to process, {skipped} already done, {self.workers} worker(s)")
+        succeeded = failed = 0
+        self._terminate_journal()
+        with open(self.journal_path, "a", encoding="utf-8") as journal, \
+                ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"), initializer=_init_worker) as pool:
+            futures = {pool.submit(_process_file, input_path, output_base, self.preset): input_path
+                       for input_path, output_base in pending}
+            for future in as_completed(futures):
+                input_path = futures[future]
+                entry = {"input": input_path, "preset": self.fingerprint}
+                try:
+                    timings = future.result()
+                    entry.update(status="done", timings={key: round(value, 3) if isinstance(value, float) else value
+                                                         for key, value in timings.items()})
+                    succeeded += 1
+                    result = entry["timings"]
+                except Exception as e:
+                    entry.update(status="error", error=str(e))
+                    failed += 1
+                    result = str(e)
+                    logging.error(f"Batch error ({input_path}): {str(e)}")
+                # Ghi xuống đĩa ngay để lần chạy sau biết chính xác file nào đã xong
+                journal.write(json.dumps(entry) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+                if on_result is not None:
+                    on_result(input_path, entry["status"], result)
+        return succeeded, failed, skipped
+
+    def _terminate_journal(self):
+        # Dòng cuối bị cắt dở (tiến trình chết khi đang ghi) phải được kết thúc trước khi ghi tiếp
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
@@ -0,0 +1,265 @@
+import numpy as np
+
+# Tần số lấy mẫu xấp xỉ của tín hiệu dùng cho lưới beat tạm
+QUICK_SAMPLE_RATE = 11025
+
+
+def spectral_flux(mono, n_fft=512, hop=128, previous=None, chunk_frames=4096):
+    """
+    Đường bao onset (spectral flux của phổ biên độ nén log) của tín hiệu mono, một giá trị mỗi hop mẫu.
+    previous: phổ log của khung liền trước (khi tính nối tiếp theo khối), None ở đầu bài.
+    Trả về (envelope, phổ log của khung cuối). Tính theo từng nhóm khung để bộ nhớ không phụ thuộc độ dài bài.
+    """
+    window = np.hanning(n_fft).astype(np.float32)
+    n_frames = max(0, (len(mono) - n_fft) // hop + 1)
+    envelope = np.empty(n_frames, dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(mono, n_fft)[::hop] if n_frames else None
+    for start in range(0, n_frames, chunk_frames):
+        spectrum = np.log1p(100 * np.abs(np.fft.rfft(frames[start:start + chunk_frames] * window, axis=1)))
+        if previous is None:
+            previous = spectrum[0]
+        diff = np.diff(np.vstack([previous[np.newaxis], spectrum]), axis=0)
+        envelope[start:start + len(spectrum)] = np.maximum(diff, 0).mean(axis=1)
+        previous = spectrum[-1]
+    return envelope, previous
+
+
+def _lag_range(frame_rate, min_bpm, max_bpm):
+    return max(int(frame_rate * 60 / max_bpm), 1), int(frame_rate * 60 / min_bpm)
+
+
+def onset_autocorrelation(envelope, max_lag):
+    """Tự tương quan (qua FFT) của đường bao onset đã trừ trung bình, các trễ 0..max_lag."""
+    env = envelope - envelope.mean()
+    size = 1 << int(2 * len(env) - 1).bit_length()
+    spectrum = np.fft.rfft(env, size)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), size)[:max_lag + 1]
+    return np.pad(autocorr, (0, max_lag + 1 - len(autocorr)))
+
+
+def period_from_autocorrelation(autocorr, frame_rate, min_bpm=40.0, max_bpm=240.0, start_bpm=120.0):
+    """
+    Tempo (BPM) và chu kỳ beat (số khung, có phần lẻ) từ tự tương quan của đường bao onset,
+    có trọng số log-normal quanh start_bpm như librosa để tránh nhảy sang bội/ước của tempo.
+    """
+    min_lag, max_lag = _lag_range(frame_rate, min_bpm, max_bpm)
+    max_lag = min(max_lag, len(autocorr) - 2)
+    if max_lag <= min_lag:
+        return 0.0, 0.0
+    lags = np.arange(min_lag, max_lag + 1)
+    prior = np.exp(-0.5 * np.log2(frame_rate * 60 / lags / start_bpm) ** 2)
+    best = lags[np.argmax(autocorr[min_lag:max_lag + 1] * prior)]
+    # Nội suy parabol quanh đỉnh để có chu kỳ lẻ khung
+    left, mid, right = autocorr[best - 1], autocorr[best], autocorr[best + 1]
+    denom = left - 2 * mid + right
+    period = best + (0.5 * (left - right) / denom if denom < 0 else 0.0)
+    return frame_rate * 60 / period, period
+
+
+def tempo_from_envelope(envelope, frame_rate, min_bpm=40.0, max_bpm=240.0, start_bpm=120.0):
+    """(tempo, chu kỳ khung) của cả đường bao onset."""
+    max_lag = min(_lag_range(frame_rate, min_bpm, max_bpm)[1], len(envelope) - 2)
+    if max_lag < 2:
+        return 0.0, 0.0
+    return period_from_autocorrelation(onset_autocorrelation(envelope, max_lag + 1), frame_rate, min_bpm, max_bpm, start_bpm)
+
+
+def _grid_score(envelope, period):
+    # Điểm tốt nhất và pha tương ứng của lưới chu kỳ period trên mọi độ lệch pha nguyên
+    steps = np.arange(0, len(envelope) - 1, period)
+    offsets = np.arange(int(np.ceil(period)))
+    positions = np.rint(offsets[:, np.newaxis] + steps[np.newaxis]).astype(int)
+    scores = np.where(positions < len(envelope), envelope[np.minimum(positions, len(envelope) - 1)], 0).sum(axis=1)
+    best = np.argmax(scores)
+    return scores[best] / len(steps), offsets[best] + steps
+
+
+def beat_grid(envelope, period, tolerance=0.01, candidates=41):
+    """
+    Lưới beat đều (chỉ số khung) quanh chu kỳ period: thử các chu kỳ lệch tối đa tolerance và mọi pha,
+    chọn lưới có trung bình đường bao tại các beat lớn nhất. Sai số nhỏ của chu kỳ tích lũy dọc
+    bài dài nên chu kỳ được tinh chỉnh cùng với pha.
+    """
+    if period <= 0 or len(envelope) == 0:
+        return np.empty(0)
+    _, grid = max((_grid_score(envelope, p) for p in period * (1 + np.linspace(-tolerance, tolerance, candidates))),
+                  key=lambda result: result[0])
+    return grid[grid < len(envelope)]
+
+
+class BeatAnalyzer:
+    """
+    Phân tích beat hai tầng. quick() tính lưới beat tạm trong thời gian ngắn: hạ tần số lấy mẫu
+    xuống khoảng 11 kHz bằng trung bình khối, lấy spectral flux bằng NumPy rồi ước lượng tempo
+    và pha từ tự tương quan (không cần librosa/numba nên không tốn thời gian khởi động).
+    refine() chạy librosa.beat.beat_track trên toàn bộ tín hiệu như trước để có beat chính xác.
+    """
+
+    def __init__(self, processor, n_fft=512, hop=128):
+        self.processor = processor
+        self.n_fft = n_fft
+        self.hop = hop
+
+    def quick(self, audio_array, sample_rate):
+        """Lưới beat tạm: (beat_times, tempo)."""
+        factor = max(int(sample_rate // QUICK_SAMPLE_RATE), 1)
+        frames = audio_array if audio_array.ndim > 1 else audio_array[np.newaxis]
+        n = frames.shape[-1] // factor * factor
+        # Gộp kênh và hạ tần số trong một bước; trung bình khối cũng là bộ lọc chống chồng phổ đơn giản
+        mono = frames[:, :n].reshape(frames.shape[0], -1, factor).mean(axis=(0, 2), dtype=np.float32)
+        envelope, _ = spectral_flux(mono, self.n_fft, self.hop)
+        frame_rate = sample_rate / factor / self.hop
+        tempo, period = tempo_from_envelope(envelope, frame_rate)
+        beats = beat_grid(envelope, period)
+        # Mốc thời gian của khung là tâm cửa sổ FFT
+        beat_times = (beats * self.hop + self.n_fft / 2) * factor / sample_rate
+        return beat_times, tempo
+
+    def refine(self, audio_array, sample_rate):
+        """Beat chính xác trên toàn bộ tín hiệu: (beat_times, tempo)."""
+        return self.processor.detect_beats(audio_array, sample_rate)
+
+    def stream(self, blocks, sample_rate, on_beats=None):
+        """
+        Dò beat trên chuỗi khối (channels, n) (ví dụ AudioLoader.stream_audio) bằng StreamingBeatTracker.
+        on_beats(beat_times_mới, số_giây_đã_phân_tích, tempo) được gọi sau mỗi khối có beat mới.
+        Trả về (beat_times, tempo) của cả bài.
+        """
+        tracker = StreamingBeatTracker(sample_rate, self.n_fft, self.hop)
+        found = []
+        for block in blocks:
+            beats = tracker.process(block)
+            if len(beats):
+                found.append(beats)
+                if on_beats is not None:
+                    on_beats(beats, tracker.analyzed_seconds, tracker.tempo)
+        beats = tracker.finish()
+        found.append(beats)
+        if on_beats is not None:
+            on_beats(beats, tracker.analyzed_seconds, tracker.tempo)
+        return np.concatenate(found), tracker.tempo
+
+
+class StreamingBeatTracker:
+    """
+    Dò beat theo từng khối âm thanh, bộ nhớ cố định theo history_seconds chứ không theo độ dài bài.
+    Mỗi khối được gộp kênh, hạ tần số và nối vào đường bao onset (giữ phổ của khung cuối giữa các khối).
+    Tự tương quan của history_seconds đường bao gần nhất được cộng dồn có suy giảm thành trạng thái
+    tempo; khi đủ warmup_seconds thì chọn pha bằng lưới đều, sau đó mỗi beat được dự đoán bằng
+    beat trước cộng chu kỳ và kéo về đỉnh onset gần nhất nếu đủ mạnh.
+    process() trả về các beat (giây) vừa chắc chắn; finish() trả về phần còn lại ở cuối bài.
+    """
+
+    def __init__(self, sample_rate, n_fft=512, hop=128, history_seconds=12.0, warmup_seconds=6.0,
+                 update_seconds=2.0, decay=0.8, min_bpm=40.0, max_bpm=240.0):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.factor = max(int(sample_rate // QUICK_SAMPLE_RATE), 1)
+        self.frame_rate = sample_rate / self.factor / hop
+        self.history_frames = int(history_seconds * self.frame_rate)
+        self.warmup_frames = int(warmup_seconds * self.frame_rate)
+        self.update_frames = int(update_seconds * self.frame_rate)
+        self.decay = decay
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.max_lag = _lag_range(self.frame_rate, min_bpm, max_bpm)[1] + 1
+        self.tempo = 0.0
+        self.period = 0.0
+        self._remainder = np.empty(0, dtype=np.float32)  # Mẫu gốc chưa đủ factor để hạ tần số
+        self._tail = np.empty(0, dtype=np.float32)  # Mẫu đã hạ tần số chưa đủ tạo khung mới
+        self._previous = None  # Phổ log của khung cuối
+        self._envelope = np.empty(0, dtype=np.float32)  # history_frames khung gần nhất
+        self._envelope_start = 0  # Chỉ số khung (toàn bài) của phần tử đầu _envelope
+        self._frames = 0  # Tổng số khung đã tính
+        self._autocorr = None
+        self._last_update = 0
+        self._next_beat = None  # Chỉ số khung (có phần lẻ) của beat dự đoán tiếp theo
+
+    @property
+    def analyzed_seconds(self):
+        return self._frames * self.hop * self.factor / float(self.sample_rate)
+
+    def process(self, block):
+        """Nhận khối (channels, n) hoặc (n,); trả về mảng thời điểm (giây) các beat mới."""
+        mono = block.mean(axis=0, dtype=np.float32) if block.ndim > 1 else np.asarray(block, dtype=np.float32)
+        # Khối dài hơn lịch sử (ví dụ 2^18 mẫu ở 16 kHz) được chia nhỏ: đường bao chỉ giữ history_frames khung,
+        # nên phải cập nhật tempo và phát beat trước khi phần chứa beat dự đoán bị bỏ khỏi lịch sử
+        chunk = max(self.history_frames // 2, 1) * self.hop * self.factor
+        beats = [self._process_chunk(mono[start:start + chunk]) for start in range(0, len(mono), chunk)]
+        return np.concatenate(beats) if beats else np.empty(0)
+
+    def _process_chunk(self, mono):
+        mono = np.concatenate([self._remainder, mono])
+        n = len(mono) // self.factor * self.factor
+        self._remainder = mono[n:]
+        samples = np.concatenate([self._tail, mono[:n].reshape(-1, self.factor).mean(axis=1)])
+        envelope, self._previous = spectral_flux(samples, self.n_fft, self.hop, self._previous)
+        self._tail = samples[len(envelope) * self.hop:]
+        self._append(envelope)
+        if self._frames - self._last_update >= self.update_frames and self._frames >= self.warmup_frames:
+            self._update_tempo()
+        return self._emit(final=False)
+
+    def finish(self):
+        """Các beat còn lại sau khối cuối."""
+        return self._emit(final=True)
+
+    def _append(self, envelope):
+        self._envelope = np.concatenate([self._envelope, envelope])
+        self._frames += len(envelope)
+        excess = len(self._envelope) - self.history_frames
+        if excess > 0:
+            self._envelope = self._envelope[excess:]
+            self._envelope_start += excess
+
+    def _update_tempo(self):
+        autocorr = onset_autocorrelation(self._envelope, self.max_lag)
+        autocorr /= max(autocorr[0], 1e-12)
+        self._autocorr = autocorr if self._autocorr is None else self.decay * self._autocorr + autocorr
+        self.tempo, self.period = period_from_autocorrelation(self._autocorr, self.frame_rate, self.min_bpm, self.max_bpm)
+        self._last_update = self._frames
+        if self.period <= 0:
+            return
+        # Lưới đều khớp nhất trên đường bao đang giữ: cho pha ban đầu, và về sau để bắt lại pha khi
+        # tempo đổi làm beat dự đoán lệch ra ngoài cửa sổ kéo về đỉnh onset
+        grid = beat_grid(self._envelope, self.period)
+        if not len(grid):
+            return
+        if self._next_beat is None:
+            self._next_beat = float(self._envelope_start + grid[0])
+            return
+        anchor = self._envelope_start + grid[-1]
+        drift = (self._next_beat - anchor + self.period / 2) % self.period - self.period / 2
+        if abs(drift) > 0.075 * self.period:
+            self._next_beat -= drift
+
+    def _emit(self, final):
+        if self._next_beat is None or self.period <= 0:
+            if not final or self._frames < 2:
+                return np.empty(0)
+            # Bài ngắn hơn warmup: ước lượng một lần trên những gì đã có
+            self._update_tempo()
+            if self._next_beat is None:
+                return np.empty(0)
+        beats = []
+        window = 0.15 * self.period
+        while True:
+            predicted = self._next_beat
+            if predicted >= self._frames or (not final and predicted + window >= self._frames):
+                break
+            lo = max(int(np.floor(predicted - window)), self._envelope_start)
+            hi = min(int(np.ceil(predicted + window)) + 1, self._frames)
+            beat = predicted
+            # Dự đoán đã rơi khỏi lịch sử thì giữ nguyên, không kéo về đỉnh onset
+            segment = self._envelope[lo - self._envelope_start:hi - self._envelope_start] if hi > lo else self._envelope[:0]
+            if len(segment):
+                weights = np.exp(-0.5 * ((np.arange(lo, hi) - predicted) / max(window / 2, 1e-6)) ** 2)
+                peak = int(np.argmax(segment * weights))
+                # Chỉ kéo về đỉnh onset đủ nổi bật so với mức trung bình, tránh trôi theo nhiễu
+                if segment[peak] > self._envelope.mean() + self._envelope.std():
+                    beat = float(lo + peak)
+            beats.append(beat)
+            self._next_beat = beat + self.period
+        beats = np.asarray(beats)
+        return (beats * self.hop + self.n_fft / 2) * self.factor / self.sample_rate
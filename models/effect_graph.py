@@ -0,0 +1,93 @@
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+
+from models.jobs import check, set_progress
+
+class EffectGraph:
+    """
+    Bộ máy chuỗi hiệu ứng có bộ nhớ đệm theo từng bước, dựng trên AudioProcessor.effect_stages.
+    Kết quả mỗi bước được lưu theo khóa (nguồn, các bước trước đó + tham số), nên khi chỉ đổi
+    một bước ở cuối chuỗi (EQ, fade...) thì các bước nặng phía trước (time-stretch, pitch-shift)
+    được dùng lại. Bộ đệm bị giới hạn dung lượng và loại bỏ theo LRU.
+    Khi một lần render bị hủy giữa chừng (JobContext), các bước đã xong vẫn nằm trong bộ đệm nên lần
+    render thay thế chỉ phải làm tiếp từ bước bị dừng.
+    """
+
+    def __init__(self, processor, memory_budget_mb=512):
+        self.processor = processor
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._cache = OrderedDict()  # khóa -> (audio_array, sample_rate)
+        self._cache_bytes = 0
+        self._generation = 0
+        self._source = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_source(self, audio_array, sample_rate, channels):
+        """Đặt âm thanh gốc mới (sau khi tải hoặc cắt); toàn bộ kết quả cũ bị hủy."""
+        with self._lock:
+            self._generation += 1
+            self._source = (audio_array.astype(np.float32, copy=False), sample_rate, channels)
+            self._clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def render(self, effects, ctx=None):
+        """
+        Trả về (audio_array, sample_rate) sau chuỗi hiệu ứng effects. ctx: JobContext tùy chọn; tiến độ
+        chia đều cho các bước phải tính lại, kiểm tra hủy giữa các bước và giữa các khối trong mỗi bước.
+        """
+        with self._lock:
+            if self._source is None:
+                raise ValueError("No source audio set for effect graph")
+            audio_array, sample_rate, channels = self._source
+            stages = self.processor.effect_stages(effects, channels)
+            keys = []
+            key = (self._generation,)
+            for name, params, _ in stages:
+                key = key + ((name, params),)
+                keys.append(key)
+
+            # Tìm tiền tố dài nhất đã có trong bộ đệm
+            start = 0
+            for i in range(len(keys) - 1, -1, -1):
+                if keys[i] in self._cache:
+                    self._cache.move_to_end(keys[i])
+                    audio_array, sample_rate = self._cache[keys[i]]
+                    start = i + 1
+                    break
+            self.hits += start
+            self.misses += len(stages) - start
+
+            remaining = len(stages) - start
+            for i in range(start, len(stages)):
+                check(ctx)
+                done = i - start
+                stage_ctx = ctx.subrange(done / float(remaining), (done + 1) / float(remaining)) if ctx is not None else None
+                audio_array, sample_rate = stages[i][2](audio_array, sample_rate, stage_ctx)
+                audio_array = audio_array.astype(np.float32, copy=False)
+                # Kết quả được chia sẻ giữa các lần render nên không cho phép ghi đè tại chỗ
+                audio_array.flags.writeable = False
+                self._store(keys[i], audio_array, sample_rate)
+
+            set_progress(ctx, 1.0)
+            logging.info(f"Effect graph: reused {start}/{len(stages)} stages, cache {self._cache_bytes / (1024 * 1024):.1f} MB")
+            return audio_array, sample_rate
+
+    def _store(self, key, audio_array, sample_rate):
+        if audio_array.nbytes > self.memory_budget:
+            return
+        self._cache[key] = (audio_array, sample_rate)
+        self._cache_bytes += audio_array.nbytes
+        while self._cache_bytes > self.memory_budget:
+            _, (evicted, _) = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.nbytes
@@ -0,0 +1,180 @@
+import threading
+import logging
+from collections import deque
+
+
+class CancelledError(Exception):
+    """Công việc bị hủy: người dùng bấm Hủy hoặc một yêu cầu mới cùng loại đã thay thế nó."""
+
+
+class CancelToken:
+    """Cờ hủy dùng chung giữa luồng giao diện và luồng xử lý; bên xử lý gọi check() giữa các khối."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise CancelledError("Job cancelled")
+
+
+class JobContext:
+    """
+    Truyền vào các bước xử lý dài (effect_stages, EffectGraph.render, export...).
+    check() ném CancelledError nếu đã bị hủy; set_progress(fraction) báo phần đã xong trong [0, 1]
+    của bước hiện tại rồi kiểm tra hủy luôn. subrange(start, end) tạo context con cho một bước
+    chiếm đoạn [start, end] của tiến độ cha, nên mỗi bước chỉ cần báo tiến độ của riêng nó.
+    """
+
+    def __init__(self, token=None, on_progress=None, start=0.0, end=1.0):
+        self.token = token if token is not None else CancelToken()
+        self.on_progress = on_progress
+        self.start = start
+        self.end = end
+
+    def check(self):
+        self.token.check()
+
+    def set_progress(self, fraction):
+        if self.on_progress is not None:
+            fraction = min(max(float(fraction), 0.0), 1.0)
+            self.on_progress(self.start + (self.end - self.start) * fraction)
+        self.token.check()
+
+    def subrange(self, start, end):
+        span = self.end - self.start
+        return JobContext(self.token, self.on_progress, self.start + span * start, self.start + span * end)
+
+
+def check(ctx):
+    """ctx.check() khi có context; các hàm xử lý nhận ctx=None khi chạy ngoài JobQueue (batch, benchmark)."""
+    if ctx is not None:
+        ctx.check()
+
+
+def set_progress(ctx, fraction):
+    if ctx is not None:
+        ctx.set_progress(fraction)
+
+
+class Job:
+    def __init__(self, key, func, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        self.key = key
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+        self.token = CancelToken()
+        self._reported = -1.0
+
+
+class JobQueue:
+    """
+    Một luồng nền chạy lần lượt các công việc dài (render hiệu ứng, cắt, xuất file).
+    Mỗi công việc có một khóa: gửi công việc mới cùng khóa sẽ thay công việc cũ đang chờ và hủy công việc
+    cũ đang chạy (nó dừng ở lần check() kế tiếp, tức trong vòng một khối), nên khi người dùng kéo thanh
+    trượt liên tục chỉ yêu cầu mới nhất được làm tới cùng. Công việc khác khóa chạy theo thứ tự gửi.
+    func(ctx) chạy trên luồng nền; on_done(kết quả), on_error(lỗi), on_cancel() và on_progress(fraction)
+    được chuyển về luồng giao diện qua dispatch (ví dụ lambda f: root.after(0, f)).
+    """
+
+    # Tiến độ chỉ được gửi về giao diện khi tăng ít nhất chừng này, tránh dồn hàng nghìn lệnh after
+    PROGRESS_STEP = 0.005
+
+    def __init__(self, dispatch=None):
+        self._dispatch = dispatch or (lambda callback: callback())
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._current = None
+        self._thread = None
+        self._closed = False
+
+    def submit(self, key, func, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        job = Job(key, func, on_done, on_error, on_progress, on_cancel)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Job queue is shut down")
+            self._cancel_locked(key)
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job.token
+
+    def cancel(self, key=None):
+        """Hủy các công việc có khóa key (None: tất cả), cả đang chờ lẫn đang chạy."""
+        with self._cond:
+            self._cancel_locked(key)
+
+    def is_busy(self, key=None):
+        with self._cond:
+            jobs = list(self._pending) + ([self._current] if self._current is not None else [])
+            return any((key is None or job.key == key) and not job.token.cancelled for job in jobs)
+
+    def shutdown(self, timeout=5):
+        with self._cond:
+            self._closed = True
+            self._cancel_locked(None)
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _cancel_locked(self, key):
+        kept = deque()
+        for job in self._pending:
+            if key is None or job.key == key:
+                job.token.cancel()
+                self._post(job.on_cancel)
+            else:
+                kept.append(job)
+        self._pending = kept
+        if self._current is not None and (key is None or self._current.key == key):
+            self._current.token.cancel()
+
+    def _post(self, callback, *args):
+        if callback is not None:
+            self._dispatch(lambda: callback(*args))
+
+    def _report(self, job, fraction):
+        # Chạy trên luồng nền, gọi từ ctx.set_progress
+        if job.on_progress is None or job.token.cancelled:
+            return
+        if fraction >= 1.0 or fraction - job._reported >= self.PROGRESS_STEP:
+            job._reported = fraction
+            self._post(job.on_progress, fraction)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    self._thread = None
+                    return
+                job = self._pending.popleft()
+                self._current = job
+            callback, args = job.on_done, ()
+            try:
+                ctx = JobContext(job.token, lambda fraction, job=job: self._report(job, fraction))
+                # func tự kiểm tra hủy; đã trả về nghĩa là kết quả đã được ghi nhận nên luôn báo xong
+                args = (job.func(ctx),)
+            except CancelledError:
+                logging.info(f"Job '{job.key}' cancelled")
+                callback = job.on_cancel
+            except Exception as e:
+                logging.error(f"Job '{job.key}' failed: {str(e)}")
+                callback, args = job.on_error, (e,)
+            # Bỏ công việc hiện tại trước khi gọi callback để is_busy() trong callback trả lời đúng
+            with self._cond:
+                self._current = None
+            self._post(callback, *args)
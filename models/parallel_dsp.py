@@ -0,0 +1,170 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing as mp
+import os
+import logging
+import numpy as np
+
+from models.shared_buffer import SharedArray
+from models.jobs import check, set_progress
+
+
+def split_segments(n_samples, length, overlap):
+    """Danh sách (start, end) các cửa sổ dài length chồng nhau overlap mẫu; cửa sổ cuối luôn dài hơn đoạn chồng."""
+    overlap = min(overlap, length // 2)
+    if n_samples <= length:
+        return [(0, n_samples)]
+    hop = length - overlap
+    return [(start, min(start + length, n_samples)) for start in range(0, n_samples - overlap, hop)]
+
+
+def crossfade_weights(segments, index):
+    """Trọng số overlap-add của cửa sổ index: dốc tuyến tính ở phần chồng, tổng hai cửa sổ kề nhau bằng 1."""
+    start, end = segments[index]
+    weights = np.ones(end - start, dtype=np.float32)
+    if index > 0:
+        overlap = segments[index - 1][1] - start
+        if overlap > 0:
+            weights[:overlap] = (np.arange(overlap) + 0.5) / overlap
+    if index < len(segments) - 1:
+        overlap = end - segments[index + 1][0]
+        if overlap > 0:
+            weights[-overlap:] = 1 - (np.arange(overlap) + 0.5) / overlap
+    return weights
+
+
+def speed_pitch_shift(y, sample_rate, rate, n_steps):
+    """
+    Đổi tốc độ (rate) và cao độ (n_steps bán cung) trong một lượt phase vocoder và một lần resample:
+    co giãn thời gian với hệ số rate / 2^(n_steps/12) rồi resample về sample_rate, nên độ dài đầu ra
+    bằng len(y) / rate và tần số nhân 2^(n_steps/12). Cách cũ (time_stretch rồi pitch_shift) cần hai
+    lượt phase vocoder.
+    """
+    import librosa  # Nạp khi dùng lần đầu, không làm chậm lúc khởi động ứng dụng
+    factor = 2.0 ** (float(n_steps) / 12)
+    stretched = librosa.effects.time_stretch(y, rate=rate / factor)
+    shifted = librosa.resample(stretched, orig_sr=float(sample_rate) * factor, target_sr=sample_rate)
+    return librosa.util.fix_length(shifted, size=int(round(y.shape[-1] / rate)))
+
+
+def _transform(y, sample_rate, operation, amount):
+    import librosa
+    if operation == "speed":
+        return librosa.effects.time_stretch(y, rate=amount)
+    if operation == "pitch":
+        return librosa.effects.pitch_shift(y, sr=sample_rate, n_steps=amount)
+    return speed_pitch_shift(y, sample_rate, *amount)
+
+
+def _output_rate(operation, amount):
+    # Tỉ lệ độ dài vào / ra của phép biến đổi
+    if operation == "speed":
+        return amount
+    if operation == "pitch":
+        return 1.0
+    return amount[0]
+
+
+def _stretch_segment(input_handle, slots_handle, slot, channel, start, end, operation, amount, sample_rate):
+    """Chạy trong pool: time-stretch/pitch-shift một đoạn của một kênh, ghi kết quả vào ô slot."""
+    with SharedArray.attach(input_handle) as shared_input:
+        segment = np.array(shared_input.array[channel, start:end])
+    result = _transform(segment, sample_rate, operation, amount)
+    with SharedArray.attach(slots_handle) as shared_slots:
+        n = min(len(result), shared_slots.array.shape[1])
+        shared_slots.array[slot, :n] = result[:n]
+    return slot, n
+
+
+class ParallelStretcher:
+    """
+    Time-stretch, pitch-shift (hoặc cả hai trong một lượt) song song: mỗi kênh được cắt thành các đoạn chồng nhau, từng
+    (kênh, đoạn) chạy librosa trong process pool rồi được ghép lại bằng crossfade tuyến tính ở phần
+    chồng. Âm thanh vào và kết quả từng đoạn truyền qua shared memory. Pool được tạo ở lần dùng đầu
+    tiên và giữ lại; bài ngắn một kênh chạy thẳng trong tiến trình hiện tại.
+    ctx (JobContext, tùy chọn) nhận tiến độ sau mỗi đoạn (mỗi kênh khi chạy tại chỗ); khi bị hủy, các đoạn
+    chưa bắt đầu bị bỏ khỏi pool.
+    """
+
+    def __init__(self, workers=None, segment_seconds=20.0, overlap_seconds=0.5):
+        self.workers = workers or os.cpu_count() or 1
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self._pool = None
+
+    def time_stretch(self, audio_array, sample_rate, rate, ctx=None):
+        return self._run(audio_array, sample_rate, "speed", rate, ctx)
+
+    def pitch_shift(self, audio_array, sample_rate, n_steps, ctx=None):
+        return self._run(audio_array, sample_rate, "pitch", n_steps, ctx)
+
+    def speed_pitch_shift(self, audio_array, sample_rate, rate, n_steps, ctx=None):
+        return self._run(audio_array, sample_rate, "speed_pitch", (rate, n_steps), ctx)
+
+    def _run(self, audio_array, sample_rate, operation, amount, ctx=None):
+        frames = np.asarray(audio_array, dtype=np.float32)
+        frames = frames if frames.ndim > 1 else frames[np.newaxis]
+        n = frames.shape[-1]
+        rate = _output_rate(operation, amount)
+        segments = split_segments(n, int(self.segment_seconds * sample_rate), int(self.overlap_seconds * sample_rate))
+        tasks = [(c, i) for c in range(frames.shape[0]) for i in range(len(segments))]
+        if self.workers <= 1 or len(tasks) <= 1:
+            out = self._run_inline(frames, sample_rate, operation, amount, ctx)
+        else:
+            out = self._run_parallel(frames, sample_rate, operation, amount, segments, tasks, rate, ctx)
+        return out if audio_array.ndim > 1 else out[0]
+
+    def _run_inline(self, frames, sample_rate, operation, amount, ctx=None):
+        results = []
+        for channel in frames:
+            check(ctx)
+            results.append(_transform(channel, sample_rate, operation, amount))
+            set_progress(ctx, len(results) / float(len(frames)))
+        return np.array(results)
+
+    def _run_parallel(self, frames, sample_rate, operation, amount, segments, tasks, rate, ctx=None):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"))
+            logging.info(f"Started DSP pool with {self.workers} workers")
+        # Vị trí các đoạn ở đầu ra: độ dài toàn bài giống librosa (làm tròn n / rate)
+        out_segments = [(int(round(start / rate)), int(round(end / rate))) for start, end in segments]
+        n_out = int(round(frames.shape[-1] / rate))
+        slot_length = max(end - start for start, end in out_segments) + 2
+        # Vòng ô kết quả cỡ số worker: đoạn mới chỉ được gửi khi có ô trống, kết quả được cộng chồng ngay
+        # khi về rồi trả ô, nên shared memory cho kết quả không tăng theo độ dài bài
+        n_slots = min(self.workers, len(tasks))
+        with SharedArray.from_array(frames) as shared_input, SharedArray.create((n_slots, slot_length)) as shared_slots:
+            out = np.zeros((frames.shape[0], n_out), dtype=np.float32)
+            free_slots = list(range(n_slots))
+            pending = {}  # future -> chỉ số trong tasks
+            next_task = 0
+            finished = 0
+            try:
+                while pending or next_task < len(tasks):
+                    while free_slots and next_task < len(tasks):
+                        channel, i = tasks[next_task]
+                        future = self._pool.submit(_stretch_segment, shared_input.handle, shared_slots.handle, free_slots.pop(),
+                                                   channel, segments[i][0], segments[i][1], operation, amount, sample_rate)
+                        pending[future] = next_task
+                        next_task += 1
+                    check(ctx)
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        channel, i = tasks[pending.pop(future)]
+                        slot, length = future.result()
+                        start, end = out_segments[i]
+                        end = min(end, start + length, n_out)
+                        weights = crossfade_weights(out_segments, i)[:end - start]
+                        out[channel, start:end] += shared_slots.array[slot, :end - start] * weights
+                        free_slots.append(slot)
+                        finished += 1
+                        set_progress(ctx, finished / float(len(tasks)))
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
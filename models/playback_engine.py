@@ -0,0 +1,164 @@
+import threading
+import logging
+import numpy as np
+
+pyaudio = None  # Nạp ở lần mở stream đầu tiên để không làm chậm lúc khởi động
+
+
+def _load_pyaudio():
+    global pyaudio
+    if pyaudio is None:
+        import pyaudio as module
+        pyaudio = module
+    return pyaudio
+
+
+class PlaybackEngine:
+    """
+    Phát âm thanh trực tiếp từ mảng float32 trong bộ nhớ qua callback của PyAudio.
+    Một PyAudio và một output stream được giữ mở suốt vòng đời ứng dụng (chỉ mở lại khi đổi
+    sample rate/số kênh); phát, dừng và tua chỉ thay đổi con trỏ đọc nên độ trễ cỡ một bộ đệm.
+    Nếu có effect_chain (ví dụ LiveEffectChain), mỗi khối được xử lý ngay trong callback trước khi phát.
+    """
+
+    def __init__(self, frames_per_buffer=1024):
+        self.frames_per_buffer = frames_per_buffer
+        self._pa = None
+        self._stream = None
+        self._stream_format = None  # (sample_rate, channels) của stream đang mở
+        self._buffer = None  # Mảng (channels, n) hoặc (n,)
+        self.effect_chain = None
+        self._position = 0  # Con trỏ đọc (mẫu)
+        self._end = 0
+        self._playing = False
+        # Mốc đồng bộ của khối gần nhất: mẫu đầu khối và thời điểm (theo đồng hồ stream) nó ra tới DAC
+        self._anchor_sample = 0
+        self._anchor_time = None
+        self._origin = 0  # Mẫu bắt đầu phát/tua gần nhất
+        self._lock = threading.Lock()
+        self.sample_rate = None
+
+    @property
+    def is_playing(self):
+        return self._playing
+
+    def play(self, audio_array, sample_rate, start=0.0, end=None, effect_chain=None):
+        channels = audio_array.shape[0] if audio_array.ndim > 1 else 1
+        n_samples = audio_array.shape[-1]
+        with self._lock:
+            self._buffer = audio_array
+            self.effect_chain = effect_chain
+            self.sample_rate = sample_rate
+            self._position = min(max(int(start * sample_rate), 0), n_samples)
+            self._end = n_samples if end is None else min(int(end * sample_rate), n_samples)
+            self._origin = self._anchor_sample = self._position
+            self._anchor_time = None
+            self._playing = True
+        try:
+            self._ensure_stream(sample_rate, channels)
+            if not self._stream.is_active():
+                # Stream đã dừng bởi paComplete ở lần phát trước phải được stop trước khi start lại
+                if not self._stream.is_stopped():
+                    self._stream.stop_stream()
+                self._stream.start_stream()
+        except Exception:
+            self._playing = False
+            raise
+
+    def seek(self, position):
+        with self._lock:
+            if self._buffer is not None:
+                self._position = min(max(int(position * self.sample_rate), 0), self._end)
+                self._origin = self._anchor_sample = self._position
+                self._anchor_time = None
+        if self.effect_chain is not None:
+            self.effect_chain.reset()
+
+    def position(self):
+        """
+        Vị trí (giây) của mẫu đang thực sự phát ra loa, tính từ mốc thời gian DAC của khối gần nhất
+        và đồng hồ của stream; không vượt quá số mẫu đã đưa cho stream.
+        Khi driver không cung cấp thời gian DAC thì lấy số mẫu đã đưa trừ độ trễ đầu ra.
+        """
+        if self.sample_rate is None:
+            return 0.0
+        with self._lock:
+            anchor_sample, anchor_time, consumed = self._anchor_sample, self._anchor_time, self._position
+            origin = self._origin
+        stream = self._stream
+        if stream is None or anchor_time is None:
+            return origin / float(self.sample_rate)
+        try:
+            if anchor_time > 0:
+                sample = anchor_sample + (stream.get_time() - anchor_time) * self.sample_rate
+            else:
+                sample = consumed - stream.get_output_latency() * self.sample_rate
+        except Exception:
+            sample = consumed
+        return min(max(sample, origin), consumed) / float(self.sample_rate)
+
+    def stop(self):
+        with self._lock:
+            self._playing = False
+        if self._stream is not None and not self._stream.is_stopped():
+            self._stream.stop_stream()
+
+    def close(self):
+        self.stop()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+        self._stream_format = None
+
+    def _ensure_stream(self, sample_rate, channels):
+        if self._stream is not None and self._stream_format == (sample_rate, channels):
+            return
+        if self._stream is not None:
+            if not self._stream.is_stopped():
+                self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        _load_pyaudio()
+        if self._pa is None:
+            self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            format=pyaudio.paFloat32,
+            channels=channels,
+            rate=sample_rate,
+            output=True,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback,
+            start=False
+        )
+        self._stream_format = (sample_rate, channels)
+        logging.info(f"Opened playback stream: {sample_rate} Hz, {channels} channel(s)")
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        with self._lock:
+            start = self._position
+            end = min(start + frame_count, self._end) if self._playing else start
+            self._position = end
+            if end > start:
+                self._anchor_sample = start
+                self._anchor_time = time_info.get('output_buffer_dac_time', 0) if time_info else 0
+            block = self._buffer[..., start:end] if self._buffer is not None else None
+            effect_chain = self.effect_chain
+        channels = self._stream_format[1]
+        out = np.zeros((frame_count, channels), dtype=np.float32)
+        if block is not None and end > start:
+            block = block if block.ndim > 1 else block[np.newaxis]
+            if effect_chain is not None:
+                try:
+                    block = effect_chain.process(block, start)
+                except Exception as e:
+                    # Không để lỗi hiệu ứng làm dừng stream; phát âm thanh gốc cho khối này
+                    logging.error(f"Live effect error: {str(e)}")
+            out[:end - start] = block.T
+        if end - start < frame_count:
+            # Hết đoạn cần phát: trả nốt khối cuối (đệm im lặng) rồi dừng stream
+            self._playing = False
+            return out.tobytes(), pyaudio.paComplete
+        return out.tobytes(), pyaudio.paContinue
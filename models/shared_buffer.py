@@ -0,0 +1,90 @@
+import traceback
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedArray:
+    """
+    Mảng NumPy nằm trong multiprocessing.shared_memory, gửi giữa các tiến trình bằng handle
+    (tên, shape, dtype) thay vì pickle dữ liệu.
+    Tiến trình chính tạo (owner) cả vùng nhớ đầu vào lẫn đầu ra và chịu trách nhiệm unlink;
+    worker chỉ attach, đọc/ghi trực tiếp rồi close. Cách này dùng được cho cả tiến trình
+    thường trực lẫn process pool, và trên Windows (vùng nhớ mất khi handle cuối cùng đóng).
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.owner = owner
+        # frombuffer giữ một export của shm.buf: close() ném BufferError khi còn view trỏ vào vùng nhớ,
+        # thay vì unmap rồi để view đó đọc vào vùng nhớ đã giải phóng
+        shape = tuple(int(n) for n in shape)
+        self.array = np.frombuffer(shm.buf, dtype=np.dtype(dtype), count=int(np.prod(shape))).reshape(shape)
+
+    @classmethod
+    def create(cls, shape, dtype=np.float32):
+        shape = tuple(int(n) for n in shape)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        return cls(shm, shape, dtype, owner=True)
+
+    @classmethod
+    def from_array(cls, array):
+        array = np.asarray(array)
+        shared = cls.create(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        name, shape, dtype = handle
+        # Các tiến trình con tạo bằng multiprocessing dùng chung resource_tracker với tiến trình cha,
+        # nên mở lại vùng nhớ ở đây không làm nó bị unlink sớm
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    @property
+    def handle(self):
+        return (self.shm.name, self.array.shape, self.array.dtype.str)
+
+    def close(self):
+        if self.shm is None:
+            return
+        # Phải bỏ tham chiếu tới bộ đệm trước khi đóng vùng nhớ
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if tb is not None:
+            # Biến cục bộ của các hàm vừa ném lỗi (giữ trong traceback) có thể còn là view vào vùng nhớ;
+            # xóa chúng để close() không ném BufferError che mất lỗi gốc
+            traceback.clear_frames(tb)
+        self.close()
+
+
+def run_shared(func, input_handle, output_handles, *args):
+    """
+    Chạy trong worker: attach mảng đầu vào (không sao chép), gọi func(mảng, *args) rồi ghi
+    từng kết quả thẳng vào các mảng đầu ra tiến trình chính đã cấp phát.
+    Trả về độ dài thực (trục cuối) của từng kết quả; phần thừa của mảng đầu ra bỏ qua.
+    """
+    lengths = []
+    # Kết quả có thể là view của mảng đầu vào nên phải ghi xong trước khi đóng vùng nhớ đầu vào
+    with SharedArray.attach(input_handle) as shared_input:
+        results = func(shared_input.array, *args)
+        if not isinstance(results, tuple):
+            results = (results,)
+        for result, handle in zip(results, output_handles):
+            with SharedArray.attach(handle) as shared_output:
+                n = min(result.shape[-1], shared_output.array.shape[-1])
+                shared_output.array[..., :n] = result[..., :n]
+                lengths.append(n)
+        results = result = None
+    return lengths
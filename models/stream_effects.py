@@ -0,0 +1,356 @@
+import threading
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def _signal():
+    # scipy.signal mất hơn một giây để import nên chỉ nạp khi hiệu ứng đầu tiên chạy, không phải lúc khởi động
+    from scipy import signal
+    return signal
+
+
+class StreamEffect:
+    """
+    Hiệu ứng xử lý theo khối cho chế độ streaming.
+    Mỗi khối là mảng float32 (channels, n); trạng thái (đường trễ, đuôi bộ lọc, vị trí...) được
+    giữ giữa các khối nên kết quả nối lại giống như xử lý cả bài một lần.
+    """
+
+    def process(self, block):
+        return block
+
+    def flush(self):
+        # Phần còn lại sau khối cuối (đuôi bộ lọc...), None nếu không có
+        return None
+
+
+class VolumeEffect(StreamEffect):
+    def __init__(self, gain_db):
+        self.gain = np.float32(10 ** (gain_db / 20))
+
+    def process(self, block):
+        return block * self.gain
+
+
+class FadeEffect(StreamEffect):
+    def __init__(self, sample_rate, total_samples, fade_in_ms=1000, fade_out_ms=1000):
+        self.total = total_samples
+        self.fade_in = min(int(sample_rate * fade_in_ms / 1000), total_samples)
+        self.fade_out = min(int(sample_rate * fade_out_ms / 1000), total_samples)
+        self.position = 0
+
+    def process(self, block):
+        n = block.shape[-1]
+        positions = np.arange(self.position, self.position + n)
+        self.position += n
+        gain = np.ones(n, dtype=np.float32)
+        if self.fade_in > 0:
+            head = positions < self.fade_in
+            gain[head] *= positions[head] / np.float32(self.fade_in)
+        if self.fade_out > 0:
+            start = self.total - self.fade_out
+            tail = positions >= start
+            gain[tail] *= 1 - (positions[tail] - start) / np.float32(self.fade_out)
+        return block * gain
+
+
+def _feedback_delay_line(x, history, delay, gain):
+    """
+    w[n] = x[n] + gain * w[n - delay] theo trục cuối; history là delay giá trị w gần nhất.
+    Xếp tín hiệu thành các hàng dài delay: mỗi hàng chỉ phụ thuộc hàng trước nên một lfilter
+    dọc trục hàng tính được cả khối. Trả về history nối với w.
+    """
+    n = x.shape[-1]
+    rows = -(-n // delay)
+    padded = np.zeros(x.shape[:-1] + (rows * delay,), dtype=np.float32)
+    padded[..., :n] = x
+    w, _ = _signal().lfilter(np.ones(1, dtype=np.float32), np.array([1, -gain], dtype=np.float32),
+                          padded.reshape(x.shape[:-1] + (rows, delay)), axis=-2, zi=gain * history[..., np.newaxis, :])
+    return np.concatenate([history, w.reshape(x.shape[:-1] + (-1,))[..., :n]], axis=-1)
+
+
+class EchoEffect(StreamEffect):
+    """
+    Echo nhiều nhịp có phản hồi, tính trên cả khối:
+    w[n] = x[n] + feedback * w[n - delay]; y[n] = dry * x[n] + wet * sum_k gain_k * w[n - delay_k].
+    taps: danh sách (delay_ms, gain); mặc định một nhịp delay_ms với gain theo decay, không phản hồi,
+    tức y[n] = x[n] + g * x[n - delay] như add_echo trước đây. Đường trễ được mang qua các khối.
+    """
+
+    def __init__(self, sample_rate, channels, delay_ms=500, decay=0.5, taps=None, feedback=0.0, wet=1.0, dry=1.0):
+        if taps is None:
+            taps = [(delay_ms, 10 ** (-10 * decay / 20))]
+        self.tap_delays = [int(sample_rate * (ms / 1000)) for ms, _ in taps]
+        self.tap_gains = [np.float32(gain) for _, gain in taps]
+        self.feedback_delay = int(sample_rate * (delay_ms / 1000))
+        self.feedback = feedback if self.feedback_delay > 0 else 0.0
+        self.wet = np.float32(wet)
+        self.dry = np.float32(dry)
+        self.history = np.zeros((channels, max(self.tap_delays + [self.feedback_delay, 1])), dtype=np.float32)
+
+    def process(self, block):
+        n = block.shape[-1]
+        size = self.history.shape[-1]
+        if self.feedback:
+            w = _feedback_delay_line(block, self.history[:, size - self.feedback_delay:], self.feedback_delay, self.feedback)
+            w = w[:, self.feedback_delay:]
+        else:
+            w = block
+        extended = np.concatenate([self.history, w], axis=1)
+        self.history = extended[:, -size:]
+        echo = np.zeros(block.shape, dtype=np.float32)
+        for delay, gain in zip(self.tap_delays, self.tap_gains):
+            echo += gain * extended[:, size - delay:size - delay + n]
+        return block * self.dry + echo * self.wet
+
+
+class FIREffect(StreamEffect):
+    """
+    Bộ lọc FIR bằng tích chập FFT overlap-add, đuôi tích chập được cộng vào khối sau.
+    delay: số mẫu trễ cần bù (ví dụ (len(kernel) - 1) // 2 để giống np.convolve mode='same').
+    """
+
+    def __init__(self, kernel, channels, delay=0):
+        # Nhân 1 chiều dùng chung cho mọi kênh, nhân (channels, taps) áp dụng riêng từng kênh
+        self.kernel = np.atleast_2d(np.asarray(kernel, dtype=np.float32))
+        self.tail = np.zeros((channels, self.kernel.shape[-1] - 1), dtype=np.float32)
+        self.delay = delay
+        self._to_skip = delay
+
+    def process(self, block):
+        n = block.shape[-1]
+        if n == 0:
+            return block
+        y = _signal().oaconvolve(block, self.kernel, axes=1).astype(np.float32, copy=False)
+        y[:, :self.tail.shape[-1]] += self.tail
+        out, self.tail = y[:, :n], y[:, n:]
+        if self._to_skip:
+            skip = min(self._to_skip, n)
+            self._to_skip -= skip
+            out = out[:, skip:]
+        return out
+
+    def flush(self):
+        return self.tail[:, self._to_skip:self.delay]
+
+
+# Thông số Freeverb ở 44100 Hz (độ dài delay tính bằng mẫu)
+FREEVERB_COMBS = (1116, 1188, 1277, 1356, 1422, 1491, 1557, 1617)
+FREEVERB_ALLPASSES = (556, 441, 341, 225)
+FREEVERB_STEREO_SPREAD = 23
+
+
+class ReverbEffect(StreamEffect):
+    """
+    Reverb kiểu Freeverb (Schroeder-Moorer): 8 comb phản hồi có lọc thông thấp chạy song song
+    rồi 4 allpass nối tiếp, riêng cho từng kênh (kênh sau lệch thêm FREEVERB_STEREO_SPREAD mẫu).
+    Comb được tính theo khối không dài hơn delay ngắn nhất nên cả khối đọc được từ phần đã tính và
+    mọi comb của mọi kênh chạy trong một lần gọi; allpass tính bằng lfilter dọc các hàng dài bằng delay.
+    Không chuẩn hóa theo đỉnh toàn bài nên kết quả theo khối giống hệt xử lý cả bài.
+    """
+
+    def __init__(self, sample_rate, channels, room_size=0.5, damping=0.5, wet_level=0.2, dry_level=None):
+        scale = sample_rate / 44100.0
+        self.channels = channels
+        self.feedback = room_size * 0.28 + 0.7
+        self.damp = damping * 0.4
+        # Freeverb nhân phần wet với 3 và giảm đầu vào comb còn 0.015 để tránh tràn
+        self.wet = np.float32(wet_level * 3)
+        self.dry = np.float32(1 - wet_level if dry_level is None else dry_level)
+        self.input_gain = np.float32(0.015)
+        spread = int(FREEVERB_STEREO_SPREAD * scale)
+        delays = np.array([[max(int(d * scale), 1) + c * spread for d in FREEVERB_COMBS] for c in range(channels)])
+        self.comb_delays = delays.reshape(-1, 1)
+        self.comb_channel = np.repeat(np.arange(channels), len(FREEVERB_COMBS))
+        # delay.max() giá trị gần nhất ghi vào bộ đệm của từng comb, theo thứ tự thời gian
+        self.comb_history = np.zeros((delays.size, int(delays.max())), dtype=np.float32)
+        self.comb_block = int(delays.min())
+        self.lowpass = (np.array([1 - self.damp], dtype=np.float32), np.array([1, -self.damp], dtype=np.float32))
+        self.lowpass_state = np.zeros((delays.size, 1), dtype=np.float32)
+        self.allpass_delays = [[max(int(d * scale), 1) + c * spread for c in range(channels)] for d in FREEVERB_ALLPASSES]
+        self.allpass_history = [[np.zeros(d, dtype=np.float32) for d in stage] for stage in self.allpass_delays]
+
+    def process(self, block):
+        if block.shape[-1] == 0:
+            return block
+        wet = self._combs(block * self.input_gain)
+        for stage, delays in enumerate(self.allpass_delays):
+            for c, delay in enumerate(delays):
+                wet[c], self.allpass_history[stage][c] = self._allpass(wet[c], self.allpass_history[stage][c], delay)
+        return (block * self.dry + wet * self.wet).astype(np.float32, copy=False)
+
+    def _combs(self, x):
+        n = x.shape[-1]
+        n_combs, history = self.comb_history.shape
+        rows = np.arange(n_combs)[:, np.newaxis]
+        buf = np.empty((n_combs, history + n), dtype=np.float32)
+        buf[:, :history] = self.comb_history
+        # Vị trí đọc của khối đầu tiên: đầu ra comb là giá trị ghi vào bộ đệm cách đây đúng delay mẫu
+        read = history - self.comb_delays + np.arange(self.comb_block)
+        out = np.empty(x.shape, dtype=np.float32)
+        for start in range(0, n, self.comb_block):
+            size = min(self.comb_block, n - start)
+            delayed = buf[rows, read[:, :size] + start]
+            filtered, self.lowpass_state = _signal().lfilter(*self.lowpass, delayed, axis=1, zi=self.lowpass_state)
+            buf[:, history + start:history + start + size] = x[self.comb_channel, start:start + size] + self.feedback * filtered
+            out[:, start:start + size] = delayed.reshape(self.channels, -1, size).sum(axis=1)
+        self.comb_history = buf[:, -history:].copy()
+        return out
+
+    @staticmethod
+    def _allpass(x, history, delay, gain=0.5):
+        # buf[n] = x[n] + gain * buf[n - delay]; y[n] = buf[n - delay] - x[n]
+        extended = _feedback_delay_line(x, history, delay, gain)
+        return extended[:x.shape[-1]] - x, extended[-delay:]
+
+
+@lru_cache(maxsize=8)
+def reverb_impulse_response(sample_rate, channels, wet_level=0.2, seconds=1.5):
+    """
+    Đáp ứng xung (channels, taps) của ReverbEffect, gồm cả phần dry. Sau 1.5 s đuôi đã nhỏ hơn
+    khoảng -70 dB nên có thể thay mạng comb/allpass bằng tích chập FFT khi xử lý khối lớn.
+    """
+    impulse = np.zeros((channels, int(seconds * sample_rate)), dtype=np.float32)
+    impulse[:, 0] = 1
+    response = ReverbEffect(sample_rate, channels, wet_level=wet_level).process(impulse)
+    response.flags.writeable = False
+    return response
+
+
+def fft_reverb_effect(sample_rate, channels, wet_level=0.2):
+    # Cùng âm sắc với ReverbEffect; rẻ hơn khi khối lớn (xử lý cả bài, streaming), không có trễ
+    return FIREffect(reverb_impulse_response(sample_rate, channels, wet_level), channels)
+
+
+
+def biquad_sos(sample_rate, kind, freq, gain_db, q=0.7071):
+    """Một khâu biquad theo RBJ Audio EQ Cookbook: kind là 'lowshelf', 'peaking' hoặc 'highshelf'."""
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * np.pi * min(freq, sample_rate * 0.49) / sample_rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    if kind == "peaking":
+        b = [1 + alpha * a, -2 * cos_w0, 1 - alpha * a]
+        den = [1 + alpha / a, -2 * cos_w0, 1 - alpha / a]
+    elif kind in ("lowshelf", "highshelf"):
+        sign = 1 if kind == "lowshelf" else -1
+        k = 2 * np.sqrt(a) * alpha
+        b = [a * ((a + 1) - sign * (a - 1) * cos_w0 + k),
+             sign * 2 * a * ((a - 1) - sign * (a + 1) * cos_w0),
+             a * ((a + 1) - sign * (a - 1) * cos_w0 - k)]
+        den = [(a + 1) + sign * (a - 1) * cos_w0 + k,
+               -sign * 2 * ((a - 1) + sign * (a + 1) * cos_w0),
+               (a + 1) + sign * (a - 1) * cos_w0 - k]
+    else:
+        raise ValueError(f"Unsupported filter type: {kind}")
+    return np.concatenate([b, den]) / den[0]
+
+
+def equalizer_bands(bass_gain=0, mid_gain=0, treble_gain=0):
+    """
+    Ba dải của bảng điều khiển: shelf thấp ở 200 Hz, peaking ở 632 Hz (trung bình nhân của
+    200 và 2000 Hz, Q ứng với độ rộng 200-2000 Hz) và shelf cao ở 2000 Hz.
+    Mỗi dải là (kind, freq, gain_db, q).
+    """
+    return [("lowshelf", 200.0, bass_gain, 0.7071),
+            ("peaking", np.sqrt(200.0 * 2000.0), mid_gain, np.sqrt(10) / 9),
+            ("highshelf", 2000.0, treble_gain, 0.7071)]
+
+
+class EqualizerEffect(StreamEffect):
+    """
+    EQ tham số N dải bằng chuỗi biquad (sosfilt), xử lý riêng từng kênh nên giữ nguyên ảnh stereo.
+    Trạng thái bộ lọc mang qua các khối; set_bands() đổi hệ số khi đang chạy mà vẫn giữ trạng thái
+    nếu số dải không đổi.
+    """
+
+    def __init__(self, sample_rate, channels, bands):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.zi = None
+        self.set_bands(bands)
+
+    def set_bands(self, bands):
+        sos = np.array([biquad_sos(self.sample_rate, *band) for band in bands]).reshape(-1, 6)
+        if self.zi is None or self.zi.shape[0] != len(sos):
+            self.zi = np.zeros((len(sos), self.channels, 2))
+        self.sos = sos
+
+    def process(self, block):
+        if not len(self.sos) or block.shape[-1] == 0:
+            return block
+        out, self.zi = _signal().sosfilt(self.sos, block, axis=-1, zi=self.zi)
+        return out.astype(np.float32)
+
+
+def process_stream(blocks, stages):
+    """Cho các khối (channels, n) đi qua chuỗi hiệu ứng; cuối cùng xả đuôi của từng hiệu ứng theo thứ tự."""
+    for block in blocks:
+        for stage in stages:
+            block = stage.process(block)
+        if block.shape[-1]:
+            yield block
+    for i, stage in enumerate(stages):
+        tail = stage.flush()
+        if tail is None or tail.shape[-1] == 0:
+            continue
+        for next_stage in stages[i + 1:]:
+            tail = next_stage.process(tail)
+        if tail.shape[-1]:
+            yield tail
+
+
+class LiveEffectChain:
+    """
+    Chuỗi hiệu ứng chạy trong callback phát thử, tham số đổi được khi đang phát.
+    update() được gọi từ luồng giao diện: hiệu ứng đang bật giữ nguyên trạng thái (đường trễ,
+    trạng thái bộ lọc) khi chỉ đổi tham số, hiệu ứng vừa bật được tạo mới. Mọi hiệu ứng đều
+    nhân quả nên mỗi khối ra dài đúng bằng khối vào. Tốc độ và cao độ không chạy trực tiếp được.
+    """
+
+    def __init__(self, sample_rate, channels, total_samples):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.total_samples = total_samples
+        self.effects = {}
+        self._stages = {}  # tên -> hiệu ứng đang bật
+        self._order = []
+        self._lock = threading.Lock()
+
+    def update(self, effects):
+        eq_gains = (effects.get("bass_gain", 0), effects.get("mid_gain", 0), effects.get("treble_gain", 0))
+        with self._lock:
+            self.effects = dict(effects)
+            stages = {}
+            if effects.get("volume_gain", 0) != 0:
+                stages["volume"] = self._stages.get("volume") or VolumeEffect(0)
+                stages["volume"].gain = np.float32(10 ** (effects["volume_gain"] / 20))
+            if effects.get("reverb_enabled"):
+                stages["reverb"] = self._stages.get("reverb") or ReverbEffect(self.sample_rate, self.channels)
+            if effects.get("echo_enabled"):
+                stages["echo"] = self._stages.get("echo") or EchoEffect(self.sample_rate, self.channels)
+            if effects.get("fade_enabled"):
+                stages["fade"] = self._stages.get("fade") or FadeEffect(self.sample_rate, self.total_samples)
+            if any(gain != 0 for gain in eq_gains):
+                bands = equalizer_bands(*eq_gains)
+                stages["equalizer"] = self._stages.get("equalizer") or EqualizerEffect(self.sample_rate, self.channels, bands)
+                stages["equalizer"].set_bands(bands)
+            self._stages = stages
+            self._order = list(stages.values())
+
+    def reset(self):
+        # Sau khi tua: bỏ trạng thái của vị trí cũ (đường trễ, trạng thái bộ lọc)
+        with self._lock:
+            self._stages = {}
+        self.update(self.effects)
+
+    def process(self, block, position):
+        """block: mảng (channels, n) float32 bắt đầu tại mẫu position của bài."""
+        with self._lock:
+            fade = self._stages.get("fade")
+            if fade is not None:
+                fade.position = position
+            for stage in self._order:
+                block = stage.process(block)
+        return block
@@ -0,0 +1,40 @@
+import time
+import logging
+
+from models.stream_effects import process_stream
+
+class StreamProcessor:
+    """
+    Xử lý file theo từng khối từ đĩa -> chuỗi hiệu ứng -> bộ ghi của AudioExporter.
+    Bộ nhớ đỉnh chỉ phụ thuộc block_frames (và độ dài bộ lọc), không phụ thuộc độ dài file.
+    """
+
+    def __init__(self, loader, processor, exporter):
+        self.loader = loader
+        self.processor = processor
+        self.exporter = exporter
+
+    def process_file(self, input_path, output_path, format, effects, start=None, end=None):
+        """
+        Áp dụng effects (cùng dạng dict với AudioProcessor.effect_stages) lên input_path và ghi ra output_path.
+        start/end (giây) tương đương thao tác cắt trước khi áp dụng hiệu ứng.
+        Trả về thời lượng đầu ra (giây).
+        """
+        started = time.time()
+        sample_rate, channels, frames = self.loader.probe(input_path)
+        first = int(round((start or 0) * sample_rate))
+        last = frames if end is None else min(int(round(end * sample_rate)), frames)
+        if first < 0 or last <= first:
+            raise ValueError(f"Cut times out of range (max: {frames / float(sample_rate):.3f}s)")
+        stages = self.processor.stream_stages(effects, sample_rate, channels, last - first)
+        writer = self.exporter.open_writer(output_path, format, sample_rate, channels)
+        written = 0
+        try:
+            blocks = self.loader.stream_audio(input_path, start, end)
+            for block in process_stream(blocks, stages):
+                writer.write(block)
+                written += block.shape[-1]
+        finally:
+            writer.close()
+        logging.info(f"Streamed {input_path} -> {output_path} ({written / float(sample_rate):.1f}s) in {time.time() - started:.2f} seconds")
+        return written / float(sample_rate)
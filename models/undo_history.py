@@ -0,0 +1,207 @@
+import os
+import shutil
+import tempfile
+import weakref
+import logging
+import numpy as np
+
+PARAM_KEYS = ("volume_gain", "speed", "pitch_steps", "reverb_enabled", "echo_enabled",
+              "fade_enabled", "bass_gain", "mid_gain", "treble_gain")
+
+
+def _buffer_owner(audio_array):
+    # Mảng gốc sở hữu vùng nhớ, dùng để nhận ra các trạng thái đang chia sẻ cùng một bộ đệm
+    while isinstance(audio_array.base, np.ndarray):
+        audio_array = audio_array.base
+    return audio_array
+
+
+def _view_key(audio_array):
+    # Hai view trùng nhau khi cùng địa chỉ bắt đầu, hình dạng và bước nhảy
+    return (audio_array.__array_interface__["data"][0], audio_array.shape, audio_array.strides)
+
+
+class _Entry:
+    __slots__ = ("kind", "params_delta", "cut_range", "audio", "spill_path", "sample_rate")
+
+    def __init__(self, kind, params_delta, sample_rate, audio=None, cut_range=None):
+        self.kind = kind  # "load", "apply" hoặc "cut"
+        self.params_delta = params_delta
+        self.sample_rate = sample_rate
+        self.audio = audio
+        self.cut_range = cut_range  # (mẫu bắt đầu, mẫu kết thúc) trên âm thanh của trạng thái trước
+        self.spill_path = None
+
+
+class UndoHistory:
+    """
+    Lịch sử undo/redo có giới hạn bộ nhớ.
+    - Tham số hiệu ứng được lưu dưới dạng phần thay đổi so với trạng thái trước.
+    - Trạng thái cắt chỉ lưu khoảng mẫu (cut range) trên âm thanh của trạng thái trước.
+    - Mảng âm thanh không bị sao chép: các trạng thái giữ tham chiếu chỉ-đọc tới cùng bộ đệm.
+    - Khi vượt quá memory_limit_mb, bộ đệm cũ nhất được ghi ra đĩa (.npy) và đọc lại bằng memmap.
+    """
+
+    def __init__(self, memory_limit_mb=1024, max_entries=100, spill_dir=None):
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.max_entries = max_entries
+        self._spill_root = spill_dir
+        self._spill_dir = None
+        self._entries = []
+        self._index = -1
+        self._spill_count = 0
+
+    def clear(self):
+        self._entries = []
+        self._index = -1
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def can_undo(self):
+        return self._index > 0
+
+    def can_redo(self):
+        return self._index < len(self._entries) - 1
+
+    def push(self, state, kind="apply", cut_range=None):
+        """
+        Thêm trạng thái mới và xóa nhánh redo.
+        state: dict gồm audio_array, sample_rate và các tham số hiệu ứng (PARAM_KEYS).
+        Với kind="cut", cut_range là (mẫu bắt đầu, mẫu kết thúc) trên âm thanh của trạng thái hiện tại.
+        Trả về source_token của trạng thái mới (xem _state_at).
+        """
+        del self._entries[self._index + 1:]
+        previous = self._params_at(self._index) if self._entries else {}
+        params_delta = {k: state[k] for k in PARAM_KEYS if k in state and previous.get(k) != state[k]}
+        audio = None
+        if kind != "cut" or not self._entries:
+            audio = self._freeze(state["audio_array"])
+            kind = kind if kind != "cut" else "load"
+        self._entries.append(_Entry(kind, params_delta, state["sample_rate"], audio, cut_range))
+        self._index = len(self._entries) - 1
+        while len(self._entries) > self.max_entries and self._drop_oldest():
+            pass
+        self._enforce_memory_limit()
+        return self._entries[self._source_index(self._index)]
+
+    def undo(self):
+        if not self.can_undo():
+            return None
+        self._index -= 1
+        return self._state_at(self._index)
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        self._index += 1
+        return self._state_at(self._index)
+
+    def memory_usage(self):
+        """Số byte bộ đệm âm thanh mà lịch sử đang giữ trong RAM (đếm mỗi bộ đệm chia sẻ một lần)."""
+        owners = {}
+        for entry in self._entries:
+            if entry.audio is not None and entry.spill_path is None:
+                owner = _buffer_owner(entry.audio)
+                owners[id(owner)] = owner.nbytes
+        return sum(owners.values())
+
+    def _freeze(self, audio_array):
+        # Chia sẻ kiểu copy-on-write: mọi thay đổi sau này phải tạo mảng mới, không ghi đè bộ đệm đang dùng
+        audio_array = audio_array.view()
+        audio_array.flags.writeable = False
+        return audio_array
+
+    def _params_at(self, index):
+        params = {}
+        for entry in self._entries[:index + 1]:
+            params.update(entry.params_delta)
+        return params
+
+    def _audio_at(self, index):
+        entry = self._entries[index]
+        if entry.kind == "cut" and entry.audio is None:
+            start, end = entry.cut_range
+            return self._audio_at(index - 1)[..., start:end]
+        if entry.spill_path is not None:
+            return np.load(entry.spill_path, mmap_mode='r')
+        return entry.audio
+
+    def _source_index(self, index):
+        # Âm thanh gốc của chuỗi hiệu ứng: trạng thái tải/cắt gần nhất
+        while self._entries[index].kind == "apply":
+            index -= 1
+        return index
+
+    def _state_at(self, index):
+        state = self._params_at(index)
+        audio_array = self._audio_at(index)
+        source_index = self._source_index(index)
+        state.update({
+            "kind": self._entries[index].kind,
+            "audio_array": audio_array,
+            "source_array": self._audio_at(source_index),
+            # Định danh của âm thanh gốc, để bên gọi biết khi nào cần đặt lại nguồn của EffectGraph
+            "source_token": self._entries[source_index],
+            "sample_rate": self._entries[index].sample_rate,
+            "duration": audio_array.shape[-1] / float(self._entries[index].sample_rate)
+        })
+        return state
+
+    def _drop_oldest(self):
+        # Bỏ trạng thái cũ nhất mà không trạng thái nào khác dùng làm âm thanh gốc
+        for i in range(len(self._entries) - 1):
+            entry, successor = self._entries[i], self._entries[i + 1]
+            if i == self._index or (entry.kind != "apply" and successor.kind == "apply"):
+                continue
+            if successor.kind == "cut" and successor.audio is None and successor.spill_path is None:
+                successor.audio = self._freeze(np.array(self._audio_at(i + 1)))
+            successor.params_delta = dict(entry.params_delta, **successor.params_delta)
+            del self._entries[i]
+            if i < self._index:
+                self._index -= 1
+            self._remove_spill(entry)
+            return True
+        return False
+
+    def _enforce_memory_limit(self):
+        usage = self.memory_usage()
+        for i, entry in enumerate(self._entries):
+            if usage <= self.memory_limit:
+                break
+            # Không đẩy ra đĩa trạng thái đang hiển thị
+            if i == self._index or entry.audio is None or entry.spill_path is not None:
+                continue
+            owner = _buffer_owner(entry.audio)
+            shared = [e for e in self._entries if e.audio is not None and e.spill_path is None
+                      and _buffer_owner(e.audio) is owner]
+            if any(e is self._entries[self._index] for e in shared):
+                continue
+            # Các trạng thái chung bộ đệm có thể giữ những view khác nhau (ví dụ cắt mono là view của
+            # mảng trước khi cắt): mỗi view riêng được ghi ra một file, các trạng thái cùng view dùng chung file
+            paths = {}
+            for e in shared:
+                key = _view_key(e.audio)
+                if key not in paths:
+                    paths[key] = self._spill(e.audio)
+                e.spill_path = paths[key]
+                e.audio = None
+            usage -= owner.nbytes
+
+    def _spill(self, audio_array):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="audio_undo_", dir=self._spill_root)
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        self._spill_count += 1
+        path = os.path.join(self._spill_dir, f"state_{self._spill_count}.npy")
+        np.save(path, np.ascontiguousarray(audio_array))
+        logging.info(f"Spilled undo state to {path} ({audio_array.nbytes / (1024 * 1024):.1f} MB)")
+        return path
+
+    def _remove_spill(self, entry):
+        if entry.spill_path is None or any(e.spill_path == entry.spill_path for e in self._entries):
+            return
+        try:
+            os.remove(entry.spill_path)
+        except OSError as e:
+            logging.warning(f"Could not remove {entry.spill_path}: {str(e)}")
@@ -62,15 +62,52 @@ class VocalSeparator:
         
         return vocal, instrumental
 '''
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing as mp
 from spleeter.separator import Separator
 import numpy as np
 import librosa
 
+from models.shared_buffer import SharedArray
+from models.parallel_dsp import split_segments, crossfade_weights
+from models.jobs import check, set_progress
+
+_pool_separator = None
+
+def _init_pool_worker():
+    # Mỗi tiến trình trong pool nạp mô hình một lần rồi dùng lại cho mọi đoạn
+    global _pool_separator
+    _pool_separator = Separator('spleeter:2stems')
+
+def _separate_segment(input_handle, output_handles, slot, start, end):
+    """Chạy trong pool: tách đoạn [start, end) của đầu vào, ghi stem vào ô slot của các mảng đầu ra."""
+    with SharedArray.attach(input_handle) as shared_input:
+        separation = _pool_separator.separate(shared_input.array[start:end])
+    for key, handle in zip(('vocals', 'accompaniment'), output_handles):
+        with SharedArray.attach(handle) as shared_output:
+            stem = separation[key]
+            n = min(len(stem), shared_output.array.shape[1])
+            shared_output.array[slot, :n] = stem[:n]
+    return slot
+
 class VocalSeparator:
-    def __init__(self):
+    """
+    Tách giọng bằng Spleeter. Bài dài hơn segment_seconds được cắt thành các cửa sổ chồng nhau
+    overlap_seconds, tách từng cửa sổ rồi ghép lại bằng crossfade tuyến tính, nên bộ nhớ của
+    mô hình chỉ phụ thuộc độ dài cửa sổ. Với workers > 1 các cửa sổ được tách song song trong
+    process pool (mỗi tiến trình nạp một mô hình, âm thanh truyền qua shared memory);
+    không dùng được pool khi chính VocalSeparator đang chạy trong tiến trình daemon.
+    """
+
+    def __init__(self, segment_seconds=30.0, overlap_seconds=2.0, workers=1):
         self.separator = Separator('spleeter:2stems')
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.workers = workers
+        self._pool = None
     
-    def separate_vocal(self, audio_array, sample_rate, channels):
+    def separate_vocal(self, audio_array, sample_rate, channels, ctx=None):
+        # ctx (JobContext, tùy chọn): báo tiến độ sau mỗi cửa sổ và dừng giữa các cửa sổ khi bị hủy
         # Đảm bảo audio ở định dạng float32
         if audio_array.dtype != np.float32:
             audio_array = audio_array.astype(np.float32)
@@ -86,16 +123,94 @@ class VocalSeparator:
         elif audio_array.shape[0] == 2:
             audio_array = audio_array.T  # Spleeter mong đợi (samples, channels)
         
-        # Tách bằng Spleeter
-        separation = self.separator.separate(audio_array)
+        # Tách bằng Spleeter, theo từng cửa sổ nếu bài dài
+        segments = self._segments(len(audio_array), sample_rate)
+        if len(segments) > 1 and self.workers > 1:
+            vocal, instrumental = self._separate_parallel(audio_array, segments, ctx)
+        elif len(segments) > 1:
+            vocal, instrumental = self._separate_segmented(audio_array, segments, ctx)
+        else:
+            check(ctx)
+            separation = self.separator.separate(audio_array)
+            vocal, instrumental = separation['vocals'], separation['accompaniment']
         
-        # Lấy vocal và accompaniment
-        vocal = separation['vocals'].T  # Chuyển lại về (channels, samples)
-        instrumental = separation['accompaniment'].T
+        # Chuyển lại về (channels, samples)
+        vocal = vocal.T
+        instrumental = instrumental.T
         
         # Nếu gốc là mono, lấy một kênh
         if channels == 1:
             vocal = vocal[0]
             instrumental = instrumental[0]
         
-        return vocal, instrumental
\ No newline at end of file
+        return vocal, instrumental
+
+    def _segments(self, n_samples, sample_rate):
+        if not self.segment_seconds:
+            return [(0, n_samples)]
+        return split_segments(n_samples, int(self.segment_seconds * sample_rate), int(self.overlap_seconds * sample_rate))
+
+    def _crossfade_weights(self, segments, index):
+        return crossfade_weights(segments, index)[:, np.newaxis]
+
+    def _separate_segmented(self, audio_array, segments, ctx=None):
+        vocal = np.zeros(audio_array.shape, dtype=np.float32)
+        instrumental = np.zeros(audio_array.shape, dtype=np.float32)
+        for i, (start, end) in enumerate(segments):
+            check(ctx)
+            separation = self.separator.separate(audio_array[start:end])
+            weights = self._crossfade_weights(segments, i)
+            vocal[start:end] += separation['vocals'][:end - start] * weights
+            instrumental[start:end] += separation['accompaniment'][:end - start] * weights
+            set_progress(ctx, (i + 1) / float(len(segments)))
+        return vocal, instrumental
+
+    def _separate_parallel(self, audio_array, segments, ctx=None):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"),
+                                             initializer=_init_pool_worker)
+        # Vòng ô kết quả cỡ số worker: cửa sổ mới chỉ được gửi khi có ô trống, kết quả được cộng chồng ngay
+        # khi về rồi trả ô, nên bộ nhớ shared cho stem không tăng theo độ dài bài
+        length = max(end - start for start, end in segments)
+        n_slots = min(self.workers, len(segments))
+        slots_shape = (n_slots, length, audio_array.shape[1])
+        with SharedArray.from_array(audio_array) as shared_input, \
+                SharedArray.create(slots_shape) as shared_vocal, \
+                SharedArray.create(slots_shape) as shared_instrumental:
+            output_handles = [shared_vocal.handle, shared_instrumental.handle]
+            vocal = np.zeros(audio_array.shape, dtype=np.float32)
+            instrumental = np.zeros(audio_array.shape, dtype=np.float32)
+            free_slots = list(range(n_slots))
+            pending = {}  # future -> (ô, chỉ số cửa sổ)
+            next_index = 0
+            finished = 0
+            try:
+                while pending or next_index < len(segments):
+                    while free_slots and next_index < len(segments):
+                        slot = free_slots.pop()
+                        start, end = segments[next_index]
+                        future = self._pool.submit(_separate_segment, shared_input.handle, output_handles, slot, start, end)
+                        pending[future] = (slot, next_index)
+                        next_index += 1
+                    check(ctx)
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        slot, i = pending.pop(future)
+                        future.result()
+                        start, end = segments[i]
+                        weights = self._crossfade_weights(segments, i)
+                        vocal[start:end] += shared_vocal.array[slot, :end - start] * weights
+                        instrumental[start:end] += shared_instrumental.array[slot, :end - start] * weights
+                        free_slots.append(slot)
+                        finished += 1
+                        set_progress(ctx, finished / float(len(segments)))
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+        return vocal, instrumental
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
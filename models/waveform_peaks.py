@@ -0,0 +1,97 @@
+import numpy as np
+
+class PeakPyramid:
+    """
+    Kim tự tháp đỉnh min/max nhiều mức phân giải của dạng sóng.
+    Mức 0 gom base_block mẫu thành một cặp (min, max); mỗi mức sau gom thêm factor lần.
+    Khi vẽ chỉ đọc mức có số điểm vừa với độ rộng màn hình, nên chi phí vẽ
+    phụ thuộc số pixel chứ không phụ thuộc độ dài bài.
+    """
+
+    def __init__(self, audio_array=None, sample_rate=None, base_block=64, factor=4, min_bins=512):
+        self.sample_rate = sample_rate
+        self.base_block = base_block
+        self.factor = factor
+        self.levels = []  # danh sách (block_size, mins, maxs)
+        self.n_samples = 0
+        self.audio_array = None
+        if audio_array is not None:
+            self.build(audio_array, sample_rate, min_bins)
+
+    def build(self, audio_array, sample_rate, min_bins=512):
+        self.sample_rate = sample_rate
+        self.audio_array = audio_array
+        self.n_samples = audio_array.shape[-1]
+        frames = audio_array if audio_array.ndim > 1 else audio_array[np.newaxis]
+        n_blocks = -(-self.n_samples // self.base_block)
+        mins = np.empty(n_blocks, dtype=np.float32)
+        maxs = np.empty(n_blocks, dtype=np.float32)
+        # Tính theo đoạn để không tạo bản sao lớn của toàn bộ bài
+        step = self.base_block * 65536
+        for start in range(0, self.n_samples, step):
+            chunk = frames[:, start:start + step]
+            pad = -chunk.shape[-1] % self.base_block
+            if pad:
+                chunk = np.pad(chunk, ((0, 0), (0, pad)), mode='edge')
+            blocks = chunk.reshape(chunk.shape[0], -1, self.base_block)
+            b0 = start // self.base_block
+            mins[b0:b0 + blocks.shape[1]] = blocks.min(axis=(0, 2))
+            maxs[b0:b0 + blocks.shape[1]] = blocks.max(axis=(0, 2))
+        self.levels = [(self.base_block, mins, maxs)]
+        while len(mins) > min_bins:
+            pad = -len(mins) % self.factor
+            if pad:
+                mins = np.concatenate([mins, np.repeat(mins[-1], pad)])
+                maxs = np.concatenate([maxs, np.repeat(maxs[-1], pad)])
+            mins = mins.reshape(-1, self.factor).min(axis=1)
+            maxs = maxs.reshape(-1, self.factor).max(axis=1)
+            self.levels.append((self.levels[-1][0] * self.factor, mins, maxs))
+        return self
+
+    @classmethod
+    def from_levels(cls, levels, sample_rate, n_samples, base_block=64, factor=4):
+        pyramid = cls(base_block=base_block, factor=factor)
+        pyramid.levels = levels
+        pyramid.sample_rate = sample_rate
+        pyramid.n_samples = n_samples
+        return pyramid
+
+    @property
+    def duration(self):
+        return self.n_samples / float(self.sample_rate) if self.sample_rate else 0.0
+
+    def query(self, start_time, end_time, width_px):
+        """
+        Trả về (times, mins, maxs) cho khoảng [start_time, end_time] với khoảng width_px điểm.
+        Khi phóng to đến mức một pixel ít hơn base_block mẫu thì đọc thẳng mẫu gốc (nếu còn giữ).
+        """
+        width_px = max(int(width_px), 1)
+        start = max(int(start_time * self.sample_rate), 0)
+        end = min(int(np.ceil(end_time * self.sample_rate)), self.n_samples)
+        if end <= start:
+            empty = np.empty(0, dtype=np.float32)
+            return empty, empty, empty
+        samples_per_px = (end - start) / float(width_px)
+
+        if samples_per_px < self.base_block and self.audio_array is not None:
+            frames = self.audio_array if self.audio_array.ndim > 1 else self.audio_array[np.newaxis]
+            segment = frames[:, start:end]
+            block, b0 = 1, start
+            mins, maxs = segment.min(axis=0), segment.max(axis=0)
+        else:
+            # Mức thô nhất mà mỗi pixel vẫn có ít nhất một khối
+            block, mins, maxs = self.levels[0]
+            for level in self.levels:
+                if level[0] > samples_per_px:
+                    break
+                block, mins, maxs = level
+            b0, b1 = start // block, -(-end // block)
+            mins, maxs = mins[b0:b1], maxs[b0:b1]
+        # Gom tiếp để không vượt quá khoảng 2 điểm mỗi pixel
+        group = max(len(mins) // (2 * width_px), 1)
+        if group > 1:
+            usable = len(mins) - len(mins) % group
+            mins = mins[:usable].reshape(-1, group).min(axis=1)
+            maxs = maxs[:usable].reshape(-1, group).max(axis=1)
+        times = (b0 * block + (np.arange(len(mins)) + 0.5) * block * group) / float(self.sample_rate)
+        return times, mins, maxs
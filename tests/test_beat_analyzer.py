@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from models.beat_analyzer import StreamingBeatTracker
+
+
+def click_track(seconds, sample_rate, bpm=120.0):
+    audio = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+    click = np.hanning(64).astype(np.float32)
+    beats = np.arange(0.5, seconds - 0.1, 60.0 / bpm)
+    for t in beats:
+        start = int(t * sample_rate)
+        audio[start:start + len(click)] += click
+    return audio, beats
+
+
+def hit_rate(found, expected, tolerance=0.07):
+    return np.mean([np.min(np.abs(found - t)) < tolerance for t in expected[12:]])
+
+
+def track(blocks, sample_rate):
+    tracker = StreamingBeatTracker(sample_rate)
+    found = [tracker.process(block) for block in blocks]
+    found.append(tracker.finish())
+    return tracker, np.concatenate(found)
+
+
+@pytest.mark.parametrize("sample_rate", [16000, 44100])
+def test_block_longer_than_history(sample_rate):
+    # Một khối 90 giây dài hơn nhiều so với history_seconds (12 giây)
+    audio, expected = click_track(90, sample_rate)
+    tracker, found = track([audio], sample_rate)
+    assert tracker.tempo == pytest.approx(120.0, rel=0.03)
+    assert hit_rate(found, expected) > 0.9
+
+
+def test_loader_sized_blocks_at_low_rate():
+    # Khối 2^18 mẫu như AudioLoader.stream_audio: 16,4 giây ở 16 kHz
+    sample_rate = 16000
+    audio, expected = click_track(90, sample_rate)
+    blocks = [audio[start:start + (1 << 18)] for start in range(0, len(audio), 1 << 18)]
+    _, found = track(blocks, sample_rate)
+    assert hit_rate(found, expected) > 0.9
+    assert np.all(np.diff(found) > 0)
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from models.jobs import CancelToken, CancelledError, JobContext, JobQueue
+
+
+def blocking_job(started, release, result=None):
+    # Chờ release, kiểm tra hủy sau mỗi nhịp như một vòng xử lý theo khối
+    def job(ctx):
+        started.set()
+        while not release.wait(0.01):
+            ctx.check()
+        ctx.check()
+        return result
+    return job
+
+
+def make_queue():
+    events = []
+    done = threading.Event()
+    queue = JobQueue()
+
+    def callbacks(tag):
+        return {
+            "on_done": lambda result: (events.append(("done", tag, result)), done.set()),
+            "on_error": lambda error: (events.append(("error", tag, str(error))), done.set()),
+            "on_cancel": lambda: events.append(("cancel", tag))
+        }
+    return queue, events, done, callbacks
+
+
+def test_cancel_token_and_context():
+    token = CancelToken()
+    ctx = JobContext(token)
+    ctx.check()
+    token.cancel()
+    assert token.cancelled
+    with pytest.raises(CancelledError):
+        ctx.check()
+
+
+def test_subrange_maps_progress_into_parent():
+    reported = []
+    ctx = JobContext(on_progress=reported.append)
+    ctx.subrange(0.5, 1.0).subrange(0.0, 0.5).set_progress(0.5)
+    ctx.subrange(0.0, 0.5).set_progress(2.0)
+    assert reported == [pytest.approx(0.625), pytest.approx(0.5)]
+
+
+def test_same_key_replaces_running_and_pending_jobs():
+    queue, events, done, callbacks = make_queue()
+    started, release = threading.Event(), threading.Event()
+    queue.submit("render", blocking_job(started, threading.Event()), **callbacks(1))
+    assert started.wait(2)
+    queue.submit("render", blocking_job(threading.Event(), threading.Event()), **callbacks(2))
+    queue.submit("render", blocking_job(threading.Event(), release, "latest"), **callbacks(3))
+    release.set()
+    assert done.wait(2)
+    queue.shutdown()
+    assert ("cancel", 1) in events and ("cancel", 2) in events
+    assert events[-1] == ("done", 3, "latest")
+    assert not any(event[0] == "done" and event[1] != 3 for event in events)
+
+
+def test_different_keys_run_in_order():
+    queue, events, done, callbacks = make_queue()
+    started, release, exported = threading.Event(), threading.Event(), threading.Event()
+    queue.submit("render", blocking_job(started, release, "render"), **callbacks("render"))
+    queue.submit("export", lambda ctx: exported.set() or "export", **callbacks("export"))
+    assert started.wait(2)
+    assert queue.is_busy("export") and not exported.is_set()
+    release.set()
+    assert exported.wait(2)
+    queue.shutdown()
+    assert [event[1] for event in events] == ["render", "export"]
+
+
+def test_cancel_by_key_and_errors():
+    queue, events, done, callbacks = make_queue()
+    started = threading.Event()
+    queue.submit("cut", blocking_job(started, threading.Event()), **callbacks("cut"))
+    assert started.wait(2)
+    queue.cancel("cut")
+    queue.submit("export", lambda ctx: 1 / 0, **callbacks("export"))
+    assert done.wait(2)
+    queue.shutdown()
+    assert events[0] == ("cancel", "cut")
+    assert events[1][:2] == ("error", "export")
+    assert not queue.is_busy()
+
+
+def test_progress_is_throttled_and_dispatched():
+    dispatched = []
+    queue = JobQueue(dispatch=lambda callback: dispatched.append(callback))
+    finished = threading.Event()
+
+    def job(ctx):
+        for i in range(1000):
+            ctx.set_progress((i + 1) / 1000.0)
+        finished.set()
+    progress = []
+    queue.submit("render", job, on_progress=progress.append)
+    assert finished.wait(2)
+    queue.shutdown()
+    for callback in dispatched:
+        callback()
+    assert progress[-1] == 1.0
+    assert len(progress) <= 1 / JobQueue.PROGRESS_STEP + 1
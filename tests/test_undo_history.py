@@ -0,0 +1,106 @@
+import numpy as np
+
+from models.undo_history import UndoHistory, PARAM_KEYS
+
+SAMPLE_RATE = 1000
+
+
+def make_state(audio_array, **params):
+    state = {key: 0.0 for key in PARAM_KEYS}
+    state.update(speed=1.0, reverb_enabled=False, echo_enabled=False, fade_enabled=False)
+    state.update(params)
+    state.update(audio_array=audio_array, sample_rate=SAMPLE_RATE)
+    return state
+
+
+def ramp(n, channels=None):
+    audio = np.arange(n, dtype=np.float32)
+    return audio if channels is None else np.tile(audio, (channels, 1))
+
+
+def test_undo_redo_restores_params_and_audio():
+    history = UndoHistory()
+    first, second = ramp(100), ramp(100) * 2
+    history.push(make_state(first), kind="load")
+    history.push(make_state(second, volume_gain=3.0), kind="apply")
+    state = history.undo()
+    assert state["volume_gain"] == 0.0
+    np.testing.assert_array_equal(state["audio_array"], first)
+    state = history.redo()
+    assert state["volume_gain"] == 3.0
+    np.testing.assert_array_equal(state["audio_array"], second)
+    assert history.redo() is None
+
+
+def test_push_after_undo_drops_redo_branch():
+    history = UndoHistory()
+    history.push(make_state(ramp(10)), kind="load")
+    history.push(make_state(ramp(10), bass_gain=2.0))
+    history.undo()
+    history.push(make_state(ramp(10), mid_gain=1.0))
+    assert not history.can_redo()
+    state = history.undo()
+    assert state["bass_gain"] == 0.0 and state["mid_gain"] == 0.0
+
+
+def test_cut_is_stored_as_range_of_previous_state():
+    history = UndoHistory()
+    audio = ramp(1000, channels=2)
+    history.push(make_state(audio), kind="load")
+    history.push(make_state(audio[..., 200:500]), kind="cut", cut_range=(200, 500))
+    history.push(make_state(ramp(10)))
+    state = history.undo()
+    assert state["kind"] == "cut"
+    assert state["audio_array"].shape == (2, 300)
+    assert state["audio_array"][0, 0] == 200
+    np.testing.assert_array_equal(state["source_array"], state["audio_array"])
+
+
+def test_shared_buffer_is_counted_once():
+    history = UndoHistory()
+    audio = ramp(1000)
+    history.push(make_state(audio), kind="load")
+    history.push(make_state(audio))  # Hiệu ứng trung tính: cùng bộ đệm
+    assert history.memory_usage() == audio.nbytes
+
+
+def test_memory_limit_spills_oldest_state(tmp_path):
+    history = UndoHistory(memory_limit_mb=1, spill_dir=str(tmp_path))
+    first, second = ramp(200000), ramp(200000) + 1
+    history.push(make_state(first), kind="load")
+    history.push(make_state(second, volume_gain=1.0))
+    assert history.memory_usage() == second.nbytes
+    assert list(tmp_path.iterdir())
+    state = history.undo()
+    np.testing.assert_array_equal(state["audio_array"], first)
+
+
+def test_spill_keeps_each_view_of_shared_buffer(tmp_path):
+    # Cắt mono là view của mảng trước khi cắt; apply trung tính giữ view đó. Khi bộ đệm chung bị đẩy ra
+    # đĩa, mỗi trạng thái phải đọc lại đúng view của mình chứ không phải cả bộ đệm
+    history = UndoHistory(memory_limit_mb=2, spill_dir=str(tmp_path))
+    audio = ramp(400000)
+    history.push(make_state(audio), kind="load")
+    cut = np.ascontiguousarray(audio[100000:200000])
+    history.push(make_state(cut), kind="cut", cut_range=(100000, 200000))
+    history.push(make_state(cut))
+    history.push(make_state(np.zeros(300000, dtype=np.float32), volume_gain=2.0))
+    state = history.undo()
+    assert state["audio_array"].shape == (100000,)
+    assert state["audio_array"][0] == 100000
+    state = history.undo()
+    assert state["audio_array"].shape == (100000,)
+    assert state["audio_array"][0] == 100000
+    state = history.undo()
+    assert state["audio_array"].shape == (400000,)
+    assert state["audio_array"][0] == 0
+
+
+def test_max_entries_drops_oldest_apply():
+    history = UndoHistory(max_entries=3)
+    history.push(make_state(ramp(10)), kind="load")
+    for gain in (1.0, 2.0, 3.0, 4.0):
+        history.push(make_state(ramp(10), volume_gain=gain))
+    assert len(history._entries) == 3
+    state = history.undo()
+    assert state["volume_gain"] == 3.0
@@ -111,6 +111,9 @@ class ControlPanel:
         self.preview_button.grid(row=0, column=4, padx=10, sticky=tk.EW)
         self.stop_button = ttk.Button(self.effects_frame, text=self.languages[self.current_lang]["stop"], style="TButton")
         self.stop_button.grid(row=0, column=5, padx=10, sticky=tk.EW)
+        self.live_preview_var = tk.BooleanVar(value=False)
+        self.live_preview_check = ttk.Checkbutton(self.effects_frame, text=self.languages[self.current_lang]["live_preview"], variable=self.live_preview_var)
+        self.live_preview_check.grid(row=0, column=6, padx=10, sticky=tk.EW)
         self.effects_frame.columnconfigure(0, weight=1)
         self.effects_frame.columnconfigure(1, weight=1)
         self.effects_frame.columnconfigure(2, weight=1)
@@ -118,8 +121,13 @@ class ControlPanel:
         self.effects_frame.columnconfigure(4, weight=1)
         self.effects_frame.columnconfigure(5, weight=1)
 
-        self.progress = ttk.Progressbar(parent, orient=tk.HORIZONTAL, length=400, mode='indeterminate', style="TProgressbar")
-        self.progress.grid(row=4, column=0, pady=5, sticky=tk.EW)
+        self.progress_frame = ttk.Frame(parent)
+        self.progress_frame.grid(row=4, column=0, pady=5, sticky=tk.EW)
+        self.progress_frame.columnconfigure(0, weight=1)
+        self.progress = ttk.Progressbar(self.progress_frame, orient=tk.HORIZONTAL, length=400, mode='indeterminate', style="TProgressbar")
+        self.progress.grid(row=0, column=0, sticky=tk.EW)
+        self.cancel_button = ttk.Button(self.progress_frame, text=self.languages[self.current_lang]["cancel"], style="TButton", state="disabled")
+        self.cancel_button.grid(row=0, column=1, padx=10)
 
     def bind_button_events(self):
         if self.controller is not None:
@@ -141,13 +149,27 @@ class ControlPanel:
             self.vocal_button.config(command=self.controller.separate_vocal)
             self.preview_button.config(command=self.controller.preview_audio)
             self.stop_button.config(command=self.controller.stop_preview)
+            self.cancel_button.config(command=self.controller.cancel_operation)
+            # Khi nghe thử trực tiếp, thay đổi thanh trượt được áp dụng ngay trong lúc phát
+            for slider in (self.volume_slider, self.bass_slider, self.mid_slider, self.treble_slider):
+                slider.config(command=self.controller.update_live_effects)
 
     def start_progress(self):
+        # Chạy vô định cho thao tác không đo được tiến độ (tải file, nạp mô hình tách giọng)
+        self.progress.config(mode='indeterminate')
         self.progress['value'] = 0
         self.progress.start()
 
+    def set_progress(self, fraction):
+        # Tiến độ thực (0..1) báo từ các khối/bước xử lý
+        if str(self.progress['mode']) != 'determinate':
+            self.progress.stop()
+            self.progress.config(mode='determinate', maximum=100)
+        self.progress['value'] = fraction * 100
+
     def stop_progress(self):
         self.progress.stop()
+        self.progress.config(mode='determinate')
         self.progress['value'] = 100
 
     def get_export_format(self):
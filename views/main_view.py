@@ -27,6 +27,8 @@ class MainView:
                 "vocal": "Tách giọng hát",
                 "preview": "Nghe thử",
                 "stop": "Dừng",
+                "cancel": "Hủy",
+                "live_preview": "Hiệu ứng trực tiếp",
                 "undo": "Undo",
                 "redo": "Redo",
                 "control_frame": "Điều khiển âm thanh",
@@ -65,6 +67,8 @@ class MainView:
                 "vocal": "Separate Vocal",
                 "preview": "Preview",
                 "stop": "Stop",
+                "cancel": "Cancel",
+                "live_preview": "Live effects",
                 "undo": "Undo",
                 "redo": "Redo",
                 "control_frame": "Audio Controls",
@@ -4,12 +4,19 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from models.waveform_peaks import PeakPyramid
+
 class WaveformView:
     def __init__(self, parent, controller, languages, current_lang):
         self.controller = controller
         self.languages = languages
         self.current_lang = current_lang
         self.is_manual_sliding = False  # Trạng thái khi người dùng kéo thanh trượt
+        self.peaks = None  # PeakPyramid của âm thanh đang hiển thị
+        self.beat_times = None
+        self.view_start = 0.0  # Khoảng thời gian đang hiển thị (zoom/pan)
+        self.view_end = 0.0
+        self._pan_anchor = None
 
         self.fig, self.ax = plt.subplots(figsize=(10, 3), facecolor="#FFFFFF")
         self.ax.set_facecolor("#D9E6F2")
@@ -29,6 +36,12 @@ class WaveformView:
         self.timeline_position_label.grid(row=0, column=2, padx=5)
         self.timeline_frame.columnconfigure(1, weight=1)
 
+        self.canvas.mpl_connect('scroll_event', self._on_scroll)
+        self.canvas.mpl_connect('button_press_event', self._on_press)
+        self.canvas.mpl_connect('motion_notify_event', self._on_motion)
+        self.canvas.mpl_connect('button_release_event', self._on_release)
+        self.canvas.mpl_connect('resize_event', lambda event: self.redraw())
+
     def bind_timeline_event(self):
         def on_slider_change(value):
             if not self.is_manual_sliding:
@@ -45,21 +58,84 @@ class WaveformView:
         self.timeline_slider.bind("<Button-1>", on_slider_press)
         self.timeline_slider.bind("<ButtonRelease-1>", on_slider_release)
 
-    def update_waveform(self, audio_array, sr, beat_times=None):
+    def update_waveform(self, audio_array, sr, beat_times=None, peaks=None):
+        if peaks is None:
+            if self.peaks is None or self.peaks.audio_array is not audio_array or self.peaks.sample_rate != sr:
+                peaks = PeakPyramid(audio_array, sr)
+            else:
+                peaks = self.peaks
+        # Giữ mức zoom khi độ dài không đổi (ví dụ áp dụng EQ), ngược lại hiển thị toàn bộ
+        if self.peaks is None or abs(self.peaks.duration - peaks.duration) > 1e-6:
+            self.view_start, self.view_end = 0.0, peaks.duration
+        self.peaks = peaks
+        self.beat_times = beat_times
+        self.redraw()
+
+    def redraw(self):
         self.ax.clear()
-        if len(audio_array.shape) > 1:
-            audio_array = audio_array[0]
-        time_axis = np.linspace(0, len(audio_array) / sr, len(audio_array))
-        self.ax.plot(time_axis, audio_array, color="#FF6200")
-        if beat_times is not None:
-            for beat in beat_times:
-                self.ax.axvline(x=beat, color='r', linestyle='--', alpha=0.5)
+        if self.peaks is not None and self.view_end > self.view_start:
+            width_px = self.ax.get_window_extent().width
+            times, mins, maxs = self.peaks.query(self.view_start, self.view_end, width_px)
+            self.ax.fill_between(times, mins, maxs, color="#FF6200", linewidth=0.8, edgecolor="#FF6200")
+            if self.beat_times is not None:
+                beat_times = np.asarray(self.beat_times)
+                visible = beat_times[(beat_times >= self.view_start) & (beat_times <= self.view_end)]
+                self.ax.vlines(visible, 0, 1, transform=self.ax.get_xaxis_transform(), color='r', linestyle='--', alpha=0.5)
+            self.ax.set_xlim(self.view_start, self.view_end)
         self.ax.set_title(self.languages[self.current_lang]["waveform"], fontsize=14, color="black")
         self.ax.tick_params(axis='both', colors='black')
         self.ax.grid(True, linestyle='--', alpha=0.7)
         self.ax.set_facecolor("#D9E6F2")
         self.fig.set_facecolor("#FFFFFF")
-        self.canvas.draw()
+        self.canvas.draw_idle()
+
+    def zoom(self, factor, center=None):
+        if self.peaks is None:
+            return
+        duration = self.peaks.duration
+        center = (self.view_start + self.view_end) / 2 if center is None else center
+        # Không phóng to quá 10 mẫu mỗi khung nhìn
+        span = min(max((self.view_end - self.view_start) * factor, 10.0 / self.peaks.sample_rate), duration)
+        ratio = (center - self.view_start) / max(self.view_end - self.view_start, 1e-12)
+        self._set_view(center - span * ratio, span)
+
+    def pan(self, delta):
+        if self.peaks is None:
+            return
+        self._set_view(self.view_start + delta, self.view_end - self.view_start)
+
+    def reset_zoom(self):
+        if self.peaks is not None:
+            self._set_view(0.0, self.peaks.duration)
+
+    def _set_view(self, start, span):
+        start = min(max(start, 0.0), max(self.peaks.duration - span, 0.0))
+        self.view_start, self.view_end = start, start + span
+        self.redraw()
+
+    def _on_scroll(self, event):
+        if event.inaxes is not self.ax:
+            return
+        self.zoom(0.8 if event.button == 'up' else 1.25, event.xdata)
+
+    def _on_press(self, event):
+        # Kéo bằng chuột trái để di chuyển, nhấp đúp để xem toàn bộ
+        if event.inaxes is not self.ax or event.button != 1:
+            return
+        if event.dblclick:
+            self.reset_zoom()
+            return
+        self._pan_anchor = (event.x, self.view_start)
+
+    def _on_motion(self, event):
+        if self._pan_anchor is None or event.x is None:
+            return
+        x0, view_start = self._pan_anchor
+        seconds_per_px = (self.view_end - self.view_start) / max(self.ax.get_window_extent().width, 1)
+        self._set_view(view_start - (event.x - x0) * seconds_per_px, self.view_end - self.view_start)
+
+    def _on_release(self, event):
+        self._pan_anchor = None
 
     def update_timeline(self, duration):
         self.timeline_slider.configure(to=duration)